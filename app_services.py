@@ -0,0 +1,309 @@
+"""Process-wide services behind streamlit_app.py.
+
+Streamlit re-executes the app script on every interaction, and a cached
+function defined in the script is re-decorated, and its source re-hashed,
+on each of those runs. Defining the shared resources here means that work
+happens once per server process; the script only calls the getters.
+"""
+import base64
+import json
+import os
+import re
+import uuid
+
+import streamlit as st
+
+from qa_system.cache import CachedClassifier, TTLCache, normalize_text
+from qa_system.charts import ChartRenderer, draw_daily_counts
+from qa_system.classifier import get_classifier
+from qa_system.conversation import ChatFlow
+from qa_system.exports import ExportService
+from qa_system.ids import ReportIdAllocator
+from qa_system.machines import MachineRegistry
+from qa_system.metrics import span, start_metrics_log, start_metrics_server
+from qa_system.outbox import OutboxSync, ReportOutbox
+from qa_system.partitions import PartitionedAnalytics
+from qa_system.prompts import confirmation_template
+from qa_system.pubsub import connect_broker
+from qa_system.similarity import VectorIndex, get_embedder
+from qa_system.store import ReportStore
+from qa_system.transcription import TranscriptionPool, get_backend
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+
+# Streamlit serves static/ at app/static/ when server.enableStaticServing is on
+EXPORTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "exports")
+EXPORTS_URL = "app/static/exports"
+
+
+# Static assets, read once per server process
+@st.cache_resource
+def load_asset(name):
+    """Return the text of a bundled asset"""
+    with open(os.path.join(ASSETS_DIR, name)) as f:
+        return f.read()
+
+
+@st.cache_resource
+def logo_data_uri():
+    """The bundled logo as an inline data URI, so it needs neither a request nor an image decoder"""
+    return "data:image/svg+xml;base64," + base64.b64encode(load_asset("logo.svg").encode()).decode()
+
+
+@st.cache_resource
+def css_injector():
+    """Script adding the app stylesheet to the page head, unless it is already there"""
+    css = re.sub(r"\s+", " ", load_asset("style.css"))
+    return f"""<script>
+const doc = window.parent.document;
+if (!doc.getElementById("qa-style")) {{
+    const style = doc.createElement("style");
+    style.id = "qa-style";
+    style.textContent = {json.dumps(css)};
+    doc.head.appendChild(style);
+}}
+</script>"""
+
+
+# Stage timings; QA_METRICS_PORT serves them to Prometheus, QA_METRICS_LOG appends JSON snapshots
+@st.cache_resource
+def start_metrics_export():
+    """Start the configured metrics exporters once per server process"""
+    if os.environ.get("QA_METRICS_PORT"):
+        start_metrics_server(int(os.environ["QA_METRICS_PORT"]))
+    if os.environ.get("QA_METRICS_LOG"):
+        start_metrics_log(os.environ["QA_METRICS_LOG"], interval=float(os.environ.get("QA_METRICS_INTERVAL", "60")))
+
+
+# Plants, lines and their machines
+@st.cache_resource
+def get_machine_registry():
+    """Load the machine registry"""
+    return MachineRegistry.load()
+
+
+# Shared report store, opened once per server process
+@st.cache_resource
+def get_report_store():
+    """Open the shared on-disk report store, filing reports under the plant and line of their machine"""
+    return ReportStore(partition=get_machine_registry().partition)
+
+
+# Cached per store version, so repeated reruns skip the index scans until a report is added
+@st.cache_data(max_entries=256)
+def report_filter_values(column, scope_filters, store_version):
+    """Distinct values offered by a report table filter within the dashboard's plant and line"""
+    return get_report_store().distinct(column, **dict(scope_filters))
+
+
+@st.cache_data(max_entries=256)
+def report_count(filters, store_version):
+    """Number of reports matching the table filters"""
+    return get_report_store().count(**dict(filters))
+
+
+@st.cache_data(max_entries=256)
+def report_page(filters, order_by, descending, limit, offset, store_version):
+    """One page of the reports table"""
+    return get_report_store().query(limit=limit, offset=offset, order_by=order_by, descending=descending,
+                                    **dict(filters))
+
+
+# Background export jobs, so large downloads never hold up a dashboard rerun
+@st.cache_resource
+def get_export_service():
+    """Start the export workers"""
+    return ExportService(EXPORTS_DIR, max_workers=int(os.environ.get("QA_EXPORT_WORKERS", "2")),
+                         ttl=float(os.environ.get("QA_EXPORT_TTL", "3600")))
+
+
+# Trend counters, trend detection and analytics questions per plant and line, on worker processes
+@st.cache_resource
+def get_partitioned_analytics():
+    """Start the analytics workers and have them load their partitions in the background"""
+    analytics = PartitionedAnalytics(
+        get_report_store(), workers=int(os.environ.get("QA_ANALYTICS_WORKERS", str(min(4, os.cpu_count() or 1)))),
+        registry=get_machine_registry()
+    )
+    analytics.warm()
+    return analytics
+
+
+# Report families offered in the Analysis tab
+ANALYSIS_TOPICS = {
+    "Oil leakage problems": {
+        "title": "Oil Leakage Analysis",
+        "label": "oil leakage",
+        "chart_label": "Oil Leak",
+        "filter": {"category": "EQUIPMENT MALFUNCTION - FLUID LEAK"}
+    },
+    "Product defects": {
+        "title": "Product Defect Analysis",
+        "label": "product defect",
+        "chart_label": "Product Defect",
+        "filter": {"category_prefix": "PRODUCT DEFECT"}
+    },
+    "Equipment malfunctions": {
+        "title": "Equipment Malfunction Analysis",
+        "label": "equipment malfunction",
+        "chart_label": "Equipment Malfunction",
+        "filter": {"category_prefix": "EQUIPMENT MALFUNCTION"}
+    }
+}
+
+
+# Similar-report search over all report descriptions, persisted next to the database
+@st.cache_resource
+def get_vector_index():
+    """Load the vector index and embed any reports it has not seen yet"""
+    store = get_report_store()
+    index = VectorIndex(os.path.splitext(store.path)[0], get_embedder())
+    index.sync(store)
+    return index
+
+
+def find_similar_reports(text, k=3, **filters):
+    """Return the k stored reports most similar to the text, each with its score
+
+    ``filters`` (plant, line) limit the results to one partition. The index
+    holds every report, so more candidates are fetched until k of them are
+    in the partition or the index has no more close enough.
+    """
+    wanted = k
+    while True:
+        matches = dict(get_vector_index().search(text, k=wanted))
+        reports = [report for report in get_report_store().get_many(list(matches))
+                   if all(report[column] == value for column, value in filters.items())]
+        if len(reports) >= k or len(matches) < wanted or wanted >= 64 * k:
+            break
+        wanted *= 4
+    reports = reports[:k]
+    for report in reports:
+        report["similarity"] = matches[report["id"]]
+    return reports
+
+
+# Natural-language analytics questions, answered by the partitioned analytics
+@st.cache_resource
+def get_analytics_parser():
+    """Create the question parser, matching machines against the registered names"""
+    from qa_system.nlquery import get_query_parser
+    return get_query_parser(known_machines=get_machine_registry().names)
+
+
+# Rendered chart images, memoized on the data they show
+@st.cache_resource
+def get_chart_renderer():
+    """Create the shared chart renderer"""
+    return ChartRenderer()
+
+
+def trend_chart(topic, scope, background=False):
+    """Return the PNG of a topic's daily report chart for an analytics scope, or queue it when in the background"""
+    dates, frequencies = scope.daily_counts(**topic["filter"])
+    name = (topic["title"], scope.plant, scope.line)
+    version = (scope.version, dates[-1])
+    draw = lambda fig: draw_daily_counts(fig, dates, frequencies, topic["chart_label"])
+    if background:
+        return get_chart_renderer().prerender(name, version, draw)
+    return get_chart_renderer().render(name, version, draw)
+
+
+# Issue classifier, compiled once per server process and shared by all sessions
+@st.cache_resource
+def get_issue_classifier():
+    """Build the issue classifier from the configured taxonomy"""
+    cache = TTLCache(
+        max_entries=int(os.environ.get("QA_CACHE_ENTRIES", "10000")),
+        max_bytes=int(os.environ.get("QA_CACHE_BYTES", str(16 * 1024 * 1024))),
+        ttl=float(os.environ.get("QA_CACHE_TTL", "3600"))
+    )
+    return CachedClassifier(get_classifier(), cache)
+
+
+@st.cache_resource
+def get_prompt_cache():
+    """Shared cache of confirmation question templates"""
+    return TTLCache(max_entries=int(os.environ.get("QA_CACHE_ENTRIES", "10000")),
+                    ttl=float(os.environ.get("QA_CACHE_TTL", "3600")))
+
+
+# Shared transcription worker pool, so recordings never block the script thread
+@st.cache_resource
+def get_transcription_pool():
+    """Start the background transcription workers"""
+    backend = get_backend(os.environ.get("QA_TRANSCRIPTION_BACKEND", "stub"))
+    return TranscriptionPool(backend, max_workers=int(os.environ.get("QA_TRANSCRIPTION_WORKERS", "4")),
+                             chunk_workers=int(os.environ.get("QA_TRANSCRIPTION_CHUNK_WORKERS", "4")))
+
+
+# Report notifications for live dashboards; set QA_REDIS_URL to share them between server processes
+REPORTS_CHANNEL = "qa:reports"
+
+# Sent with every report event, so a dashboard can tell this process's reports from other processes'
+PROCESS_ID = uuid.uuid4().hex
+
+
+@st.cache_resource
+def get_event_broker():
+    """Connect to the report event broker"""
+    return connect_broker(os.environ.get("QA_REDIS_URL"))
+
+
+def sync_aggregates():
+    """Bring the shared aggregates up to date with the report store"""
+    store = get_report_store()
+    analytics = get_partitioned_analytics()
+    with span("aggregate_sync"):
+        get_vector_index().sync(store)
+        synced = analytics.sync()
+    if synced:
+        # Have the cross-plant dashboard charts ready before a manager asks for them
+        for topic in ANALYSIS_TOPICS.values():
+            trend_chart(topic, analytics.scope(), background=True)
+
+
+def on_reports_persisted(reports):
+    """Update the shared aggregates once a batch of queued reports reaches the store and notify dashboards"""
+    sync_aggregates()
+    broker = get_event_broker()
+    for report in reports:
+        broker.publish(REPORTS_CHANNEL, {"origin": PROCESS_ID, "report": report})
+
+
+# Confirmed reports are queued on local disk first, so a dropped session or a store outage loses nothing
+@st.cache_resource
+def get_report_outbox():
+    """Open the local report queue, next to the database unless QA_OUTBOX_DIR is set"""
+    return ReportOutbox(os.environ.get("QA_OUTBOX_DIR", os.path.splitext(get_report_store().path)[0] + ".outbox"))
+
+
+@st.cache_resource
+def get_id_allocator():
+    """Report ID allocator shared by every session in the process"""
+    return ReportIdAllocator(get_report_store())
+
+
+@st.cache_resource
+def get_outbox_sync():
+    """Start copying queued reports to the store, including any left from before a restart"""
+    return OutboxSync(get_report_outbox(), get_report_store(), batch_size=int(os.environ.get("QA_SYNC_BATCH", "500")),
+                      on_synced=[on_reports_persisted], id_allocator=get_id_allocator()).start()
+
+
+# Engineer chat flow, shared by all sessions; each session keeps its own Conversation
+@st.cache_resource
+def get_chat_flow():
+    """Wire the chat state machine to the shared services"""
+    prompt_cache = get_prompt_cache()
+    outbox_sync = get_outbox_sync()
+    return ChatFlow(
+        get_report_outbox(), get_id_allocator(), get_issue_classifier(), get_transcription_pool(),
+        # Only the question's template is shared, so no engineer is shown another's wording
+        prompt=lambda text: prompt_cache.get_or_compute(
+            normalize_text(text), lambda: confirmation_template(text)
+        ).format(text=text),
+        similar=find_similar_reports,
+        machines=get_machine_registry(),
+        renumbered=outbox_sync.renumbered_id
+    )
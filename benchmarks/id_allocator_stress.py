@@ -0,0 +1,76 @@
+"""Multi-process stress test for the report ID allocator.
+
+Usage::
+
+    python -m benchmarks.id_allocator_stress --processes 8 --ids 20000
+
+Every worker process opens the same database and allocates IDs as fast as
+it can. The run fails if any ID is issued twice or if a process ever sees
+its own IDs go backwards, and prints the aggregate allocation rate.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from qa_system.ids import ReportIdAllocator
+from qa_system.store import ReportStore
+
+
+def _allocate(db_path, count, block_size, start_event):
+    allocator = ReportIdAllocator(ReportStore(db_path, seed=False), block_size=block_size)
+    start_event.wait()
+    return [allocator.next_id() for _ in range(count)]
+
+
+def run(processes, ids_per_process, block_size, db_path):
+    ReportStore(db_path)
+    with multiprocessing.Manager() as manager:
+        start_event = manager.Event()
+        with multiprocessing.Pool(processes) as pool:
+            pending = [
+                pool.apply_async(_allocate, (db_path, ids_per_process, block_size, start_event))
+                for _ in range(processes)
+            ]
+            time.sleep(0.5)  # let every worker open the store before the clock starts
+            started = time.perf_counter()
+            start_event.set()
+            results = [result.get() for result in pending]
+            elapsed = time.perf_counter() - started
+    
+    all_ids = [report_id for ids in results for report_id in ids]
+    duplicates = len(all_ids) - len(set(all_ids))
+    backwards = sum(
+        1 for ids in results for a, b in zip(ids, ids[1:])
+        if int(a.rsplit("-", 1)[1]) >= int(b.rsplit("-", 1)[1])
+    )
+    return {
+        "ids": len(all_ids),
+        "seconds": elapsed,
+        "ids_per_second": len(all_ids) / elapsed,
+        "duplicates": duplicates,
+        "non_monotonic": backwards,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stress-test report ID allocation across processes.")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--ids", type=int, default=20000, help="IDs allocated by each process")
+    parser.add_argument("--block-size", type=int, default=50)
+    parser.add_argument("--db", help="database to allocate from (default: a temporary file)")
+    args = parser.parse_args(argv)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, "id_stress.db")
+        stats = run(args.processes, args.ids, args.block_size, db_path)
+    print(f"{stats['ids']:,} IDs from {args.processes} processes in {stats['seconds']:.2f}s "
+          f"({stats['ids_per_second']:,.0f} IDs/s); "
+          f"{stats['duplicates']} duplicates, {stats['non_monotonic']} out-of-order")
+    return 0 if stats["duplicates"] == 0 and stats["non_monotonic"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
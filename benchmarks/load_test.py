@@ -0,0 +1,456 @@
+"""Headless load test for the engineer and manager flows.
+
+Usage::
+
+    python -m benchmarks.load_test --engineers 4 --managers 2 --duration 60
+    python -m benchmarks.load_test --compare benchmarks/results/baseline.json
+
+Every simulated user drives its own ``AppTest`` session of
+``streamlit_app.py`` from a separate thread, so all of them share the
+cached resources of one server process just like browser sessions do.
+``AppTest`` swaps process-wide runtime state in and out around each
+rerun, so script runs themselves are serialized; background work such as
+transcription, chart rendering and aggregate syncing still overlaps with
+them, and users waiting on it do not hold up the others.
+
+Engineers alternate between typed and recorded reports and confirm each
+one; managers switch filters, pages, questions and charts. Each rerun is
+timed, and the run is summarized as per-action latency percentiles,
+throughput and memory growth in a JSON report.
+
+With ``--compare`` the new report is checked against an earlier one, and
+the command exits non-zero if a latency percentile or the throughput got
+worse by more than ``--tolerance``, so it can gate performance changes.
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from collections import defaultdict
+from unittest import mock
+
+import numpy as np
+
+from qa_system.conversation import AWAITING_CONFIRMATION, TRANSCRIBING
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "streamlit_app.py")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+TEXT_REPORTS = [
+    "Oil leaking from the hydraulic unit on machine 1234",
+    "Item with number 12345 has a cover defect",
+    "Bearing making unusual noise on the press",
+    "Multiple scratches on product surface",
+    "Conveyor belt stopped twice during the shift",
+]
+
+MANAGER_QUESTIONS = [
+    "oil leaks by week last quarter",
+    "how many cover defects this month",
+    "reports by machine",
+    "noise issues by day",
+]
+
+PERCENTILES = (50, 90, 99)
+
+# AppTest installs a process-wide Runtime for the length of each run
+APP_TEST_LOCK = threading.Lock()
+
+
+def rss_bytes():
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        # Peak rather than current size, in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def synthetic_recording(seconds=4.0, rate=44100):
+    """A WAV recording of tone bursts padded with silence, like a short spoken report"""
+    t = np.arange(int(seconds * rate)) / rate
+    voiced = (t > 0.5) & (t < seconds - 0.5) & ((t % 0.6) < 0.45)
+    samples = np.where(voiced, 0.3 * np.sin(2 * np.pi * 180 * t), 0.0)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes((samples * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def preload_reports(db_path, count, seed=0):
+    """Fill the benchmark database with synthetic history so manager queries have work to do"""
+    # Imported here so QA_DB_PATH is already set when the app modules read it
+    from qa_system.classifier import load_taxonomy
+    from qa_system.store import ReportStore
+
+    rng = random.Random(seed)
+    categories = load_taxonomy()
+    machines = [f"Machine {number}" for number in range(1000, 1040)]
+    start = datetime.datetime.now() - datetime.timedelta(days=90)
+    store = ReportStore(db_path)
+    batch = []
+    for number in range(count):
+        entry = rng.choice(categories)
+        timestamp = start + datetime.timedelta(seconds=rng.randrange(90 * 86400))
+        batch.append({
+            "id": f"QA-LOAD-{number:07d}",
+            "description": rng.choice(TEXT_REPORTS),
+            "timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+            "category": entry["category"],
+            "priority": entry["priority"],
+            "machine": rng.choice(machines),
+        })
+        if len(batch) == 10000:
+            store.add_many(batch)
+            batch = []
+    store.add_many(batch)
+    store.close()
+
+
+class FakeRecorder:
+    """Stand-in for the browser-side audio recorder component
+
+    Returns whatever recording the current session has queued in
+    ``benchmark_recording``, as the real component returns the last
+    recording the engineer made.
+    """
+
+    def __call__(self, *args, **kwargs):
+        import streamlit as st
+        return st.session_state.get("benchmark_recording")
+
+
+class SimulatedUser(threading.Thread):
+    """One headless session issuing actions until the deadline"""
+
+    role = None
+
+    def __init__(self, index, deadline, timeout, results, rng):
+        super().__init__(name=f"{self.role}-{index}", daemon=True)
+        self.deadline = deadline
+        self.timeout = timeout
+        self.results = results
+        self.rng = rng
+        self.errors = []
+
+    def rerun(self, action):
+        """Rerun the script and record how long it took under ``action``"""
+        with APP_TEST_LOCK:
+            started = time.perf_counter()
+            self.app.run(timeout=self.timeout)
+            self.results.record(f"{self.role}.{action}", time.perf_counter() - started)
+        if self.app.exception:
+            raise RuntimeError(f"{action}: {self.app.exception[0].message}")
+
+    def run(self):
+        from streamlit.testing.v1 import AppTest
+
+        self.app = AppTest.from_file(APP_PATH, default_timeout=self.timeout)
+        try:
+            self.start_session()
+            while time.monotonic() < self.deadline:
+                self.step()
+        except Exception as exc:
+            self.errors.append(f"{self.name}: {exc}")
+
+    def start_session(self):
+        self.rerun("open")
+
+    def step(self):
+        raise NotImplementedError
+
+
+class Engineer(SimulatedUser):
+    role = "engineer"
+
+    def __init__(self, *args, voice_ratio=0.5, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.voice_ratio = voice_ratio
+        self.recordings = 0
+
+    def step(self):
+        started = time.perf_counter()
+        if self.rng.random() < self.voice_ratio:
+            self.record_voice()
+        else:
+            self.app.text_input(key="text_input").set_value(self.rng.choice(TEXT_REPORTS))
+            self.rerun("submit_text")
+        if self.app.session_state.conversation.state != AWAITING_CONFIRMATION:
+            return
+        self.app.button(key="confirm_yes").click()
+        self.rerun("confirm")
+        self.results.report_stored(time.perf_counter() - started)
+
+    def record_voice(self):
+        # A fresh recording each time, since the app ignores a repeated one
+        self.recordings += 1
+        recording = synthetic_recording(seconds=3.0 + self.recordings % 3)
+        self.app.session_state.benchmark_recording = recording
+        self.rerun("submit_voice")
+        # Reruns the progress fragment would trigger in a browser
+        while self.app.session_state.conversation.state == TRANSCRIBING:
+            if time.monotonic() > self.deadline + self.timeout:
+                raise RuntimeError("Transcription did not finish")
+            time.sleep(0.25)
+            self.rerun("poll_transcription")
+
+
+class Manager(SimulatedUser):
+    role = "manager"
+
+    def start_session(self):
+        self.app.session_state.view = "manager"
+        self.rerun("open")
+
+    def step(self):
+        action = self.rng.choice([
+            self.filter_reports, self.search_reports, self.change_page, self.ask_question,
+            self.pick_topic, self.find_similar, self.refresh,
+        ])
+        action()
+
+    def filter_reports(self):
+        selectbox = self.app.selectbox(key=f"report_filter_{self.rng.choice(['category', 'priority', 'machine'])}")
+        selectbox.set_value(self.rng.choice(selectbox.options))
+        self.rerun("filter")
+
+    def search_reports(self):
+        self.app.text_input(key="report_search").set_value(self.rng.choice(["", "oil", "noise", "defect"]))
+        self.rerun("search")
+
+    def change_page(self):
+        self.app.selectbox(key="report_page_size").set_value(self.rng.choice([25, 50, 100, 250]))
+        self.rerun("page")
+
+    def ask_question(self):
+        self.app.text_input(key="analytics_question").set_value(self.rng.choice(MANAGER_QUESTIONS))
+        self.rerun("question")
+
+    def pick_topic(self):
+        topic = self.app.selectbox(key="analysis_topic")
+        topic.set_value(self.rng.choice(topic.options))
+        self.rerun("topic")
+        chart_button = [button for button in self.app.button if button.label.startswith("Show me a chart")]
+        if chart_button:
+            chart_button[0].click()
+            self.rerun("chart")
+
+    def find_similar(self):
+        self.app.text_input(key="similar_query").set_value(self.rng.choice(TEXT_REPORTS))
+        self.rerun("similar")
+
+    def refresh(self):
+        self.rerun("refresh")
+
+
+class Results:
+    """Thread-safe collector for rerun latencies and completed reports"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.report_latencies = []
+        self.memory = []
+
+    def record(self, action, seconds):
+        with self._lock:
+            self.latencies[action].append(seconds)
+
+    def report_stored(self, seconds):
+        with self._lock:
+            self.report_latencies.append(seconds)
+
+    def sample_memory(self, elapsed):
+        with self._lock:
+            self.memory.append((round(elapsed, 2), rss_bytes()))
+
+
+def summarize(samples):
+    """Latency statistics in milliseconds"""
+    values = np.asarray(samples) * 1000
+    summary = {"count": len(values)}
+    if len(values):
+        summary.update({f"p{p}": round(float(np.percentile(values, p)), 2) for p in PERCENTILES})
+        summary["mean"] = round(float(values.mean()), 2)
+        summary["max"] = round(float(values.max()), 2)
+    return summary
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(APP_PATH), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(engineers, managers, duration, voice_ratio=0.5, preload=0, timeout=30.0, seed=0, db_path=None):
+    """Run the load test and return its report as a dict"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = db_path or os.path.join(tmp, "load_test.db")
+        os.environ["QA_DB_PATH"] = db_path
+        if preload:
+            preload_reports(db_path, preload, seed)
+
+        results = Results()
+        baseline_rss = rss_bytes()
+        with mock.patch("audio_recorder_streamlit.audio_recorder", FakeRecorder()):
+            # One warm-up session builds the shared resources, so users measure steady-state reruns
+            from streamlit.testing.v1 import AppTest
+            AppTest.from_file(APP_PATH, default_timeout=timeout).run()
+            warm_rss = rss_bytes()
+
+            started = time.monotonic()
+            deadline = started + duration
+            rng = random.Random(seed)
+            users = [Engineer(i, deadline, timeout, results, random.Random(rng.random()), voice_ratio=voice_ratio)
+                     for i in range(engineers)]
+            users += [Manager(i, deadline, timeout, results, random.Random(rng.random())) for i in range(managers)]
+            for user in users:
+                user.start()
+            while any(user.is_alive() for user in users):
+                results.sample_memory(time.monotonic() - started)
+                time.sleep(1.0)
+            elapsed = time.monotonic() - started
+        results.sample_memory(elapsed)
+
+    reruns = sum(len(samples) for samples in results.latencies.values())
+    all_samples = [sample for samples in results.latencies.values() for sample in samples]
+    peak_rss = max(rss for _, rss in results.memory)
+    return {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "config": {
+            "engineers": engineers, "managers": managers, "duration": duration,
+            "voice_ratio": voice_ratio, "preload": preload, "seed": seed,
+        },
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput": {
+            "reruns_per_second": round(reruns / elapsed, 2),
+            "reports_per_second": round(len(results.report_latencies) / elapsed, 3),
+        },
+        "latency_ms": {
+            "all": summarize(all_samples),
+            "report_end_to_end": summarize(results.report_latencies),
+            **{action: summarize(samples) for action, samples in sorted(results.latencies.items())},
+        },
+        "memory_mb": {
+            "baseline": round(baseline_rss / 2**20, 1),
+            "after_warmup": round(warm_rss / 2**20, 1),
+            "peak": round(peak_rss / 2**20, 1),
+            "growth": round((results.memory[-1][1] - warm_rss) / 2**20, 1),
+            "samples": [[elapsed, round(rss / 2**20, 1)] for elapsed, rss in results.memory],
+        },
+        "errors": [error for user in users for error in user.errors],
+    }
+
+
+def compare(report, previous, tolerance, min_samples=20):
+    """Return regressions of ``report`` relative to ``previous`` beyond ``tolerance``
+
+    Actions with fewer than ``min_samples`` reruns in either report are too
+    noisy to gate on and are skipped.
+    """
+    regressions = []
+    for action, summary in report["latency_ms"].items():
+        before = previous["latency_ms"].get(action)
+        if not before or min(summary["count"], before["count"]) < min_samples:
+            continue
+        for key in (f"p{p}" for p in PERCENTILES):
+            if summary[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{action} {key}: {before[key]:.1f} ms -> {summary[key]:.1f} ms")
+    for key, value in report["throughput"].items():
+        before = previous["throughput"].get(key)
+        if before and value < before * (1 - tolerance):
+            regressions.append(f"{key}: {before} -> {value}")
+    return regressions
+
+
+def print_report(report, previous=None):
+    print(f"{report['config']['engineers']} engineers, {report['config']['managers']} managers, "
+          f"{report['elapsed_seconds']}s at {report['revision'] or 'unknown revision'}")
+    keys = [f"p{p}" for p in PERCENTILES] + ["max"]
+    width = 18 if previous else 10
+    print(f"{'latency (ms)':<28}{'count':>7}" + "".join(f"{key:>{width}}" for key in keys))
+    for action, summary in report["latency_ms"].items():
+        if not summary["count"]:
+            continue
+        line = f"{action:<28}{summary['count']:>7}"
+        for key in keys:
+            cell = f"{summary[key]:.1f}"
+            before = previous and previous["latency_ms"].get(action, {}).get(key)
+            if before:
+                cell += f" ({(summary[key] - before) / before:+.0%})"
+            line += f"{cell:>{width}}"
+        print(line)
+    throughput = report["throughput"]
+    memory = report["memory_mb"]
+    print(f"{throughput['reruns_per_second']} reruns/s, {throughput['reports_per_second']} reports/s; "
+          f"memory {memory['after_warmup']} MB after warm-up, peak {memory['peak']} MB, "
+          f"growth {memory['growth']:+} MB")
+    for error in report["errors"]:
+        print(f"error: {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the QA app with simulated engineers and managers.")
+    parser.add_argument("--engineers", type=int, default=4)
+    parser.add_argument("--managers", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to keep issuing actions")
+    parser.add_argument("--voice-ratio", type=float, default=0.5, help="share of engineer reports that are recorded")
+    parser.add_argument("--preload", type=int, default=0, help="synthetic historical reports to start with")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds a single rerun may take")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", help="database to run against (default: a temporary file)")
+    parser.add_argument("--output", help="where to write the JSON report (default: benchmarks/results/)")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression (default 0.2)")
+    parser.add_argument("--min-samples", type=int, default=20,
+                        help="reruns an action needs in both reports to be compared (default 20)")
+    args = parser.parse_args(argv)
+
+    report = run(args.engineers, args.managers, args.duration, voice_ratio=args.voice_ratio,
+                 preload=args.preload, timeout=args.timeout, seed=args.seed, db_path=args.db)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{report['created'].replace(':', '')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_report(report, previous)
+    print(f"Report written to {output}")
+
+    if report["errors"]:
+        return 1
+    if previous:
+        if previous["config"] != report["config"]:
+            print("warning: the runs were made with different settings, so they may not be comparable")
+        regressions = compare(report, previous, args.tolerance, args.min_samples)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Cold-start and rerun cost of the engineer view.
+
+Usage::
+
+    python -m benchmarks.startup --runs 5 --reruns 50
+
+Each run starts a fresh interpreter, opens the app headlessly with
+``AppTest`` against a new database and times the first page load, then
+times repeated engineer reruns, both as seen by the caller and as time
+spent in the script body itself. Reported figures are medians over runs,
+along with the heavy modules the engineer view ended up importing.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Modules the engineer view should not need
+HEAVY_MODULES = ["pandas", "matplotlib", "PIL", "scipy", "pyarrow"]
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({app_path!r}, default_timeout=120)
+app.run()
+first_load = time.perf_counter() - started
+from qa_system.metrics import METRICS
+first = METRICS.snapshot()["stages"]["rerun"]
+reruns = []
+for _ in range({reruns}):
+    rerun_started = time.perf_counter()
+    app.run()
+    reruns.append(time.perf_counter() - rerun_started)
+assert not app.exception, app.exception
+script = METRICS.snapshot()["stages"]["rerun"]
+print(json.dumps({{
+    "first_load": first_load,
+    "reruns": reruns,
+    "script_seconds": (script["sum"] - first["sum"]) / (script["count"] - first["count"]),
+    "heavy_modules": sorted(name for name in {heavy!r} if name in sys.modules),
+}}))
+"""
+
+
+def measure_once(app_path, reruns):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, QA_DB_PATH=os.path.join(tmp, "startup.db"))
+        probe = _PROBE.format(app_path=app_path, reruns=reruns, heavy=HEAVY_MODULES)
+        result = subprocess.run([sys.executable, "-c", probe], env=env, capture_output=True, text=True,
+                                cwd=os.path.dirname(app_path))
+        if result.returncode:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run(runs, reruns, app_path):
+    samples = [measure_once(app_path, reruns) for _ in range(runs)]
+    rerun_times = [statistics.median(sample["reruns"]) for sample in samples]
+    return {
+        "first_load_ms": round(statistics.median(sample["first_load"] for sample in samples) * 1000, 1),
+        "rerun_ms": round(statistics.median(rerun_times) * 1000, 2),
+        "script_ms": round(statistics.median(sample["script_seconds"] for sample in samples) * 1000, 2),
+        "heavy_modules": samples[-1]["heavy_modules"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure engineer view cold start and rerun cost.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to start")
+    parser.add_argument("--reruns", type=int, default=50, help="reruns timed in each interpreter")
+    parser.add_argument("--app", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                      "streamlit_app.py"))
+    args = parser.parse_args(argv)
+
+    stats = run(args.runs, args.reruns, os.path.abspath(args.app))
+    print(f"first page load {stats['first_load_ms']} ms, engineer rerun {stats['rerun_ms']} ms "
+          f"({stats['script_ms']} ms in the script); "
+          f"heavy modules loaded: {', '.join(stats['heavy_modules']) or 'none'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Backend services for the Industrial QA System Streamlit app."""
@@ -0,0 +1,126 @@
+import datetime
+import threading
+
+import numpy as np
+
+
+class TrendAggregator:
+    """Rolling per-category, per-machine, per-day report counters.
+
+    Counts live in a NumPy ring buffer with one row per (category, machine)
+    pair and one column per day of the window. Appending a report is O(1)
+    and reading a daily series costs O(days) per matching row, independent
+    of how many reports have been stored.
+    """
+
+    def __init__(self, days=28, today=None):
+        self.days = days
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._row_keys = []
+        self._counts = np.zeros((16, days), dtype=np.int32)
+        self._last_day = (today or datetime.date.today()).toordinal()
+        self._seq = 0
+        self.version = 0
+
+    def add(self, report):
+        """Count a single report"""
+        with self._lock:
+            self._add(report)
+            self.version += 1
+
+    def sync(self, store, **filters):
+        """Count every report appended to the store since the last sync, or only those matching the filters"""
+        with self._lock:
+            added = 0
+            for seq, report in store.iter_reports(after_seq=self._seq, with_seq=True, **filters):
+                self._add(report)
+                self._seq = seq
+                added += 1
+            self._advance(datetime.date.today().toordinal())
+            if added:
+                self.version += 1
+            return added
+
+    def _add(self, report):
+        day = datetime.date.fromisoformat(report["timestamp"][:10]).toordinal()
+        if day > self._last_day:
+            self._advance(day)
+        if day <= self._last_day - self.days:
+            return
+        key = (report["category"], report["machine"])
+        row = self._rows.get(key)
+        if row is None:
+            row = len(self._row_keys)
+            if row == len(self._counts):
+                self._counts = np.vstack([self._counts, np.zeros_like(self._counts)])
+            self._rows[key] = row
+            self._row_keys.append(key)
+        self._counts[row, day % self.days] += 1
+
+    def _advance(self, day):
+        """Move the window forward to end on ``day``, clearing expired columns"""
+        if day <= self._last_day:
+            return
+        expired = min(day - self._last_day, self.days)
+        columns = [(self._last_day + i) % self.days for i in range(1, expired + 1)]
+        self._counts[:, columns] = 0
+        self._last_day = day
+
+    def _select(self, category=None, category_prefix=None, machine=None):
+        rows = [
+            row for row, (row_category, row_machine) in enumerate(self._row_keys)
+            if (category is None or row_category == category)
+            and (category_prefix is None or row_category.startswith(category_prefix))
+            and (machine is None or row_machine == machine)
+        ]
+        return rows
+
+    def daily_counts(self, category=None, category_prefix=None, machine=None):
+        """Return (dates, counts) for the window in chronological order"""
+        with self._lock:
+            rows = self._select(category, category_prefix, machine)
+            totals = self._counts[rows].sum(axis=0) if rows else np.zeros(self.days, dtype=np.int32)
+            start = self._last_day - self.days + 1
+            order = [(start + i) % self.days for i in range(self.days)]
+            dates = [datetime.date.fromordinal(start + i).isoformat() for i in range(self.days)]
+            return dates, totals[order]
+
+    def by_machine(self, category=None, category_prefix=None, last_days=None):
+        """Return report counts per machine over the last ``last_days`` days"""
+        last_days = last_days or self.days
+        with self._lock:
+            columns = [(self._last_day - i) % self.days for i in range(min(last_days, self.days))]
+            totals = {}
+            for row in self._select(category, category_prefix):
+                machine = self._row_keys[row][1]
+                totals[machine] = totals.get(machine, 0) + int(self._counts[row, columns].sum())
+            return {machine: count for machine, count in totals.items() if count}
+
+
+def describe_trend(counts, label, alerts=None):
+    """Summarize the last two weeks of a daily count series in one sentence or two
+
+    ``alerts`` are the TrendDetector alerts for the same reports; when given
+    they decide whether the trend is called rising, otherwise the last week
+    is compared with the one before.
+    """
+    last_two_weeks = int(counts[-14:].sum())
+    last_week = int(counts[-7:].sum())
+    previous_week = last_two_weeks - last_week
+    last_three_days = int(counts[-3:].sum())
+    if not last_two_weeks:
+        return f"There were no {label} reports in the last two weeks."
+    summary = f"There were {last_two_weeks} {label} reports in the last two weeks."
+    rising = bool(alerts) if alerts is not None else last_week > previous_week
+    if rising:
+        summary += (f" This appears to be an increasing trend, with {last_three_days} "
+                    f"reports occurring in just the last 3 days.")
+        if alerts:
+            machines = sorted({alert.machine for alert in alerts})
+            summary += f" The rise is concentrated on {', '.join(machines[:3])}."
+    elif last_week < previous_week:
+        summary += f" Reports are decreasing, with {last_three_days} in the last 3 days."
+    else:
+        summary += f" The rate is stable, with {last_three_days} reports in the last 3 days."
+    return summary
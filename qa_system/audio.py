@@ -0,0 +1,162 @@
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+# Sample rate speech recognizers such as Whisper expect
+RECOGNIZER_RATE = 16000
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Little-endian sample types by (format, bits per sample)
+SAMPLE_DTYPES = {
+    (WAVE_FORMAT_PCM, 8): np.dtype("u1"),
+    (WAVE_FORMAT_PCM, 16): np.dtype("<i2"),
+    (WAVE_FORMAT_PCM, 32): np.dtype("<i4"),
+    (WAVE_FORMAT_IEEE_FLOAT, 32): np.dtype("<f4"),
+}
+
+# A recording ready for a recognizer: mono float32 chunks at ``rate`` Hz
+PreparedAudio = namedtuple("PreparedAudio", ["chunks", "rate", "duration", "trimmed"])
+
+
+class AudioFormatError(ValueError):
+    """Raised when a recording is not a WAV file this module can decode"""
+
+
+def decode_wav(data):
+    """Return ``(samples, rate)`` for a WAV recording without copying it
+
+    ``samples`` is a ``(frames, channels)`` NumPy view straight onto the
+    input buffer, so it stays valid only as long as ``data`` does.
+    """
+    view = memoryview(data)
+    if len(view) < 12 or view[:4] != b"RIFF" or view[8:12] != b"WAVE":
+        raise AudioFormatError("Not a RIFF/WAVE recording")
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(view):
+        chunk_id = bytes(view[offset:offset + 4])
+        size, = struct.unpack_from("<I", view, offset + 4)
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack_from("<HHIIHH", view, body)
+            if fmt[0] == WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                # The real format is the first two bytes of the sub-format GUID
+                fmt = struct.unpack_from("<H", view, body + 24) + fmt[1:]
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise AudioFormatError("WAV data chunk precedes its format chunk")
+            format_tag, channels, rate, _, block_align, bits = fmt
+            dtype = SAMPLE_DTYPES.get((format_tag, bits))
+            if dtype is None:
+                raise AudioFormatError(f"Unsupported WAV sample format {format_tag} at {bits} bits")
+            # Browsers streaming a recording may leave the size unset
+            end = min(body + size, len(view))
+            frames = (end - body) // block_align
+            samples = np.frombuffer(view, dtype=dtype, count=frames * channels, offset=body)
+            return samples.reshape(frames, channels), rate
+        # Chunks are padded to an even length
+        offset = body + size + (size & 1)
+    raise AudioFormatError("WAV recording has no data chunk")
+
+
+def to_mono_float(samples):
+    """Mix decoded samples down to one float32 channel scaled to [-1, 1]"""
+    dtype = samples.dtype
+    mono = samples.mean(axis=1, dtype=np.float32) if samples.shape[1] > 1 else samples[:, 0].astype(np.float32)
+    if dtype == np.uint8:
+        mono -= 128
+        mono /= 128
+    elif dtype.kind == "i":
+        mono /= float(np.iinfo(dtype).max) + 1
+    return mono
+
+
+def frame_energies(samples, rate, frame_ms=20):
+    """Return the RMS level of consecutive frames in dBFS, and the frame length"""
+    frame = max(1, rate * frame_ms // 1000)
+    count = len(samples) // frame
+    frames = samples[:count * frame].reshape(count, frame)
+    rms = np.sqrt(np.einsum("ij,ij->i", frames, frames) / frame)
+    return 20 * np.log10(np.maximum(rms, 1e-10)), frame
+
+
+def trim_silence(samples, rate, threshold_db=-40.0, frame_ms=20, pad_ms=150):
+    """Return a view of ``samples`` without leading and trailing silence
+
+    Frames quieter than ``threshold_db`` dBFS count as silence; ``pad_ms``
+    of it is kept on each side so soft word onsets are not clipped.
+    Returns an empty view if nothing is above the threshold.
+    """
+    levels, frame = frame_energies(samples, rate, frame_ms)
+    loud = np.flatnonzero(levels > threshold_db)
+    if not len(loud):
+        return samples[:0]
+    pad = rate * pad_ms // 1000
+    start = max(0, loud[0] * frame - pad)
+    end = min(len(samples), (loud[-1] + 1) * frame + pad)
+    return samples[start:end]
+
+
+def resample(samples, rate, target_rate=RECOGNIZER_RATE):
+    """Resample mono audio to ``target_rate``
+
+    When downsampling, a moving-average low-pass filter over one output
+    period keeps the worst aliasing out before linear interpolation;
+    plenty for speech. Lower-rate recordings, such as 8 kHz telephone
+    audio, are interpolated up, which adds no detail but keeps them usable.
+    """
+    if rate == target_rate or not len(samples):
+        return samples
+    width = int(round(rate / target_rate))
+    if width > 1:
+        cumulative = np.cumsum(samples, dtype=np.float64)
+        cumulative[width:] = cumulative[width:] - cumulative[:-width]
+        samples = (cumulative[width - 1:] / width).astype(np.float32)
+    count = int(len(samples) * target_rate / rate)
+    positions = np.arange(count, dtype=np.float64) * (rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def split_chunks(samples, rate, max_seconds=30.0, search_seconds=3.0, frame_ms=20):
+    """Split audio into views of at most ``max_seconds`` each
+
+    Each cut is placed at the quietest frame of the last ``search_seconds``
+    before the limit, so chunks break between words rather than inside one.
+    """
+    limit = int(max_seconds * rate)
+    if len(samples) <= limit:
+        return [samples]
+    levels, frame = frame_energies(samples, rate, frame_ms)
+    window = max(1, int(search_seconds * rate) // frame)
+    chunks = []
+    start = 0
+    while len(samples) - start > limit:
+        last_frame = (start + limit) // frame
+        first_frame = max(start // frame + 1, last_frame - window)
+        cut = (first_frame + int(np.argmin(levels[first_frame:last_frame]))) * frame
+        chunks.append(samples[start:cut])
+        start = cut
+    chunks.append(samples[start:])
+    return chunks
+
+
+def prepare_audio(data, target_rate=RECOGNIZER_RATE, max_chunk_seconds=30.0, threshold_db=-40.0):
+    """Decode, trim, downsample and chunk a WAV recording for transcription
+
+    With ``max_chunk_seconds`` of None the audio is kept as one chunk.
+    Only the downsampled speech is copied; the returned chunks do not
+    reference ``data``, so the recording can be released right away.
+    """
+    samples, rate = decode_wav(data)
+    duration = len(samples) / rate
+    mono = to_mono_float(samples)
+    del samples
+    speech = trim_silence(mono, rate, threshold_db=threshold_db)
+    trimmed = duration - len(speech) / rate
+    speech = resample(speech, rate, target_rate)
+    chunks = split_chunks(speech, target_rate, max_chunk_seconds) if max_chunk_seconds else [speech]
+    return PreparedAudio(chunks if len(speech) else [], target_rate, duration, trimmed)
@@ -0,0 +1,140 @@
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+_WHITESPACE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = " .,;:!?\"'"
+
+
+def normalize_text(text):
+    """Normalize report text so trivially different reports share a cache key"""
+    return _WHITESPACE.sub(" ", text.lower()).strip(_EDGE_PUNCTUATION)
+
+
+def _sizeof(value):
+    """Rough memory footprint of a cached key or value"""
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        size += sum(sys.getsizeof(item) for item in value)
+    return size
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ``ttl`` seconds.
+
+    The cache is bounded both by entry count and by an estimate of the
+    memory held by keys and values; the least recently used entries are
+    evicted first when either bound is exceeded.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=16 * 1024 * 1024, ttl=3600, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """Store a value, evicting old entries to stay within the bounds"""
+        size = _sizeof(key) + _sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, self._clock() + self.ttl, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, computing and storing it on a miss"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Return hit/miss counters and current usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+
+class CachedClassifier:
+    """Classifier wrapper that answers repeated reports from a TTLCache"""
+
+    def __init__(self, classifier, cache=None):
+        self.classifier = classifier
+        self.cache = cache if cache is not None else TTLCache()
+
+    @property
+    def name(self):
+        return self.classifier.name
+
+    @property
+    def categories(self):
+        return self.classifier.categories
+
+    def classify(self, text):
+        """Return the cached (category, priority, confidence) of a report"""
+        return self.cache.get_or_compute(("classify", normalize_text(text)),
+                                         lambda: self.classifier.classify(text))
+
+    def classify_batch(self, texts):
+        """Classify several reports, sending only cache misses to the backend"""
+        missing = object()
+        keys = [("classify", normalize_text(text)) for text in texts]
+        results = [self.cache.get(key, missing) for key in keys]
+        pending = {}
+        for i, result in enumerate(results):
+            if result is missing:
+                pending.setdefault(keys[i], []).append(i)
+        if pending:
+            indexes = list(pending.values())
+            answers = self.classifier.classify_batch([texts[group[0]] for group in indexes])
+            for key, group, answer in zip(pending, indexes, answers):
+                self.cache.set(key, answer)
+                for i in group:
+                    results[i] = answer
+        return results
@@ -0,0 +1,212 @@
+import json
+import math
+import os
+import re
+from collections import namedtuple
+
+# Taxonomy shipped with the app; QA_TAXONOMY_PATH points at a replacement
+DEFAULT_TAXONOMY_PATH = os.path.join(os.path.dirname(__file__), "taxonomy.json")
+
+# Outcome for reports that match nothing in the taxonomy
+FALLBACK_CATEGORY = "GENERAL ISSUE"
+FALLBACK_PRIORITY = "Medium"
+
+PRIORITIES = ("Low", "Medium", "High")
+
+Classification = namedtuple("Classification", ["category", "priority", "confidence"])
+
+
+def load_taxonomy(path=None):
+    """Load the category taxonomy from a JSON file"""
+    path = path or os.environ.get("QA_TAXONOMY_PATH") or DEFAULT_TAXONOMY_PATH
+    with open(path, encoding="utf-8") as f:
+        taxonomy = json.load(f)
+    for entry in taxonomy:
+        if entry.get("priority") not in PRIORITIES:
+            raise ValueError(f"Category {entry.get('category')!r} has invalid priority {entry.get('priority')!r}")
+    return taxonomy
+
+
+def _trie_regex(phrases):
+    """Build a regex matching any of the phrases, factored on shared prefixes"""
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        if list(node) == [""]:
+            return ""
+        optional = "" in node
+        branches = []
+        for char in sorted(c for c in node if c):
+            token = r"\s+" if char == " " else re.escape(char)
+            branches.append(token + build(node[char]))
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if optional:
+            body = "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+class KeywordClassifier:
+    """Rule-based classifier compiled once over the whole taxonomy.
+
+    All keywords are folded into one prefix-trie regex, so a report is
+    scanned once no matter how many categories there are; the optional
+    per-category ``patterns`` are compiled into a second regex. Each hit
+    scores its category by match length; the best-scoring category wins and
+    its share of the total score is the confidence.
+    """
+
+    name = "keyword"
+
+    def __init__(self, taxonomy=None):
+        self.taxonomy = taxonomy if taxonomy is not None else load_taxonomy()
+        self.categories = {entry["category"]: entry for entry in self.taxonomy}
+        self._keyword_category = {}
+        self._pattern_category = {}
+        patterns = []
+        for entry in self.taxonomy:
+            for keyword in entry.get("keywords", []):
+                self._keyword_category[" ".join(keyword.lower().split())] = entry["category"]
+            for pattern in entry.get("patterns", []):
+                group = f"p{len(patterns)}"
+                self._pattern_category[group] = entry["category"]
+                patterns.append(f"(?P<{group}>{pattern})")
+        self._keyword_regex = None
+        if self._keyword_category:
+            self._keyword_regex = re.compile(r"\b" + _trie_regex(self._keyword_category) + r"\b")
+        self._pattern_regex = re.compile("|".join(patterns)) if patterns else None
+
+    def classify(self, text):
+        """Return the (category, priority, confidence) of a report"""
+        text = text.lower()
+        scores = {}
+        if self._keyword_regex is not None:
+            for match in self._keyword_regex.finditer(text):
+                keyword = " ".join(match.group().split())
+                category = self._keyword_category[keyword]
+                scores[category] = scores.get(category, 0) + len(keyword)
+        if self._pattern_regex is not None and not scores:
+            for match in self._pattern_regex.finditer(text):
+                category = self._pattern_category[match.lastgroup]
+                scores[category] = scores.get(category, 0) + len(match.group())
+        if not scores:
+            return Classification(FALLBACK_CATEGORY, FALLBACK_PRIORITY, 0.0)
+        category = max(scores, key=scores.get)
+        confidence = scores[category] / sum(scores.values())
+        return Classification(category, self.categories[category]["priority"], round(confidence, 3))
+
+    def classify_batch(self, texts):
+        return [self.classify(text) for text in texts]
+
+
+class LLMClassifier:
+    """Classifier backed by an OpenAI chat model, restricted to the taxonomy.
+
+    Reports are sent in batches of ``batch_size`` per request. Anything the
+    model cannot answer, or answers outside the taxonomy, is classified by
+    the local ``fallback`` instead.
+    """
+
+    name = "llm"
+
+    def __init__(self, taxonomy=None, model=None, batch_size=20, fallback=None):
+        self.taxonomy = taxonomy if taxonomy is not None else load_taxonomy()
+        self.categories = {entry["category"]: entry for entry in self.taxonomy}
+        self.model = model or os.environ.get("QA_LLM_MODEL", "gpt-4o-mini")
+        self.batch_size = batch_size
+        self.fallback = fallback or KeywordClassifier(self.taxonomy)
+        try:
+            from openai import OpenAI
+            self._client = OpenAI() if os.environ.get("OPENAI_API_KEY") else None
+        except ImportError:
+            self._client = None
+
+    def classify(self, text):
+        """Return the (category, priority, confidence) of a report"""
+        return self.classify_batch([text])[0]
+
+    def classify_batch(self, texts):
+        """Classify several reports with one model request per batch"""
+        results = []
+        for start in range(0, len(texts), self.batch_size):
+            results.extend(self._classify_chunk(texts[start:start + self.batch_size]))
+        return results
+
+    def _classify_chunk(self, texts):
+        answers = []
+        if self._client is not None:
+            try:
+                answers = self._ask(texts)
+            except Exception:
+                answers = []
+        results = []
+        for i, text in enumerate(texts):
+            answer = answers[i] if i < len(answers) and isinstance(answers[i], dict) else {}
+            category = answer.get("category")
+            if isinstance(category, str) and category in self.categories:
+                priority = answer.get("priority")
+                if priority not in PRIORITIES:
+                    priority = self.categories[category]["priority"]
+                results.append(Classification(category, priority, _confidence(answer.get("confidence"))))
+            else:
+                results.append(self.fallback.classify(text))
+        return results
+
+    def _ask(self, texts):
+        """Send one batch to the model and return its parsed JSON answers"""
+        categories = "\n".join(
+            f"- {entry['category']} (default priority {entry['priority']})" for entry in self.taxonomy
+        )
+        reports = "\n".join(f"{i + 1}. {text}" for i, text in enumerate(texts))
+        response = self._client.chat.completions.create(
+            model=self.model,
+            temperature=0,
+            response_format={"type": "json_object"},
+            messages=[
+                {"role": "system", "content": (
+                    "You categorize industrial quality reports. Use only these categories:\n"
+                    f"{categories}\n"
+                    "Answer with a JSON object {\"results\": [...]} holding one "
+                    "{\"category\", \"priority\", \"confidence\"} object per report, in order. "
+                    "Priority is Low, Medium or High; confidence is between 0 and 1."
+                )},
+                {"role": "user", "content": reports},
+            ],
+        )
+        results = json.loads(response.choices[0].message.content).get("results", [])
+        return results if isinstance(results, list) else []
+
+
+def _confidence(value, default=0.5):
+    """A model's confidence clamped to [0, 1], or ``default`` if it is missing or not a number"""
+    try:
+        confidence = float(value)
+    except (TypeError, ValueError):
+        return default
+    if not math.isfinite(confidence):
+        return default
+    return min(max(confidence, 0.0), 1.0)
+
+
+CLASSIFIERS = {
+    KeywordClassifier.name: KeywordClassifier,
+    LLMClassifier.name: LLMClassifier,
+}
+
+
+def get_classifier(name=None, **options):
+    """Instantiate a classifier backend by name (``QA_CLASSIFIER`` by default)"""
+    name = name or os.environ.get("QA_CLASSIFIER", "keyword")
+    try:
+        classifier_class = CLASSIFIERS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown classifier {name!r}; choose one of {', '.join(sorted(CLASSIFIERS))}"
+        ) from None
+    return classifier_class(**options)
@@ -0,0 +1,102 @@
+import datetime
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Day number of 1970-01-01 in proleptic Gregorian ordinals
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+CATEGORICAL_COLUMNS = ("category", "machine", "priority", "plant", "line")
+
+
+class ReportColumns:
+    """Columnar in-memory mirror of the report store for analytics.
+
+    Each report is reduced to its day number plus integer codes for its
+    category, machine, priority, plant and line, held in NumPy arrays that
+    grow by doubling (about 24 bytes per report). ``sync`` appends only the reports
+    added since the last sync, so after the first load every analytics
+    query is a vectorized scan over these arrays rather than a SQL query.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._size = 0
+        self._seq = 0
+        self.version = 0
+        self._day = np.zeros(1024, dtype=np.int32)
+        self._codes = {column: np.zeros(1024, dtype=np.int32) for column in CATEGORICAL_COLUMNS}
+        self._values = {column: [] for column in CATEGORICAL_COLUMNS}
+        self._lookup = {column: {} for column in CATEGORICAL_COLUMNS}
+
+    def __len__(self):
+        return self._size
+
+    def sync(self, store, batch_size=100000, **filters):
+        """Append every report stored since the last sync, or only those matching the filters"""
+        with self._lock:
+            added = 0
+            columns = ["seq", "timestamp"] + list(CATEGORICAL_COLUMNS)
+            for rows in store.iter_columns(columns, batch_size=batch_size, after_seq=self._seq, **filters):
+                self._append(rows)
+                self._seq = rows[-1][0]
+                added += len(rows)
+            if added:
+                self.version += 1
+            return added
+
+    def _code(self, column, value):
+        lookup = self._lookup[column]
+        code = lookup.get(value)
+        if code is None:
+            code = lookup[value] = len(self._values[column])
+            self._values[column].append(value)
+        return code
+
+    def _append(self, rows):
+        needed = self._size + len(rows)
+        if needed > len(self._day):
+            capacity = len(self._day)
+            while capacity < needed:
+                capacity *= 2
+            self._day = np.resize(self._day, capacity)
+            self._codes = {column: np.resize(codes, capacity) for column, codes in self._codes.items()}
+        # Factorize each chunk so only its distinct values go through Python
+        _, timestamps, *categorical = zip(*rows)
+        day_codes, day_values = pd.factorize(pd.Series(timestamps, dtype=object).str[:10])
+        ordinals = np.array([datetime.date.fromisoformat(day).toordinal() for day in day_values], dtype=np.int32)
+        self._day[self._size:needed] = ordinals[day_codes]
+        for column, column_values in zip(CATEGORICAL_COLUMNS, categorical):
+            chunk_codes, uniques = pd.factorize(pd.Series(column_values, dtype=object))
+            mapping = np.array([self._code(column, value) for value in uniques], dtype=np.int32)
+            self._codes[column][self._size:needed] = mapping[chunk_codes]
+        self._size = needed
+
+    def values(self, column):
+        """Distinct values seen in a categorical column"""
+        return list(self._values[column])
+
+    def select(self, category=None, category_prefix=None, machine=None, priority=None, since=None, until=None):
+        """Return a snapshot of the matching rows as (days, codes by column, values by column)"""
+        with self._lock:
+            n = self._size
+            mask = np.ones(n, dtype=bool)
+            for column, value in (("category", category), ("machine", machine), ("priority", priority)):
+                if value is not None:
+                    code = self._lookup[column].get(value)
+                    if code is None:
+                        mask[:] = False
+                    else:
+                        mask &= self._codes[column][:n] == code
+            if category_prefix is not None:
+                codes = [code for value, code in self._lookup["category"].items()
+                         if value.startswith(category_prefix)]
+                mask &= np.isin(self._codes["category"][:n], codes)
+            if since is not None:
+                mask &= self._day[:n] >= datetime.date.fromisoformat(since[:10]).toordinal()
+            if until is not None:
+                mask &= self._day[:n] < datetime.date.fromisoformat(until[:10]).toordinal()
+            codes = {column: self._codes[column][:n][mask] for column in CATEGORICAL_COLUMNS}
+            values = {column: list(self._values[column]) for column in CATEGORICAL_COLUMNS}
+            return self._day[:n][mask], codes, values
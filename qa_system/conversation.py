@@ -0,0 +1,245 @@
+import datetime
+
+from qa_system.machines import UNASSIGNED
+from qa_system.metrics import span
+
+# Conversation states
+AWAITING_INPUT = "awaiting_input"
+TRANSCRIBING = "transcribing"
+AWAITING_CONFIRMATION = "awaiting_confirmation"
+PERSISTED = "persisted"
+
+# States in which a new report can be submitted
+READY_STATES = (AWAITING_INPUT, PERSISTED)
+
+VOICE_PREFIX = "[Voice Message]: "
+TRANSCRIPTION_FAILED = "Sorry, I couldn't transcribe that recording. Please try again or type your report."
+CLASSIFICATION_FAILED = "Sorry, I couldn't process that report. Please try again."
+
+
+class InvalidTransition(ValueError):
+    """Raised when an event arrives in a state that cannot handle it"""
+
+
+class Conversation:
+    """Per-session engineer chat: the message history plus the flow state"""
+
+    def __init__(self, history_window=20):
+        self.state = AWAITING_INPUT
+        self.messages = []
+        self.history_window = history_window
+        self.visible_count = history_window
+        self.current_report = None
+        self.current_classification = None
+        self.current_similar = []
+        self.current_audio = None
+        self.transcription_job = None
+        # Partition (plant, line) the engineer is reporting from, if chosen
+        self.station = None
+        # IDs of confirmed reports that may not have reached the store yet
+        self.queued_ids = []
+
+    def visible_messages(self):
+        """Return (hidden_count, messages) for the newest window of the history"""
+        hidden = max(0, len(self.messages) - self.visible_count)
+        return hidden, self.messages[hidden:]
+
+    def show_older(self):
+        """Extend the visible history by one more window"""
+        self.visible_count += self.history_window
+
+    @property
+    def pending_message(self):
+        """The voice message whose transcript is still streaming in, if any"""
+        for message in reversed(self.messages):
+            if message.get("pending"):
+                return message
+        return None
+
+
+class ChatFlow:
+    """Event handlers that move a Conversation between states.
+
+    Each handler checks that the conversation is in a state that accepts the
+    event and runs the whole transition at once, so a single script pass
+    (usually a widget callback) takes the chat from one resting state to
+    the next. Confirmed reports are appended to ``outbox``, a local queue
+    that is synced to the report store in the background, and recordings
+    are staged there as soon as they are submitted. Report IDs come from
+    the numbers ``id_allocator`` has already reserved; if none are left,
+    the report is queued without one and numbered when it is stored. Callables in
+    ``on_persisted`` are invoked with every report once it is queued, and
+    ``similar`` (if given) returns past reports resembling a new one so
+    they can be shown while it is confirmed. ``machines`` is the
+    MachineRegistry a report's machine, plant and line are looked up in.
+    ``renumbered`` (if given) returns the ID a queued report was stored
+    under instead of the one the engineer was given, if it was taken.
+    """
+
+    def __init__(self, outbox, id_allocator, classifier, transcription_pool, prompt=None, similar=None,
+                 on_persisted=(), machines=None, renumbered=None):
+        self.outbox = outbox
+        self.renumbered = renumbered
+        self.machines = machines
+        self.id_allocator = id_allocator
+        self.classifier = classifier
+        self.transcription_pool = transcription_pool
+        self.prompt = prompt
+        self.similar = similar
+        self.on_persisted = list(on_persisted)
+
+    def _expect(self, conversation, states, event):
+        if conversation.state not in states:
+            raise InvalidTransition(f"Cannot handle {event} while {conversation.state}")
+
+    def submit_text(self, conversation, text):
+        """Engineer typed a report: classify it and ask for confirmation"""
+        text = text.strip()
+        if not text:
+            return
+        self._expect(conversation, READY_STATES, "submit_text")
+        conversation.messages.append({"role": "user", "content": text})
+        self._classify(conversation, text)
+
+    def submit_audio(self, conversation, audio_bytes):
+        """Engineer recorded a report: start transcribing it in the background"""
+        self._expect(conversation, READY_STATES, "submit_audio")
+        conversation.current_audio = self.outbox.stage_audio(audio_bytes)
+        conversation.transcription_job = self.transcription_pool.submit(audio_bytes)
+        conversation.messages.append({"role": "user", "content": VOICE_PREFIX, "pending": True})
+        conversation.state = TRANSCRIBING
+
+    def poll_transcription(self, conversation):
+        """Copy the partial transcript into the chat; return True once the job has finished"""
+        self._expect(conversation, (TRANSCRIBING,), "poll_transcription")
+        job = conversation.transcription_job
+        message = conversation.pending_message
+        message["content"] = VOICE_PREFIX + job.text
+        if not job.done:
+            return False
+        
+        conversation.transcription_job = None
+        if job.status == job.DONE and job.text:
+            del message["pending"]
+            self._classify(conversation, job.text)
+        else:
+            conversation.messages.remove(message)
+            conversation.messages.append({"role": "assistant", "content": TRANSCRIPTION_FAILED})
+            self._discard_audio(conversation)
+            conversation.state = AWAITING_INPUT
+        return True
+
+    def _discard_audio(self, conversation):
+        if conversation.current_audio:
+            self.outbox.discard_audio(conversation.current_audio)
+            conversation.current_audio = None
+
+    def _classify(self, conversation, text):
+        """Ask for confirmation of a classified report, or go back to waiting for input if that fails"""
+        try:
+            with span("classification"):
+                classification = self.classifier.classify(text)
+            prompt = self.prompt(text)
+        except Exception:
+            self._discard_audio(conversation)
+            conversation.messages.append({"role": "assistant", "content": CLASSIFICATION_FAILED})
+            conversation.state = AWAITING_INPUT
+            return
+        conversation.current_report = text
+        conversation.current_classification = classification
+        conversation.current_similar = self._find_similar(text)
+        conversation.messages.append({"role": "assistant", "content": prompt})
+        conversation.state = AWAITING_CONFIRMATION
+
+    def _find_similar(self, text):
+        """Past reports resembling ``text``; they are only context, so a failed search shows none"""
+        if not self.similar:
+            return []
+        try:
+            with span("similar_search"):
+                return self.similar(text)
+        except Exception:
+            return []
+
+    def confirm(self, conversation):
+        """Engineer confirmed the report: queue it for the store and report back"""
+        self._expect(conversation, (AWAITING_CONFIRMATION,), "confirm")
+        category, priority, _ = conversation.current_classification
+        report_id = self.id_allocator.try_next_id()
+        text = conversation.current_report
+        station = conversation.station
+        machine = self.machines.identify(text, plant=station and station.plant) if self.machines else None
+        if machine is not None:
+            name, plant, line = machine
+        else:
+            # Nothing registered is named, so the report is filed against the engineer's own line, if known
+            plant, line = station or (UNASSIGNED, UNASSIGNED)
+            name = line
+        report = {
+            "id": report_id,
+            "description": text,
+            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "category": category,
+            "priority": priority,
+            "machine": name,
+            "plant": plant,
+            "line": line
+        }
+        # A spoken report keeps its recording and the transcript it was classified from
+        audio = conversation.current_audio
+        self.outbox.append(report, transcript=text if audio else None, audio=audio)
+        if report_id and self.renumbered:
+            conversation.queued_ids.append(report_id)
+        created = (f"Report ID: {report_id} has been created." if report_id
+                   else "It will get its report ID as soon as it is saved.")
+        conversation.messages.append({
+            "role": "assistant",
+            "content": f"Report confirmed. I've categorized this as: {category}. Priority: {priority}. {created}"
+        })
+        conversation.current_report = None
+        conversation.current_classification = None
+        conversation.current_similar = []
+        conversation.current_audio = None
+        conversation.state = PERSISTED
+        for callback in self.on_persisted:
+            callback(report)
+        return report
+
+    def check_renumbered(self, conversation):
+        """Tell the engineer about confirmed reports that were stored under a different ID"""
+        if not conversation.queued_ids:
+            return
+        # Checked first: once the queue is empty, every report that was renumbered has its new ID recorded
+        synced = not self.outbox.pending_count()
+        for report_id in list(conversation.queued_ids):
+            stored_id = self.renumbered(report_id)
+            if stored_id:
+                conversation.queued_ids.remove(report_id)
+                conversation.messages.append({
+                    "role": "assistant",
+                    "content": f"Report {report_id} was saved as {stored_id}, because its ID was already in use. "
+                               f"Please refer to it as {stored_id}."
+                })
+        if synced:
+            conversation.queued_ids = []
+
+    def reject(self, conversation):
+        """Engineer rejected our understanding: ask for a corrected report"""
+        self._expect(conversation, (AWAITING_CONFIRMATION,), "reject")
+        self._discard_audio(conversation)
+        conversation.current_report = None
+        conversation.current_classification = None
+        conversation.current_similar = []
+        conversation.messages.append({"role": "assistant", "content": "Please provide a corrected report."})
+        conversation.state = AWAITING_INPUT
+
+    def reset(self, conversation):
+        """Clear the chat and return to waiting for input"""
+        self._discard_audio(conversation)
+        conversation.messages = []
+        conversation.visible_count = conversation.history_window
+        conversation.current_report = None
+        conversation.current_classification = None
+        conversation.current_similar = []
+        conversation.transcription_job = None
+        conversation.state = AWAITING_INPUT
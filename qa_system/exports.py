@@ -0,0 +1,289 @@
+"""Streaming exports of reports and aggregates, and PDF shift reports.
+
+Report exports read the store in chunks and hand each chunk to a writer
+generator, so a million-row export holds one chunk in memory at a time
+and never builds a DataFrame. Exports run as background jobs on a small
+worker pool and are written under a temporary name, then renamed, so a
+half-written file is never offered for download.
+"""
+import csv
+import datetime
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from qa_system.charts import draw_daily_counts, draw_impact_analysis
+from qa_system.metrics import span
+from qa_system.store import REPORT_COLUMNS
+
+FORMATS = ("csv", "parquet")
+
+EXTENSIONS = {"csv": "csv", "parquet": "parquet", "pdf": "pdf"}
+
+
+def csv_writer(path, columns):
+    """Generator writing each batch of row tuples it is sent to a CSV file"""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        while True:
+            rows = yield
+            writer.writerows(rows)
+
+
+def parquet_writer(path, columns):
+    """Generator writing each batch of row tuples it is sent to a Parquet file, one row group per batch
+
+    Column types are inferred from the first batch; later batches are cast
+    to the same schema.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise RuntimeError("Exporting Parquet files needs the pyarrow package") from exc
+    writer = None
+    try:
+        while True:
+            rows = yield
+            table = pa.Table.from_arrays([pa.array(values) for values in zip(*rows)], names=columns)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table.cast(writer.schema))
+    finally:
+        if writer is None:
+            # Nothing matched: still produce a valid, empty file
+            writer = pq.ParquetWriter(path, pa.schema([(column, pa.string()) for column in columns]))
+        writer.close()
+
+
+WRITERS = {
+    "csv": csv_writer,
+    "parquet": parquet_writer,
+}
+
+
+def write_batches(batches, path, columns, fmt="csv", progress=None):
+    """Write an iterable of row-tuple batches to ``path``; return the number of rows"""
+    writer = WRITERS[fmt](path, columns)
+    next(writer)
+    rows = 0
+    try:
+        for batch in batches:
+            writer.send(batch)
+            rows += len(batch)
+            if progress:
+                progress(rows)
+    finally:
+        # Closing runs the writer's cleanup, which flushes and closes the file
+        writer.close()
+    return rows
+
+
+def frame_batches(frame, batch_size=10000):
+    """Yield a DataFrame's rows as batches of tuples"""
+    rows = frame.itertuples(index=False, name=None)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def export_reports(store, path, fmt="csv", batch_size=50000, progress=None, **filters):
+    """Stream the reports matching the filters to a CSV or Parquet file, in insertion order"""
+    batches = store.iter_columns(REPORT_COLUMNS, batch_size=batch_size, **filters)
+    return write_batches(batches, path, REPORT_COLUMNS, fmt, progress)
+
+
+def _text_page(fig, title, lines):
+    fig.text(0.08, 0.92, title, fontsize=18, fontweight="bold", va="top")
+    y = 0.85
+    for line in lines:
+        bold = line.startswith("## ")
+        fig.text(0.08, y, line[3:] if bold else line, fontsize=12 if bold else 10,
+                 fontweight="bold" if bold else "normal", va="top")
+        y -= 0.04 if bold else 0.03
+        if y < 0.05:
+            break
+
+
+def write_shift_report(path, store, aggregator, detector, topics, recommend, shift_hours=8, now=None, **filters):
+    """Write a PDF summary of the last shift with the dashboard charts; return its page count
+
+    ``topics`` maps a topic name to its chart settings as in the Analysis
+    tab, and ``recommend`` turns trend alerts into recommended actions.
+    The shift's reports, limited to a plant or line by ``filters``, are
+    counted in one streamed pass over the store.
+    """
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+
+    now = now or datetime.datetime.now()
+    since = (now - datetime.timedelta(hours=shift_hours)).strftime("%Y-%m-%d %H:%M:%S")
+    until = now.strftime("%Y-%m-%d %H:%M:%S")
+    categories = Counter()
+    priorities = Counter()
+    machines = Counter()
+    for batch in store.iter_columns(["category", "priority", "machine"], since=since, until=until, **filters):
+        for category, priority, machine in batch:
+            categories[category] += 1
+            priorities[priority] += 1
+            machines[machine] += 1
+
+    aggregator.sync(store)
+    detector.sync(store)
+    alerts = detector.alerts()
+    scope = ", ".join(filters.values()) or "All plants"
+    lines = [f"{scope}: shift {since} to {until}", f"{sum(categories.values())} reports filed", ""]
+    lines.append("## Reports by priority")
+    lines += [f"{priority}: {count}" for priority, count in priorities.most_common()] or ["None"]
+    lines.append("## Most reported categories")
+    lines += [f"{category}: {count}" for category, count in categories.most_common(8)] or ["None"]
+    lines.append("## Machines with the most reports")
+    lines += [f"{machine}: {count}" for machine, count in machines.most_common(5)] or ["None"]
+    lines.append("## Rising trends")
+    lines += [
+        f"{alert.machine}, {alert.category}: {alert.recent_rate:.1f}/day vs {alert.baseline_rate:.1f}/day"
+        for alert in alerts[:6]
+    ] or ["No rising trends"]
+    lines.append("## Recommended actions")
+    lines += [f"- {action}" for action in recommend(alerts)] or ["None"]
+
+    pages = 0
+    with PdfPages(path) as pdf:
+        fig = Figure(figsize=(8.27, 11.69))
+        _text_page(fig, "Quality Shift Report", lines)
+        pdf.savefig(fig)
+        pages += 1
+        for topic in topics.values():
+            dates, counts = aggregator.daily_counts(**topic["filter"])
+            fig = Figure(figsize=(11.69, 8.27))
+            draw_daily_counts(fig, dates, counts, topic["chart_label"])
+            fig.tight_layout()
+            pdf.savefig(fig)
+            pages += 1
+        if alerts:
+            fig = Figure(figsize=(11.69, 8.27))
+            draw_impact_analysis(fig)
+            fig.tight_layout()
+            pdf.savefig(fig)
+            pages += 1
+    return pages
+
+
+class ExportJob:
+    """Handle for one background export; ``rows`` grows as batches are written"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, name, path, total=None):
+        self.name = name
+        self.path = path
+        self.total = total
+        self.rows = 0
+        self.status = self.QUEUED
+        self.error = None
+        self._finished = threading.Event()
+
+    @property
+    def filename(self):
+        return os.path.basename(self.path)
+
+    @property
+    def done(self):
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes; return True if it did"""
+        return self._finished.wait(timeout)
+
+    def _progress(self, rows):
+        self.rows = rows
+
+    def _finish(self, status, error=None):
+        self.status = status
+        self.error = error
+        self._finished.set()
+
+
+class ExportService:
+    """Runs exports on a bounded worker pool and writes them into ``directory``.
+
+    Finished files older than ``ttl`` seconds are removed whenever a new
+    export starts, so the directory does not grow without bound.
+    """
+
+    def __init__(self, directory, max_workers=2, ttl=3600):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export")
+
+    def _new_job(self, name, extension, total=None):
+        self.remove_expired()
+        # Unguessable, since the directory may be served to anyone who has the link
+        path = os.path.join(self.directory, f"{name}-{uuid.uuid4().hex[:16]}.{extension}")
+        return ExportJob(name, path, total)
+
+    def _run(self, job, write):
+        job.status = ExportJob.RUNNING
+        partial = job.path + ".part"
+        try:
+            with span("export"):
+                write(partial, job._progress)
+            os.replace(partial, job.path)
+        except Exception as exc:
+            if os.path.exists(partial):
+                os.remove(partial)
+            job._finish(ExportJob.FAILED, error=str(exc))
+        else:
+            job._finish(ExportJob.DONE)
+
+    def submit(self, name, extension, write, total=None):
+        """Run ``write(path, progress)`` in the background and return its job handle"""
+        job = self._new_job(name, extension, total)
+        self._executor.submit(self._run, job, write)
+        return job
+
+    def export_reports(self, store, fmt="csv", batch_size=50000, **filters):
+        """Export the reports matching the filters in the background"""
+        return self.submit(
+            "reports", EXTENSIONS[fmt],
+            lambda path, progress: export_reports(store, path, fmt, batch_size, progress, **filters),
+            total=store.count(**filters)
+        )
+
+    def export_frame(self, name, frame, fmt="csv"):
+        """Export a small DataFrame, such as an analytics answer, in the background"""
+        columns = [str(column) for column in frame.columns]
+        return self.submit(
+            name, EXTENSIONS[fmt],
+            lambda path, progress: write_batches(frame_batches(frame), path, columns, fmt, progress),
+            total=len(frame)
+        )
+
+    def shift_report(self, store, aggregator, detector, topics, recommend, shift_hours=8, **filters):
+        """Build a PDF shift report in the background"""
+        return self.submit(
+            "shift-report", EXTENSIONS["pdf"],
+            lambda path, progress: write_shift_report(path, store, aggregator, detector, topics, recommend,
+                                                      shift_hours, **filters)
+        )
+
+    def remove_expired(self):
+        """Delete finished exports older than the TTL"""
+        cutoff = time.time() - self.ttl
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".part") and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,21 @@
+"""Advisory file locks for files shared by several server processes."""
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # No file locking: only one server process may share the locked files
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on ``path`` shared by every process using it"""
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
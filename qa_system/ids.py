@@ -0,0 +1,88 @@
+import datetime
+import re
+import threading
+
+_NUMBERED_ID = re.compile(r"QA-(\d{4})-(\d+)")
+
+
+def format_report_id(year, number):
+    """Format a report ID such as QA-2023-0471"""
+    return f"QA-{year}-{number:04d}"
+
+
+def parse_report_id(report_id):
+    """Return ``(year, number)`` for a numbered report ID, or None for any other ID"""
+    match = _NUMBERED_ID.fullmatch(report_id)
+    return (int(match[1]), int(match[2])) if match else None
+
+
+class ReportIdAllocator:
+    """Unique report IDs for every session and process sharing a store.
+
+    Numbers are reserved from the store's per-year sequence in blocks of
+    ``block_size``, so most calls are served from memory without touching
+    the database. ``next_id`` reserves a new block itself when the current
+    one runs out; ``try_next_id`` never touches the store, and relies on
+    ``refill`` being called from a background thread to reserve the next
+    block ahead of time. IDs increase monotonically within one allocator;
+    across processes they are unique, and each process's block comes after
+    every block handed out before it. A block left unused when a process
+    exits simply leaves a gap in the sequence.
+    """
+
+    def __init__(self, store, block_size=50, today=datetime.date.today):
+        self.store = store
+        self.block_size = block_size
+        self._today = today
+        self._lock = threading.Lock()
+        self._year = None
+        self._next = 0
+        self._end = 0
+        # First number of a block reserved ahead, and its year
+        self._spare = None
+
+    def _take(self, year):
+        """Return the next reserved number for the year, or None; called with the lock held"""
+        if self._year != year or self._next >= self._end:
+            if self._spare is None or self._spare[0] != year:
+                return None
+            self._year, self._next = self._spare
+            self._end = self._next + self.block_size
+            self._spare = None
+        number = self._next
+        self._next += 1
+        return number
+
+    def next_id(self):
+        """Allocate the next report ID for the current year, reserving a block if none is left"""
+        with self._lock:
+            year = self._today().year
+            number = self._take(year)
+            if number is None:
+                self._next = self.store.reserve_ids(year, self.block_size)
+                self._end = self._next + self.block_size
+                self._year = year
+                number = self._take(year)
+        return format_report_id(year, number)
+
+    def try_next_id(self):
+        """Allocate the next report ID from the numbers already reserved; return None if there are none"""
+        with self._lock:
+            year = self._today().year
+            number = self._take(year)
+        return None if number is None else format_report_id(year, number)
+
+    def refill(self):
+        """Reserve a block ahead unless one is already waiting; return True if one was reserved"""
+        year = self._today().year
+        with self._lock:
+            if self._spare is not None and self._spare[0] == year:
+                return False
+        # Reserved without holding the lock, so try_next_id never waits on the store
+        start = self.store.reserve_ids(year, self.block_size)
+        with self._lock:
+            if self._year != year or self._next >= self._end:
+                self._year, self._next, self._end = year, start, start + self.block_size
+            else:
+                self._spare = (year, start)
+        return True
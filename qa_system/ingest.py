@@ -0,0 +1,218 @@
+"""Bulk import of historical QA reports from CSV, JSONL or Parquet exports.
+
+Usage::
+
+    python -m qa_system.ingest exports/2021.csv exports/2022.parquet --map "Defect Text=description"
+
+Files are streamed in chunks of ``--batch-size`` rows. Each chunk is
+categorized with the same classifier as the engineer chat (for rows
+without a category) and written in a single transaction, so memory stays
+flat however large the file is.
+"""
+import argparse
+import csv
+import datetime
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+
+from qa_system.cache import CachedClassifier
+from qa_system.classifier import PRIORITIES, get_classifier
+from qa_system.machines import MachineRegistry
+from qa_system.store import DEFAULT_DB_PATH, ReportStore
+
+FORMATS = ("csv", "jsonl", "parquet")
+
+IngestStats = namedtuple("IngestStats", ["rows", "stored", "duplicates", "conflicts", "rejected", "seconds"])
+
+
+def detect_format(path):
+    """Guess the file format from its extension"""
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if extension in ("json", "ndjson"):
+        extension = "jsonl"
+    if extension == "pq":
+        extension = "parquet"
+    if extension not in FORMATS:
+        raise ValueError(f"Cannot tell the format of {path}; pass --format")
+    return extension
+
+
+def read_csv(path, batch_size):
+    with open(path, newline="", encoding="utf-8") as f:
+        chunk = []
+        for row in csv.DictReader(f):
+            chunk.append(row)
+            if len(chunk) == batch_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def read_jsonl(path, batch_size):
+    with open(path, encoding="utf-8") as f:
+        chunk = []
+        for line in f:
+            if line.strip():
+                chunk.append(json.loads(line))
+                if len(chunk) == batch_size:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+
+def read_parquet(path, batch_size):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise RuntimeError("Importing Parquet files needs the pyarrow package") from exc
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield batch.to_pylist()
+
+
+READERS = {
+    "csv": read_csv,
+    "jsonl": read_jsonl,
+    "parquet": read_parquet,
+}
+
+
+def _normalize_timestamp(value):
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return datetime.datetime.fromisoformat(str(value).strip()).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _prepare(rows, source, first_row, column_map):
+    """Map source columns and validate rows; return (reports, rejected count)"""
+    reports = []
+    rejected = 0
+    for offset, row in enumerate(rows):
+        if column_map:
+            row = {column_map.get(key, key): value for key, value in row.items()}
+        description = str(row.get("description") or "").strip()
+        try:
+            timestamp = _normalize_timestamp(row["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            timestamp = None
+        if not description or timestamp is None:
+            rejected += 1
+            continue
+        report_id = row.get("id")
+        if not report_id:
+            # Stable per source row, so re-importing a file does not duplicate it
+            digest = hashlib.sha1(f"{source}:{first_row + offset}".encode()).hexdigest()
+            report_id = f"QA-IMP-{digest[:12].upper()}"
+        priority = str(row.get("priority") or "").strip().capitalize()
+        reports.append({
+            "id": str(report_id),
+            "description": description,
+            "timestamp": timestamp,
+            "category": str(row.get("category") or "").strip(),
+            "priority": priority if priority in PRIORITIES else "",
+            "machine": str(row.get("machine") or "Unknown").strip(),
+        })
+    return reports, rejected
+
+
+def _count_conflicts(store, reports):
+    """Number of reports whose ID is stored with a different description or timestamp"""
+    conflicts = 0
+    for start in range(0, len(reports), 500):
+        chunk = reports[start:start + 500]
+        stored = {report["id"]: report for report in store.get_many([report["id"] for report in chunk])}
+        conflicts += sum(
+            1 for report in chunk
+            if (stored[report["id"]]["description"], stored[report["id"]]["timestamp"])
+            != (report["description"], report["timestamp"])
+        )
+    return conflicts
+
+
+def ingest_file(path, store, classifier, fmt=None, batch_size=5000, column_map=None, progress=None):
+    """Stream one export file into the store and return its IngestStats
+
+    Rows whose ID is already stored are skipped. Those stored with the same
+    description and timestamp were imported before and count as
+    duplicates; the rest clash with a different report, such as one filed
+    in the chat, and count as conflicts.
+    """
+    reader = READERS[fmt or detect_format(path)]
+    started = time.perf_counter()
+    rows = stored = duplicates = conflicts = rejected = 0
+    for chunk in reader(path, batch_size):
+        reports, chunk_rejected = _prepare(chunk, os.path.abspath(path), rows, column_map)
+        rows += len(chunk)
+        rejected += chunk_rejected
+        
+        # A row's own category decides its priority when the taxonomy knows it
+        for report in reports:
+            if report["category"] in classifier.categories and not report["priority"]:
+                report["priority"] = classifier.categories[report["category"]]["priority"]
+        # Categorize in one batch, only the rows still missing a category or priority
+        unclassified = [report for report in reports if not report["category"] or not report["priority"]]
+        results = classifier.classify_batch([report["description"] for report in unclassified])
+        for report, (category, priority, _) in zip(unclassified, results):
+            report["category"] = report["category"] or category
+            report["priority"] = report["priority"] or priority
+        
+        chunk_stored = store.add_many(reports, ignore_duplicates=True)
+        chunk_conflicts = _count_conflicts(store, reports) if chunk_stored < len(reports) else 0
+        stored += chunk_stored
+        conflicts += chunk_conflicts
+        duplicates += len(reports) - chunk_stored - chunk_conflicts
+        if progress:
+            progress(IngestStats(rows, stored, duplicates, conflicts, rejected, time.perf_counter() - started))
+    return IngestStats(rows, stored, duplicates, conflicts, rejected, time.perf_counter() - started)
+
+
+def _parse_column_map(pairs):
+    column_map = {}
+    for pair in pairs:
+        source, sep, target = pair.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"Column mapping {pair!r} must look like SOURCE=TARGET")
+        column_map[source] = target
+    return column_map
+
+
+def _print_progress(stats):
+    rate = stats.rows / stats.seconds if stats.seconds else 0
+    print(f"\r  {stats.rows:,} rows, {stats.stored:,} stored ({rate:,.0f} rows/s)", end="", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import historical QA reports into the report store.")
+    parser.add_argument("files", nargs="+", help="CSV, JSONL or Parquet files to import")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="report database (default: %(default)s)")
+    parser.add_argument("--format", choices=FORMATS, help="file format (default: from the extension)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per transaction (default: %(default)s)")
+    parser.add_argument("--map", action="append", default=[], metavar="SOURCE=TARGET",
+                        help="rename a source column to a report field; may be repeated")
+    parser.add_argument("--classifier", help="classifier backend (default: QA_CLASSIFIER or keyword)")
+    parser.add_argument("--registry", help="machine registry used to file reports by plant and line "
+                                           "(default: QA_MACHINE_REGISTRY_PATH or the bundled one)")
+    args = parser.parse_args(argv)
+    
+    store = ReportStore(args.db, seed=False, partition=MachineRegistry.load(args.registry).partition)
+    classifier = CachedClassifier(get_classifier(args.classifier))
+    column_map = _parse_column_map(args.map)
+    for path in args.files:
+        print(f"Importing {path}", file=sys.stderr)
+        stats = ingest_file(path, store, classifier, fmt=args.format, batch_size=args.batch_size,
+                            column_map=column_map, progress=_print_progress)
+        rate = stats.rows / stats.seconds if stats.seconds else 0
+        print(f"\r  {stats.rows:,} rows in {stats.seconds:.1f}s ({rate:,.0f} rows/s): "
+              f"{stats.stored:,} stored, {stats.duplicates:,} duplicates, "
+              f"{stats.conflicts:,} conflicting IDs, {stats.rejected:,} rejected",
+              file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
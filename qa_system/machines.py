@@ -0,0 +1,80 @@
+import json
+import os
+import re
+from collections import namedtuple
+
+# Registry shipped with the app; QA_MACHINE_REGISTRY_PATH points at a replacement
+DEFAULT_REGISTRY_PATH = os.path.join(os.path.dirname(__file__), "machines.json")
+
+# Plant and line of reports whose machine is not in the registry
+UNASSIGNED = "Unassigned"
+
+Machine = namedtuple("Machine", ["name", "plant", "line"])
+
+# A slice of the reports that is aggregated on its own
+Partition = namedtuple("Partition", ["plant", "line"])
+
+
+class MachineRegistry:
+    """Plants, their production lines and the machines on each line.
+
+    A line can be reported against like a machine, as in "Assembly line 3".
+    Names are matched case-insensitively and must be unique across plants,
+    since a report's machine name alone decides its partition.
+    """
+
+    def __init__(self, plants):
+        self._machines = {}
+        self._lines = {}
+        for plant in plants:
+            lines = self._lines.setdefault(plant["plant"], [])
+            for line in plant["lines"]:
+                lines.append(line["line"])
+                for name in [line["line"]] + line["machines"]:
+                    key = name.lower()
+                    if key in self._machines:
+                        raise ValueError(f"Machine {name!r} is registered twice")
+                    self._machines[key] = Machine(name, plant["plant"], line["line"])
+        # Longest names first, so "Assembly line 3" wins over a shorter name inside it
+        names = sorted(self._machines, key=len, reverse=True)
+        self._pattern = re.compile(r"\b(" + "|".join(re.escape(name) for name in names) + r")\b") if names else None
+
+    @classmethod
+    def load(cls, path=None):
+        """Load the registry from a JSON file"""
+        path = path or os.environ.get("QA_MACHINE_REGISTRY_PATH") or DEFAULT_REGISTRY_PATH
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def plants(self):
+        return list(self._lines)
+
+    def lines(self, plant):
+        return list(self._lines.get(plant, []))
+
+    def partitions(self):
+        """Every (plant, line) partition in the registry"""
+        return [Partition(plant, line) for plant, lines in self._lines.items() for line in lines]
+
+    def names(self):
+        """Every registered machine and line name"""
+        return [machine.name for machine in self._machines.values()]
+
+    def get(self, name):
+        """Return the registered Machine with this name, or None"""
+        return self._machines.get(name.strip().lower())
+
+    def partition(self, name):
+        """Return the (plant, line) a machine name belongs to, Unassigned if it is not registered"""
+        machine = self.get(name)
+        return Partition(machine.plant, machine.line) if machine else Partition(UNASSIGNED, UNASSIGNED)
+
+    def identify(self, text, plant=None):
+        """Return the registered machine a report mentions, preferring one in ``plant``"""
+        if self._pattern is None:
+            return None
+        found = [self._machines[match] for match in self._pattern.findall(text.lower())]
+        for machine in found:
+            if plant is None or machine.plant == plant:
+                return machine
+        return found[0] if found else None
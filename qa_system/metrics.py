@@ -0,0 +1,257 @@
+import bisect
+import contextvars
+import json
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds in seconds, from cache hits to slow transcriptions
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Session whose script run is executing in the current thread
+_current_session = contextvars.ContextVar("qa_session", default=None)
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram, cumulative like a Prometheus histogram"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def cumulative(self):
+        """Return ``(upper bound, observations at or below it)`` pairs, ending with +Inf"""
+        with self._lock:
+            counts = list(self._counts)
+        pairs = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside its bucket"""
+        pairs = self.cumulative()
+        total = pairs[-1][1]
+        if not total:
+            return None
+        rank = q * total
+        lower, below = 0.0, 0
+        for bound, cumulative in pairs:
+            if cumulative >= rank:
+                if bound == float("inf"):
+                    return lower
+                inside = cumulative - below
+                return lower + (bound - lower) * ((rank - below) / inside if inside else 0)
+            lower, below = bound, cumulative
+        return lower
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            **{f"p{int(q * 100)}": self.quantile(q) for q in (0.5, 0.9, 0.99)},
+        }
+
+
+def deep_sizeof(value, _seen=None):
+    """Approximate memory held by an object graph, counting shared objects once"""
+    seen = _seen if _seen is not None else set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, (str, bytes, bytearray, int, float, bool, type(None))):
+        return size
+    if isinstance(value, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset, deque)):
+        size += sum(deep_sizeof(item, seen) for item in value)
+    elif hasattr(value, "__dict__"):
+        size += deep_sizeof(vars(value), seen)
+    return size
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+
+class MetricsRegistry:
+    """Stage timings, per session and process-wide, plus session gauges.
+
+    Stages are timed with :meth:`span`. A span inside a Streamlit script run
+    is also recorded against that session once :meth:`set_session` has been
+    called for the run; work on background threads only counts globally.
+    Sessions not seen for ``session_ttl`` seconds are forgotten. Sizing a
+    session's state walks all of it, so it is only re-measured every
+    ``state_sample_every`` runs of the session.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, session_ttl=1800, state_sample_every=20, clock=time.monotonic):
+        self.buckets = buckets
+        self.session_ttl = session_ttl
+        self.state_sample_every = state_sample_every
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._sessions = {}
+
+    def _histogram(self, histograms, stage):
+        histogram = histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = histograms.setdefault(stage, Histogram(self.buckets))
+        return histogram
+
+    def _sorted(self, histograms):
+        with self._lock:
+            return sorted(histograms.items())
+
+    def set_session(self, session_id, state=None):
+        """Attribute the current thread's spans to a session and now and then record its state size
+
+        ``state`` is a callable returning the session state; it is only
+        called on the session's first run and every ``state_sample_every``
+        runs after that.
+        """
+        _current_session.set(session_id)
+        with self._lock:
+            session = self._sessions.setdefault(session_id, {"stages": {}, "state_bytes": 0, "runs": 0})
+            session["seen"] = self._clock()
+            sample = state is not None and session["runs"] % self.state_sample_every == 0
+            if state is not None:
+                session["runs"] += 1
+        if sample:
+            session["state_bytes"] = deep_sizeof(state())
+
+    def observe(self, stage, seconds, session_id=None):
+        self._histogram(self._stages, stage).observe(seconds)
+        session = self._sessions.get(session_id) if session_id else None
+        if session is not None:
+            self._histogram(session["stages"], stage).observe(seconds)
+
+    @contextmanager
+    def span(self, stage):
+        """Time the enclosed block as one observation of ``stage``"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started, _current_session.get())
+
+    def active_sessions(self):
+        """Return ``{session_id: session}`` for sessions seen recently, forgetting the rest"""
+        cutoff = self._clock() - self.session_ttl
+        with self._lock:
+            for session_id in [s for s, session in self._sessions.items() if session["seen"] < cutoff]:
+                del self._sessions[session_id]
+            return dict(self._sessions)
+
+    def snapshot(self):
+        """Summaries of every histogram and gauge, for logs and the sidebar"""
+        sessions = self.active_sessions()
+        return {
+            "time": time.time(),
+            "active_sessions": len(sessions),
+            "session_state_bytes": sum(session["state_bytes"] for session in sessions.values()),
+            "stages": {stage: histogram.summary() for stage, histogram in self._sorted(self._stages)},
+            "sessions": {
+                session_id: {
+                    "state_bytes": session["state_bytes"],
+                    "stages": {stage: histogram.summary() for stage, histogram in self._sorted(session["stages"])},
+                }
+                for session_id, session in sessions.items()
+            },
+        }
+
+    def render_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        sessions = self.active_sessions()
+        lines = []
+
+        def histogram_lines(name, histogram, **labels):
+            for bound, count in histogram.cumulative():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_labels(**labels, le=le)} {count}")
+            lines.append(f"{name}_sum{_labels(**labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_labels(**labels)} {histogram.count}")
+
+        lines += ["# HELP qa_stage_seconds Time spent in each instrumented stage",
+                  "# TYPE qa_stage_seconds histogram"]
+        for stage, histogram in self._sorted(self._stages):
+            histogram_lines("qa_stage_seconds", histogram, stage=stage)
+        lines += ["# HELP qa_session_stage_seconds Time spent in each stage by a session's script runs",
+                  "# TYPE qa_session_stage_seconds histogram"]
+        for session_id, session in sorted(sessions.items()):
+            for stage, histogram in self._sorted(session["stages"]):
+                histogram_lines("qa_session_stage_seconds", histogram, session=session_id, stage=stage)
+        lines += ["# HELP qa_active_sessions Sessions that ran the script recently",
+                  "# TYPE qa_active_sessions gauge",
+                  f"qa_active_sessions {len(sessions)}",
+                  "# HELP qa_session_state_bytes Approximate size of a session's st.session_state",
+                  "# TYPE qa_session_state_bytes gauge"]
+        for session_id, session in sorted(sessions.items()):
+            lines.append(f"qa_session_state_bytes{_labels(session=session_id)} {session['state_bytes']}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry used by the app and the qa_system services
+METRICS = MetricsRegistry()
+
+
+def span(stage):
+    """Time a block against the process-wide registry"""
+    return METRICS.span(stage)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = METRICS
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host="127.0.0.1", registry=METRICS):
+    """Serve ``/metrics`` in Prometheus format from a daemon thread; return the server"""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+def start_metrics_log(path, interval=60.0, registry=METRICS):
+    """Append a JSON snapshot of the metrics to ``path`` every ``interval`` seconds"""
+    stop = threading.Event()
+
+    def write_snapshots():
+        while not stop.wait(interval):
+            with open(path, "a") as log:
+                log.write(json.dumps(registry.snapshot()) + "\n")
+
+    threading.Thread(target=write_snapshots, name="metrics-log", daemon=True).start()
+    return stop
@@ -0,0 +1,294 @@
+import datetime
+import json
+import os
+import re
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from qa_system.cache import TTLCache, normalize_text
+from qa_system.classifier import FALLBACK_CATEGORY, PRIORITIES, KeywordClassifier, load_taxonomy
+from qa_system.columns import EPOCH_ORDINAL, ReportColumns
+
+QueryPlan = namedtuple("QueryPlan", [
+    "category", "category_prefix", "machine", "priority", "since", "until", "period", "group_by"
+])
+
+# Report families a question can name without matching a specific category
+FAMILIES = [
+    (re.compile(r"\b(?:product )?defects?\b"), "PRODUCT DEFECT"),
+    (re.compile(r"\b(?:equipment )?malfunctions?\b|\bbreakdowns?\b"), "EQUIPMENT MALFUNCTION"),
+    (re.compile(r"\bsafety\b"), "SAFETY HAZARD"),
+    (re.compile(r"\bmaterial\b|\bsupplier\b"), "MATERIAL ISSUE"),
+]
+
+PERIODS = {"day": "D", "week": "W", "month": "M", "quarter": "Q", "year": "Y"}
+GROUP_COLUMNS = ("machine", "category", "priority", "plant", "line")
+
+_MACHINE = re.compile(r"\b((?:machine|press|assembly line|line|pump|robot|oven|conveyor)\s+#?\w*\d\w*)", re.I)
+_GROUPING = re.compile(r"\b(?:by|per|each)\s+(day|week|month|quarter|year|machine|category|priority|plant|line)\b")
+_LAST_N = re.compile(r"\b(?:last|past)\s+(\d+)\s+(day|week|month|year)s?\b")
+_RELATIVE = re.compile(r"\b(this|last|past)\s+(week|month|quarter|year)\b")
+_SINCE = re.compile(r"\bsince\s+(\d{4}-\d{2}-\d{2})\b")
+
+
+def _period_start(day, unit):
+    """First day of the calendar week/month/quarter/year containing ``day``"""
+    if unit == "week":
+        return day - datetime.timedelta(days=day.weekday())
+    if unit == "month":
+        return day.replace(day=1)
+    if unit == "quarter":
+        return day.replace(month=3 * ((day.month - 1) // 3) + 1, day=1)
+    return day.replace(month=1, day=1)
+
+
+def _shift_months(day, months):
+    month = day.month - 1 + months
+    return day.replace(year=day.year + month // 12, month=month % 12 + 1, day=1)
+
+
+class RuleQueryParser:
+    """Turns an analytics question into a QueryPlan with a small rule grammar.
+
+    It understands a report type (any taxonomy keyword, or a family such as
+    "product defects"), a machine name, a priority, a time range ("last
+    quarter", "past 14 days", "since 2023-01-01") and a grouping ("by week",
+    "per machine"). ``known_machines`` may return the stored machine names,
+    so a machine mentioned in any letter case is matched to its stored spelling.
+    """
+
+    name = "rules"
+
+    def __init__(self, classifier=None, known_machines=None, today=datetime.date.today):
+        self.classifier = classifier or KeywordClassifier()
+        self.known_machines = known_machines
+        self._today = today
+
+    def parse(self, question):
+        text = normalize_text(question)
+        category = category_prefix = None
+        match = self.classifier.classify(text)
+        if match.category != FALLBACK_CATEGORY:
+            category = match.category
+        else:
+            for pattern, prefix in FAMILIES:
+                if pattern.search(text):
+                    category_prefix = prefix
+                    break
+        
+        machine = self._machine(question)
+        priority = next((p for p in PRIORITIES if re.search(rf"\b{p.lower()}\b(?:[ -]priority)?", text)
+                         and "priority" in text), None)
+        since, until = self._time_range(text)
+        
+        period = group_by = None
+        for unit in _GROUPING.findall(text):
+            if unit in PERIODS and period is None:
+                period = unit
+            elif unit in GROUP_COLUMNS and group_by is None:
+                group_by = unit
+        return QueryPlan(category, category_prefix, machine, priority, since, until, period, group_by)
+
+    def _machine(self, question):
+        lowered = question.lower()
+        if self.known_machines is not None:
+            for machine in sorted(self.known_machines(), key=len, reverse=True):
+                if re.search(rf"\b{re.escape(machine.lower())}\b", lowered):
+                    return machine
+        match = _MACHINE.search(question)
+        return match.group(1).capitalize() if match else None
+
+    def _time_range(self, text):
+        today = self._today()
+        tomorrow = (today + datetime.timedelta(days=1)).isoformat()
+        if "today" in text:
+            return today.isoformat(), tomorrow
+        if "yesterday" in text:
+            return (today - datetime.timedelta(days=1)).isoformat(), today.isoformat()
+        match = _LAST_N.search(text)
+        if match:
+            n, unit = int(match.group(1)), match.group(2)
+            if unit == "month":
+                return _shift_months(today, -n).replace(day=min(today.day, 28)).isoformat(), tomorrow
+            days = {"day": 1, "week": 7, "year": 365}[unit] * n
+            return (today - datetime.timedelta(days=days)).isoformat(), tomorrow
+        match = _RELATIVE.search(text)
+        if match:
+            which, unit = match.groups()
+            start = _period_start(today, unit)
+            if which == "this":
+                return start.isoformat(), tomorrow
+            months = {"month": 1, "quarter": 3, "year": 12}.get(unit)
+            previous = start - datetime.timedelta(days=7) if unit == "week" else _shift_months(start, -months)
+            return previous.isoformat(), start.isoformat()
+        match = _SINCE.search(text)
+        if match:
+            return match.group(1), tomorrow
+        return None, None
+
+
+def _is_date(value):
+    try:
+        datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+class LLMQueryParser:
+    """Parses questions into QueryPlans with an OpenAI model, falling back to the rules.
+
+    A plan is only used if every field is valid: the category is in the
+    taxonomy (or the prefix starts one of its categories), the priority,
+    period and grouping are known ones, and the dates are YYYY-MM-DD.
+    Otherwise the question goes to ``fallback``.
+    """
+
+    name = "llm"
+
+    def __init__(self, fallback=None, model=None, known_machines=None, today=datetime.date.today, taxonomy=None):
+        self.fallback = fallback or RuleQueryParser(known_machines=known_machines, today=today)
+        self.categories = [entry["category"] for entry in (taxonomy if taxonomy is not None else load_taxonomy())]
+        self.model = model or os.environ.get("QA_LLM_MODEL", "gpt-4o-mini")
+        self._today = today
+        try:
+            from openai import OpenAI
+            self._client = OpenAI() if os.environ.get("OPENAI_API_KEY") else None
+        except ImportError:
+            self._client = None
+
+    def parse(self, question):
+        if self._client is None:
+            return self.fallback.parse(question)
+        try:
+            response = self._client.chat.completions.create(
+                model=self.model,
+                temperature=0,
+                response_format={"type": "json_object"},
+                messages=[
+                    {"role": "system", "content": (
+                        f"Today is {self._today().isoformat()}. Turn the question about industrial quality "
+                        f"reports into a JSON object with the keys {', '.join(QueryPlan._fields)}. "
+                        "category is an exact report category or null; category_prefix is a category "
+                        "prefix such as \"PRODUCT DEFECT\" or null; since/until are YYYY-MM-DD dates "
+                        "(until exclusive) or null; period is one of day, week, month, quarter, year or "
+                        f"null; group_by is one of {', '.join(GROUP_COLUMNS)} or null."
+                    )},
+                    {"role": "user", "content": question},
+                ],
+            )
+            answer = json.loads(response.choices[0].message.content)
+            plan = QueryPlan(**{field: answer.get(field) or None for field in QueryPlan._fields})
+        except Exception:
+            return self.fallback.parse(question)
+        return plan if self._valid(plan) else self.fallback.parse(question)
+
+    def _valid(self, plan):
+        """Whether every field of a model's plan can be run and used as a cache key"""
+        if not all(value is None or isinstance(value, str) for value in plan):
+            return False
+        return ((plan.category is None or plan.category in self.categories)
+                and (plan.category_prefix is None
+                     or any(category.startswith(plan.category_prefix) for category in self.categories))
+                and plan.priority in (None, *PRIORITIES)
+                and all(value is None or _is_date(value) for value in (plan.since, plan.until))
+                and (plan.period is None or plan.period in PERIODS)
+                and (plan.group_by is None or plan.group_by in GROUP_COLUMNS))
+
+
+PARSERS = {
+    RuleQueryParser.name: RuleQueryParser,
+    LLMQueryParser.name: LLMQueryParser,
+}
+
+
+def get_query_parser(name=None, **options):
+    """Instantiate a question parser by name (``QA_QUERY_PARSER`` by default)"""
+    name = name or os.environ.get("QA_QUERY_PARSER", "rules")
+    try:
+        parser_class = PARSERS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown query parser {name!r}; choose one of {', '.join(sorted(PARSERS))}"
+        ) from None
+    return parser_class(**options)
+
+
+def describe_plan(plan):
+    """One-line, human-readable summary of a query plan"""
+    parts = [plan.category or (f"{plan.category_prefix} reports" if plan.category_prefix else "all reports")]
+    if plan.machine:
+        parts.append(f"on {plan.machine}")
+    if plan.priority:
+        parts.append(f"with {plan.priority} priority")
+    if plan.since:
+        parts.append(f"from {plan.since}")
+    if plan.until:
+        parts.append(f"until {plan.until}")
+    if plan.period:
+        parts.append(f"by {plan.period}")
+    if plan.group_by:
+        parts.append(f"per {plan.group_by}")
+    return " ".join(parts)
+
+
+class QueryEngine:
+    """Runs QueryPlans over a columnar mirror of the report store.
+
+    The plan's filters become boolean masks over the ReportColumns arrays,
+    and grouping is a single ``np.bincount`` over combined period and group
+    codes, so a question costs a few vectorized passes whatever the number
+    of reports. Results are cached per plan and data version. With
+    ``filters`` the engine only covers the matching reports, such as one
+    plant and line.
+    """
+
+    def __init__(self, store, columns=None, cache=None, filters=None):
+        self.store = store
+        self.columns = columns if columns is not None else ReportColumns()
+        self.cache = cache if cache is not None else TTLCache(max_entries=256, ttl=600)
+        self.filters = filters or {}
+
+    def run(self, plan):
+        """Return a DataFrame of report counts for the plan"""
+        self.columns.sync(self.store, **self.filters)
+        key = (plan, self.columns.version)
+        return self.cache.get_or_compute(key, lambda: self._run(plan))
+
+    def _run(self, plan):
+        days, codes, values = self.columns.select(
+            category=plan.category, category_prefix=plan.category_prefix, machine=plan.machine,
+            priority=plan.priority, since=plan.since, until=plan.until
+        )
+        keys = (["period"] if plan.period else []) + ([plan.group_by] if plan.group_by else [])
+        if not keys:
+            return pd.DataFrame({"reports": [len(days)]})
+        if not len(days):
+            return pd.DataFrame(columns=keys + ["reports"])
+        
+        period_count, period_key, period_labels = 1, 0, None
+        if plan.period:
+            # Map every calendar day in range to its period once, then index by day
+            first = int(days.min())
+            calendar = pd.to_datetime(np.arange(first, int(days.max()) + 1) - EPOCH_ORDINAL, unit="D")
+            day_periods, period_labels = pd.factorize(calendar.to_period(PERIODS[plan.period]).start_time)
+            period_count = len(period_labels)
+            period_key = day_periods[days - first].astype(np.int64)
+        
+        group_count, group_key, group_labels = 1, 0, None
+        if plan.group_by:
+            group_labels = np.array(values[plan.group_by], dtype=object)
+            group_count = len(group_labels)
+            group_key = codes[plan.group_by]
+        
+        counts = np.bincount(period_key * group_count + group_key, minlength=period_count * group_count)
+        present = np.flatnonzero(counts)
+        result = {}
+        if plan.period:
+            result["period"] = period_labels[present // group_count]
+        if plan.group_by:
+            result[plan.group_by] = group_labels[present % group_count]
+        result["reports"] = counts[present]
+        return pd.DataFrame(result).sort_values(keys, ignore_index=True)
@@ -0,0 +1,299 @@
+"""Durable local queue for confirmed reports, and the worker that syncs it.
+
+Confirming a report appends one JSON line to an append-only log on local
+disk and returns; a background worker then copies queued reports, with
+their transcript and recording, to the shared report store in batches.
+Every queued report carries a unique key that the store records with it,
+so a batch that is sent again after a crash or a lost connection is
+stored once, while a report whose ID turns out to be taken by a different
+report is stored under a fresh one.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from qa_system.filelock import file_lock
+
+LOG_NAME = "queue.log"
+ACK_NAME = "queue.ack"
+LOCK_NAME = "queue.lock"
+SYNC_LOCK_NAME = "queue.sync.lock"
+AUDIO_DIR = "audio"
+
+
+def _write_atomic(path, data, fsync=True):
+    partial = path + ".part"
+    with open(partial, "wb") as f:
+        f.write(data)
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+    os.replace(partial, path)
+
+
+class ReportOutbox:
+    """Append-only write-ahead queue of confirmed reports in ``directory``.
+
+    ``queue.log`` holds one JSON entry per line and ``queue.ack`` the byte
+    offset up to which entries have reached the store. A line cut short by
+    a crash is dropped when the queue is opened. Recordings are kept as
+    separate files under ``audio/`` from the moment they are submitted,
+    so they never have to sit in session memory while the report is
+    being confirmed. With ``fsync`` every append is on disk before it
+    returns.
+
+    Server processes sharing a database share its queue. Appends and
+    acknowledgements hold a lock on ``queue.lock``, and the ack offset is
+    read from disk rather than kept per process, so one process emptying
+    the log never loses another's append; :meth:`syncing` lets only one
+    process at a time copy entries to the store.
+    """
+
+    def __init__(self, directory, fsync=True):
+        self.directory = directory
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._appended = threading.Condition(self._lock)
+        os.makedirs(os.path.join(directory, AUDIO_DIR), exist_ok=True)
+        self._log_path = os.path.join(directory, LOG_NAME)
+        self._ack_path = os.path.join(directory, ACK_NAME)
+        self._lock_path = os.path.join(directory, LOCK_NAME)
+        self._sync_lock_path = os.path.join(directory, SYNC_LOCK_NAME)
+        with file_lock(self._lock_path):
+            self._recover()
+        self._log = open(self._log_path, "ab")
+
+    def _read_ack(self):
+        try:
+            with open(self._ack_path, "rb") as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _recover(self):
+        """Drop a trailing partial line left by a crash mid-append"""
+        if not os.path.exists(self._log_path):
+            return
+        with open(self._log_path, "rb+") as f:
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                f.truncate(end)
+        if self._read_ack() > end:
+            _write_atomic(self._ack_path, str(end).encode(), self.fsync)
+
+    def _read_entries(self, offset, limit=None):
+        """Yield ``(end offset, entry)`` for the entries after ``offset``"""
+        try:
+            f = open(self._log_path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(offset)
+            for line in f:
+                if (limit is not None and limit <= 0) or not line.endswith(b"\n"):
+                    # The last line may still be being written
+                    return
+                offset += len(line)
+                yield offset, json.loads(line)
+                if limit is not None:
+                    limit -= 1
+
+    def audio_path(self, name):
+        return os.path.join(self.directory, AUDIO_DIR, name)
+
+    def stage_audio(self, data):
+        """Keep a submitted recording on disk and return the name to queue it under"""
+        name = f"{uuid.uuid4().hex}.wav"
+        _write_atomic(self.audio_path(name), data, self.fsync)
+        return name
+
+    def discard_audio(self, name):
+        """Delete a staged recording whose report was rejected or abandoned"""
+        try:
+            os.remove(self.audio_path(name))
+        except FileNotFoundError:
+            pass
+
+    def append(self, report, transcript=None, audio=None):
+        """Queue a confirmed report, with its transcript and staged recording if it was spoken"""
+        entry = {"key": uuid.uuid4().hex, "report": report, "transcript": transcript, "audio": audio}
+        line = json.dumps(entry).encode() + b"\n"
+        with self._lock, file_lock(self._lock_path):
+            self._log.write(line)
+            self._log.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+            self._appended.notify_all()
+
+    def pending_count(self):
+        """Number of queued reports not yet in the store, from every process sharing the queue"""
+        acked = self._read_ack()
+        try:
+            if os.path.getsize(self._log_path) <= acked:
+                return 0
+            with open(self._log_path, "rb") as f:
+                f.seek(acked)
+                return f.read().count(b"\n")
+        except FileNotFoundError:
+            return 0
+
+    def wait(self, timeout=None):
+        """Block until something is queued or ``timeout`` passes; return True if anything is pending
+
+        Only appends from this process end the wait early.
+        """
+        with self._appended:
+            if not self.pending_count():
+                self._appended.wait(timeout)
+        return self.pending_count() > 0
+
+    @contextmanager
+    def syncing(self):
+        """Hold the right to copy entries to the store, so processes sharing the queue never both send them"""
+        with file_lock(self._sync_lock_path):
+            yield
+
+    def peek(self, limit=500):
+        """Return up to ``limit`` of the oldest unsynced entries and the offset to acknowledge each one with
+
+        Acknowledging an entry's offset acknowledges every entry before it too.
+        Call it inside :meth:`syncing`.
+        """
+        entries = []
+        offsets = []
+        for offset, entry in self._read_entries(self._read_ack(), limit):
+            entries.append(entry)
+            offsets.append(offset)
+        return entries, offsets
+
+    def read_audio(self, name):
+        """Return a staged recording, or None if it was already synced and removed"""
+        try:
+            with open(self.audio_path(name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def acknowledge(self, entries, offset):
+        """Mark the entries returned by :meth:`peek` as stored and free their recordings
+
+        Once every queued entry is acknowledged the log is emptied, so it
+        only ever holds the reports that are still waiting.
+        """
+        with self._lock, file_lock(self._lock_path):
+            # No process can be appending while the lock is held
+            if offset >= os.fstat(self._log.fileno()).st_size:
+                self._log.truncate(0)
+                offset = 0
+            _write_atomic(self._ack_path, str(offset).encode(), self.fsync)
+        for entry in entries:
+            if entry["audio"]:
+                self.discard_audio(entry["audio"])
+
+    def remove_orphaned_audio(self, max_age=86400):
+        """Delete staged recordings older than ``max_age`` seconds that no queued report refers to"""
+        queued = {entry["audio"] for _, entry in self._read_entries(self._read_ack())}
+        cutoff = time.time() - max_age
+        for entry in os.scandir(os.path.join(self.directory, AUDIO_DIR)):
+            if entry.name not in queued and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+
+    def close(self):
+        with self._lock:
+            self._log.close()
+
+
+class OutboxSync:
+    """Background thread copying queued reports to the store in batches.
+
+    When the store cannot be written, the batch stays queued and is
+    retried with exponential backoff up to ``max_backoff`` seconds, and
+    ``last_error`` says why meanwhile. A report whose ID already belongs to
+    a different stored report is stored under a fresh ID instead, and
+    :meth:`renumbered_id` returns that ID until it is collected. Callables
+    in ``on_synced`` are invoked once per batch with the list of reports it
+    stored. Between batches the thread also keeps ``id_allocator`` topped
+    up, so confirming a report never waits on the store for an ID.
+    """
+
+    # Renumbered IDs remembered for sessions that have not collected them yet
+    MAX_RENUMBERED = 1000
+
+    def __init__(self, outbox, store, batch_size=500, max_backoff=60.0, on_synced=(), id_allocator=None):
+        self.outbox = outbox
+        self.store = store
+        self.id_allocator = id_allocator
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.on_synced = list(on_synced)
+        self.last_error = None
+        self._renumbered = OrderedDict()
+        self._renumbered_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="outbox-sync", daemon=True)
+
+    def start(self):
+        self.outbox.remove_orphaned_audio()
+        self._thread.start()
+        return self
+
+    def renumbered_id(self, report_id):
+        """Return the ID a queued report was stored under because ``report_id`` was taken, once; else None"""
+        with self._renumbered_lock:
+            return self._renumbered.pop(report_id, None)
+
+    def sync_once(self):
+        """Store one batch of queued reports; return how many were acknowledged"""
+        with self.outbox.syncing():
+            return self._sync_batch()
+
+    def _sync_batch(self):
+        entries, offsets = self.outbox.peek(self.batch_size)
+        if not entries:
+            return 0
+        reports = [entry["report"] for entry in entries]
+        media = [
+            (entry["transcript"], self.outbox.read_audio(entry["audio"]) if entry["audio"] else None)
+            if entry["transcript"] or entry["audio"] else None
+            for entry in entries
+        ]
+        # Entries queued before keys were added are matched on their contents
+        stored, renumbered = self.store.add_queued(reports, [entry.get("key") for entry in entries], media)
+        # Recorded before the acknowledgement, so an empty queue means every new ID is known
+        with self._renumbered_lock:
+            self._renumbered.update(renumbered)
+            while len(self._renumbered) > self.MAX_RENUMBERED:
+                self._renumbered.popitem(last=False)
+        self.outbox.acknowledge(entries, offsets[-1])
+        if stored:
+            for callback in self.on_synced:
+                callback(stored)
+        return len(entries)
+
+    def _run(self):
+        backoff = 0.0
+        while not self._stop.is_set():
+            try:
+                if self.id_allocator is not None:
+                    self.id_allocator.refill()
+                if self.outbox.pending_count():
+                    self.sync_once()
+            except Exception as exc:
+                self.last_error = str(exc)
+                backoff = min(self.max_backoff, backoff * 2 or 1.0)
+            else:
+                self.last_error = None
+                backoff = 0.0
+            if backoff:
+                self._stop.wait(backoff)
+            else:
+                self.outbox.wait(timeout=1.0)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._thread.join(timeout)
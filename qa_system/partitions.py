@@ -0,0 +1,250 @@
+"""Analytics per plant and line on worker processes, merged into rollups.
+
+Each (plant, line) partition keeps its own trend counters, trend detector
+and columnar copy of its reports in one worker process, picked by hashing
+the partition, so the state is built once and then synced incrementally
+from the shared store. A chart or question for a plant fans out to that
+plant's partitions in parallel. Results are cached per partition and
+data version, so a cross-plant rollup only recomputes the partitions that
+received reports since it last ran and merges the rest from cached
+partials; every figure merged this way is a count, so the merge is exact.
+"""
+import datetime
+import multiprocessing
+import sys
+import threading
+import types
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from qa_system.aggregates import TrendAggregator
+from qa_system.cache import TTLCache
+from qa_system.machines import Partition
+from qa_system.metrics import span
+from qa_system.trends import alert_strength
+
+# Worker process state: its own store connection and the partitions routed to it
+_worker_store = None
+_worker_partitions = {}
+
+
+class _PartitionState:
+    """Everything a worker keeps for one partition"""
+
+    def __init__(self, store, partition, days):
+        from qa_system.nlquery import QueryEngine
+        from qa_system.trends import TrendDetector
+
+        self.store = store
+        self.filters = {"plant": partition.plant, "line": partition.line}
+        self.aggregator = TrendAggregator(days=days)
+        self.detector = TrendDetector()
+        self.engine = QueryEngine(store, filters=self.filters)
+
+    def sync(self):
+        self.aggregator.sync(self.store, **self.filters)
+        self.detector.sync(self.store, **self.filters)
+
+    def daily_counts(self, **filters):
+        return self.aggregator.daily_counts(**filters)
+
+    def alerts(self, **filters):
+        return self.detector.alerts(**filters)
+
+    def query(self, plan):
+        return self.engine.run(plan)
+
+
+def _init_worker(store_path):
+    global _worker_store
+    from qa_system.store import ReportStore
+    _worker_store = ReportStore(store_path, seed=False)
+
+
+def _compute(partition, days, method, args=(), kwargs=()):
+    """Run ``method`` on a partition's state in a worker process, building the state on first use"""
+    state = _worker_partitions.get(partition)
+    if state is None:
+        state = _worker_partitions[partition] = _PartitionState(_worker_store, partition, days)
+    state.sync()
+    if method == "sync":
+        return None
+    return getattr(state, method)(*args, **dict(kwargs))
+
+
+def _start_workers(executors):
+    """Start each executor's worker process without re-running the app script in it
+
+    Streamlit runs the app script as ``__main__``, and a spawned process
+    re-imports ``__main__`` before it does anything else. The workers only
+    need this module, so they are started while ``__main__`` is a blank
+    module.
+    """
+    main = sys.modules["__main__"]
+    blank = sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        for executor in executors:
+            # A pool starts its process on the first submission
+            executor.submit(int)
+    finally:
+        if sys.modules["__main__"] is blank:
+            sys.modules["__main__"] = main
+
+
+class PartitionedAnalytics:
+    """Trend counts, trend alerts and analytics questions computed per partition.
+
+    Partitions are spread over ``workers`` single-process pools, so each
+    partition's state lives in exactly one process. ``registry`` (a
+    MachineRegistry) lets a question about one machine go straight to
+    that machine's partition. Workers are started with ``spawn``, since
+    forking a threaded server process is unsafe, when the object is
+    created.
+    """
+
+    def __init__(self, store, workers=2, registry=None, days=28, cache=None):
+        self.store = store
+        self.registry = registry
+        self.days = days
+        context = multiprocessing.get_context("spawn")
+        self._shards = [
+            ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_init_worker,
+                                initargs=(store.path,))
+            for _ in range(max(1, workers))
+        ]
+        _start_workers(self._shards)
+        self._partials = cache if cache is not None else TTLCache(max_entries=4096, max_bytes=64 * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._seq = 0
+
+    def _shard(self, partition):
+        return self._shards[zlib.crc32(f"{partition.plant}\0{partition.line}".encode()) % len(self._shards)]
+
+    def sync(self):
+        """Note which partitions received reports since the last sync; return how many did"""
+        with self._lock:
+            if self.store.version() == self._seq:
+                return 0
+            changed = self.store.partition_versions(after_seq=self._seq)
+            self._versions.update(changed)
+            self._seq = max([self._seq, *changed.values()])
+            return len(changed)
+
+    def warm(self):
+        """Build every partition's state in the background, so the first dashboard does not wait for it"""
+        self.sync()
+        for partition in list(self._versions):
+            self._shard(partition).submit(_compute, partition, self.days, "sync")
+
+    def partitions(self, plant=None, line=None):
+        """The partitions holding reports, optionally only those of one plant or line"""
+        return sorted(
+            partition for partition in self._versions
+            if (plant is None or partition.plant == plant) and (line is None or partition.line == line)
+        )
+
+    def version(self, plant=None, line=None):
+        """A value that changes whenever a report is added to the selected partitions"""
+        return tuple((partition, self._versions[partition]) for partition in self.partitions(plant, line))
+
+    def _gather(self, partitions, method, args=(), kwargs=()):
+        """Return each partition's result, computing only those not cached for its current version"""
+        today = datetime.date.today().toordinal()
+        results = {}
+        pending = {}
+        for partition in partitions:
+            key = (partition, self._versions[partition], today, method, args, kwargs)
+            cached = self._partials.get(key)
+            if cached is not None:
+                results[partition] = cached
+            else:
+                pending[partition] = (key, self._shard(partition).submit(
+                    _compute, partition, self.days, method, args, kwargs
+                ))
+        for partition, (key, future) in pending.items():
+            results[partition] = future.result()
+            self._partials.set(key, results[partition])
+        return [results[partition] for partition in partitions]
+
+    def daily_counts(self, plant=None, line=None, **filters):
+        """Return (dates, counts) over the window, summed across the selected partitions"""
+        self.sync()
+        with span("partition_rollup"):
+            partials = self._gather(self.partitions(plant, line), "daily_counts",
+                                    kwargs=tuple(sorted(filters.items())))
+        if not partials:
+            return TrendAggregator(days=self.days).daily_counts()
+        dates, counts = partials[0]
+        for _, partial in partials[1:]:
+            counts = counts + partial
+        return dates, counts
+
+    def alerts(self, plant=None, line=None, **filters):
+        """Return the rising (machine, category) keys of the selected partitions, strongest first"""
+        self.sync()
+        with span("partition_rollup"):
+            partials = self._gather(self.partitions(plant, line), "alerts", kwargs=tuple(sorted(filters.items())))
+        return sorted((alert for partial in partials for alert in partial), key=alert_strength, reverse=True)
+
+    def query(self, plan, plant=None, line=None):
+        """Answer a QueryPlan over the selected partitions as one DataFrame of report counts"""
+        import pandas as pd
+
+        self.sync()
+        partitions = self.partitions(plant, line)
+        machine = self.registry.get(plan.machine) if self.registry and plan.machine else None
+        if machine is not None:
+            partitions = [partition for partition in partitions
+                          if partition == Partition(machine.plant, machine.line)]
+        with span("partition_rollup"):
+            frames = [frame for frame in self._gather(partitions, "query", args=(plan,)) if not frame.empty]
+        keys = (["period"] if plan.period else []) + ([plan.group_by] if plan.group_by else [])
+        if not keys:
+            return pd.DataFrame({"reports": [sum(int(frame["reports"].sum()) for frame in frames)]})
+        if not frames:
+            return pd.DataFrame(columns=keys + ["reports"])
+        merged = pd.concat(frames, ignore_index=True)
+        return merged.groupby(keys, as_index=False, sort=True)["reports"].sum()
+
+    def scope(self, plant=None, line=None):
+        """The view of one plant or line, or of every plant, that a dashboard works with"""
+        return AnalyticsScope(self, plant, line)
+
+    def shutdown(self):
+        for shard in self._shards:
+            shard.shutdown(wait=False, cancel_futures=True)
+
+
+class AnalyticsScope:
+    """Partitioned analytics restricted to one plant or line, or covering all of them.
+
+    It offers the ``sync``, ``daily_counts`` and ``alerts`` methods of
+    TrendAggregator and TrendDetector, so it can stand in for them.
+    """
+
+    def __init__(self, analytics, plant=None, line=None):
+        self.analytics = analytics
+        self.plant = plant
+        self.line = line
+
+    @property
+    def filters(self):
+        """Store filters selecting the reports in scope"""
+        return {key: value for key, value in (("plant", self.plant), ("line", self.line)) if value}
+
+    @property
+    def version(self):
+        return self.analytics.version(self.plant, self.line)
+
+    def sync(self, store=None):
+        return self.analytics.sync()
+
+    def daily_counts(self, **filters):
+        return self.analytics.daily_counts(self.plant, self.line, **filters)
+
+    def alerts(self, **filters):
+        return self.analytics.alerts(self.plant, self.line, **filters)
+
+    def run(self, plan):
+        return self.analytics.query(plan, self.plant, self.line)
@@ -0,0 +1,116 @@
+import json
+import threading
+import weakref
+from collections import deque
+
+
+class LocalPubSub:
+    """One subscriber's view of a LocalBroker, mirroring redis-py's PubSub"""
+
+    def __init__(self, broker, max_pending):
+        self._broker = broker
+        self._pending = deque(maxlen=max_pending)
+        self._ready = threading.Condition()
+        self.channels = set()
+
+    def subscribe(self, *channels):
+        self.channels.update(channels)
+        self._broker._register(self)
+
+    def unsubscribe(self, *channels):
+        self.channels.difference_update(channels or set(self.channels))
+
+    def _deliver(self, message):
+        with self._ready:
+            self._pending.append(message)
+            self._ready.notify()
+
+    def get_message(self, timeout=0.0):
+        """Return the next message, or None if none arrives within ``timeout`` seconds"""
+        with self._ready:
+            if not self._pending and timeout:
+                self._ready.wait(timeout)
+            return self._pending.popleft() if self._pending else None
+
+    def close(self):
+        self.channels.clear()
+        self._pending.clear()
+
+
+class LocalBroker:
+    """In-process publish/subscribe with a redis-py compatible surface.
+
+    Subscribers are held weakly, so a subscription owned by a browser
+    session disappears with it, and each keeps at most ``max_pending``
+    undelivered messages so an idle dashboard cannot grow without bound.
+    """
+
+    def __init__(self, max_pending=1000):
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._subscribers = weakref.WeakSet()
+
+    def pubsub(self):
+        return LocalPubSub(self, self.max_pending)
+
+    def _register(self, subscriber):
+        with self._lock:
+            self._subscribers.add(subscriber)
+
+    def publish(self, channel, data):
+        """Deliver a message to every subscriber of the channel; return how many got it"""
+        message = {"type": "message", "channel": channel, "data": data}
+        with self._lock:
+            receivers = [subscriber for subscriber in self._subscribers if channel in subscriber.channels]
+        for subscriber in receivers:
+            subscriber._deliver(message)
+        return len(receivers)
+
+
+class RedisPubSub:
+    """redis-py PubSub that decodes JSON payloads"""
+
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    def subscribe(self, *channels):
+        self._pubsub.subscribe(*channels)
+
+    def unsubscribe(self, *channels):
+        self._pubsub.unsubscribe(*channels)
+
+    def get_message(self, timeout=0.0):
+        message = self._pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if message is None:
+            return None
+        channel = message["channel"]
+        return {
+            "type": "message",
+            "channel": channel.decode() if isinstance(channel, bytes) else channel,
+            "data": json.loads(message["data"]),
+        }
+
+    def close(self):
+        self._pubsub.close()
+
+
+class RedisBroker:
+    """Publish/subscribe through a Redis server, shared by every process using it"""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("A Redis event broker needs the redis package") from exc
+        self._client = redis.Redis.from_url(url)
+
+    def pubsub(self):
+        return RedisPubSub(self._client.pubsub())
+
+    def publish(self, channel, data):
+        return self._client.publish(channel, json.dumps(data))
+
+
+def connect_broker(url=None):
+    """Return a RedisBroker for a redis:// URL, or an in-process LocalBroker"""
+    return RedisBroker(url) if url else LocalBroker()
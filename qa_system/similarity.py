@@ -0,0 +1,330 @@
+import glob
+import json
+import os
+import re
+import threading
+import zlib
+from array import array
+
+import numpy as np
+
+from qa_system.filelock import file_lock
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbedder:
+    """Dependency-free embedding: hashed word, bigram and character-trigram counts.
+
+    Features are hashed into ``dim`` signed buckets with CRC32, which is
+    stable across processes, so vectors written by one process can be
+    searched by another. Counts are log-scaled and the vector L2-normalized.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    def _features(self, text):
+        words = _TOKEN.findall(text.lower())
+        features = list(words)
+        features += [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f"#{word}#"
+            features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+        return features
+
+    def embed(self, texts):
+        """Return a (len(texts), dim) float32 matrix of unit vectors"""
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode())
+                vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class SentenceTransformerEmbedder:
+    """Embedding with a local sentence-transformers model"""
+
+    name = "sentence-transformers"
+
+    def __init__(self, model_name="all-MiniLM-L6-v2"):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as exc:
+            raise RuntimeError(
+                "The sentence-transformers embedder needs the sentence-transformers package"
+            ) from exc
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts):
+        """Return a (len(texts), dim) float32 matrix of unit vectors"""
+        return self.model.encode(list(texts), normalize_embeddings=True).astype(np.float32)
+
+
+EMBEDDERS = {
+    HashingEmbedder.name: HashingEmbedder,
+    SentenceTransformerEmbedder.name: SentenceTransformerEmbedder,
+}
+
+
+def get_embedder(name=None, **options):
+    """Instantiate an embedder by name (``QA_EMBEDDER`` by default)"""
+    name = name or os.environ.get("QA_EMBEDDER", "hashing")
+    try:
+        embedder_class = EMBEDDERS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown embedder {name!r}; choose one of {', '.join(sorted(EMBEDDERS))}"
+        ) from None
+    return embedder_class(**options)
+
+
+# Vectors are unit length, so each component fits int8 once scaled by this
+QUANTIZATION_SCALE = 127.0
+
+# Bumped whenever the layout of the persisted index files changes
+INDEX_FORMAT = "int8-ivf"
+
+
+def quantize(vectors):
+    """Store unit vectors as int8, a quarter of the memory of float32"""
+    return np.clip(np.rint(vectors * QUANTIZATION_SCALE), -127, 127).astype(np.int8)
+
+
+def train_centroids(vectors, count, iterations=8, seed=0):
+    """Spherical k-means: return ``count`` unit centroids for the rows of ``vectors``"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), count, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(labels, kind="stable")
+        sizes = np.bincount(labels, minlength=count)
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        filled = sizes > 0
+        centroids[filled] = np.add.reduceat(vectors[order], starts[filled])
+        # Restart empty clusters from random vectors
+        centroids[~filled] = vectors[rng.choice(len(vectors), int((~filled).sum()))]
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+
+class VectorIndex:
+    """Incremental, persisted cosine index over report descriptions.
+
+    Vectors are kept as int8 in one in-memory matrix that grows by
+    doubling, about 256 bytes per report with the default embedder. Until
+    the index holds ``train_size`` vectors a search scores all of them.
+    After that, k-means ``lists`` centroids are trained once and every
+    vector is filed under its nearest centroid (an inverted-file index).
+    A search then scores only the vectors under the ``probes`` centroids
+    nearest the query, a few thousand out of a million.
+
+    Each sync appends the new rows to ``<base>.vectors.*`` files, so a
+    restart reloads the index instead of re-embedding every report.
+    Several server processes can share the files: a sync holds a file
+    lock and first loads the rows other processes have added. A report
+    is therefore embedded by only one of them.
+    """
+
+    def __init__(self, base_path, embedder=None, lists=1024, probes=16, train_size=32768):
+        self.embedder = embedder or HashingEmbedder()
+        self.dim = self.embedder.dim
+        self.lists = lists
+        self.probes = probes
+        self.train_size = max(train_size, lists)
+        self._base_path = f"{base_path}.vectors"
+        self._codes_path = f"{self._base_path}.i8"
+        self._ids_path = f"{self._base_path}.ids"
+        self._assignments_path = f"{self._base_path}.lists"
+        self._centroids_path = f"{self._base_path}.centroids"
+        self._meta_path = f"{self._base_path}.json"
+        self._lock_path = f"{self._base_path}.lock"
+        # Guards the in-memory index; syncs are serialized separately so searches never wait on embedding
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._ids = []
+        self._ids_bytes = 0
+        self._codes = np.zeros((1024, self.dim), dtype=np.int8)
+        self._centroids = None
+        self._members = []
+        self._seq = 0
+        with self._sync_lock, file_lock(self._lock_path):
+            self._load_new_rows()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _read_meta(self):
+        try:
+            with open(self._meta_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self):
+        meta = {"embedder": self.embedder.name, "dim": self.dim, "format": INDEX_FORMAT,
+                "count": len(self._ids), "ids_bytes": self._ids_bytes, "seq": self._seq,
+                "lists": 0 if self._centroids is None else len(self._centroids)}
+        partial = self._meta_path + ".part"
+        with open(partial, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(partial, self._meta_path)
+
+    def _load_new_rows(self):
+        """Load rows persisted since this index last looked, by an earlier run or another process
+
+        Called with the file lock held. Rows written after the last
+        completed sync are cut off, so later appends stay aligned.
+        """
+        meta = self._read_meta()
+        if meta is None or (meta.get("embedder"), meta.get("dim"), meta.get("format")) != (
+                self.embedder.name, self.dim, INDEX_FORMAT):
+            # Nothing completed, or vectors from a different embedder or layout that are not
+            # comparable; rebuild from scratch
+            for path in glob.glob(glob.escape(self._base_path) + ".*"):
+                if path != self._lock_path:
+                    os.remove(path)
+            return
+        count = meta["count"]
+        os.truncate(self._codes_path, count * self.dim)
+        os.truncate(self._ids_path, meta["ids_bytes"])
+        if meta["lists"]:
+            os.truncate(self._assignments_path, count * 4)
+        start = len(self._ids)
+        if count > start:
+            with open(self._ids_path, "rb") as f:
+                f.seek(self._ids_bytes)
+                ids = f.read(meta["ids_bytes"] - self._ids_bytes).decode("utf-8").splitlines()
+            codes = np.fromfile(self._codes_path, dtype=np.int8, count=(count - start) * self.dim,
+                                offset=start * self.dim)
+            self._append(ids, codes.reshape(-1, self.dim))
+            self._ids_bytes = meta["ids_bytes"]
+        if meta["lists"] and self._centroids is None:
+            centroids = np.fromfile(self._centroids_path, dtype=np.float32).reshape(meta["lists"], self.dim)
+            self._set_lists(centroids, np.fromfile(self._assignments_path, dtype=np.int32, count=count))
+        elif meta["lists"] and count > start:
+            assignments = np.fromfile(self._assignments_path, dtype=np.int32, count=count - start,
+                                      offset=start * 4)
+            self._file_rows(start, assignments)
+        self._seq = meta["seq"]
+
+    def _append(self, ids, codes):
+        with self._lock:
+            needed = len(self._ids) + len(ids)
+            if needed > len(self._codes):
+                capacity = len(self._codes)
+                while capacity < needed:
+                    capacity *= 2
+                grown = np.zeros((capacity, self.dim), dtype=np.int8)
+                grown[:len(self._ids)] = self._codes[:len(self._ids)]
+                self._codes = grown
+            self._codes[len(self._ids):needed] = codes
+            self._ids.extend(ids)
+
+    @staticmethod
+    def _assign(codes, centroids):
+        """Return the nearest centroid of each quantized vector"""
+        assignments = np.empty(len(codes), dtype=np.int32)
+        for start in range(0, len(codes), 65536):
+            chunk = codes[start:start + 65536].astype(np.float32)
+            assignments[start:start + 65536] = np.argmax(chunk @ centroids.T, axis=1)
+        return assignments
+
+    def _set_lists(self, centroids, assignments):
+        members = [array("i") for _ in range(len(centroids))]
+        for row, centroid in enumerate(assignments.tolist()):
+            members[centroid].append(row)
+        with self._lock:
+            self._centroids = centroids
+            self._members = members
+
+    def _file_rows(self, start, assignments):
+        with self._lock:
+            for row, centroid in enumerate(assignments.tolist(), start):
+                self._members[centroid].append(row)
+
+    def _train(self):
+        """Train the centroids on a sample of the index and file every vector under one"""
+        count = len(self._ids)
+        sample = np.random.default_rng(0).choice(count, min(count, self.train_size), replace=False)
+        centroids = train_centroids(self._codes[np.sort(sample)].astype(np.float32), self.lists)
+        assignments = self._assign(self._codes[:count], centroids)
+        centroids.tofile(self._centroids_path)
+        assignments.tofile(self._assignments_path)
+        self._set_lists(centroids, assignments)
+
+    def sync(self, store, batch_size=2048):
+        """Embed and persist every report appended to the store since the last sync"""
+        with self._sync_lock, file_lock(self._lock_path):
+            self._load_new_rows()
+            added = 0
+            batch = []
+            for seq, report in store.iter_reports(after_seq=self._seq, with_seq=True):
+                batch.append((seq, report))
+                if len(batch) == batch_size:
+                    added += self._add_batch(batch)
+                    batch = []
+            if batch:
+                added += self._add_batch(batch)
+            return added
+
+    def _add_batch(self, batch):
+        ids = [report["id"] for _, report in batch]
+        codes = quantize(self.embedder.embed([report["description"] for _, report in batch]))
+        ids_text = "".join(f"{report_id}\n" for report_id in ids).encode("utf-8")
+        start = len(self._ids)
+        with open(self._codes_path, "ab") as f:
+            f.write(codes.tobytes())
+        with open(self._ids_path, "ab") as f:
+            f.write(ids_text)
+        self._append(ids, codes)
+        self._ids_bytes += len(ids_text)
+        if self._centroids is not None:
+            assignments = self._assign(codes, self._centroids)
+            with open(self._assignments_path, "ab") as f:
+                f.write(assignments.tobytes())
+            self._file_rows(start, assignments)
+        elif len(self._ids) >= self.train_size:
+            self._train()
+        self._seq = batch[-1][0]
+        # Written last: rows past the recorded count are dropped on the next load
+        self._write_meta()
+        return len(batch)
+
+    def search(self, text, k=5, min_score=0.3, exclude=()):
+        """Return up to k (report_id, score) pairs most similar to the text"""
+        query = self.embedder.embed([text])[0]
+        with self._lock:
+            n = len(self._ids)
+            if not n:
+                return []
+            if self._centroids is None:
+                rows = np.arange(n)
+                codes = self._codes[:n]
+            else:
+                nearest = self._centroids @ query
+                probes = min(self.probes, len(nearest))
+                lists = np.argpartition(-nearest, probes - 1)[:probes]
+                rows = np.concatenate([np.frombuffer(self._members[i], dtype=np.int32) for i in lists])
+                codes = self._codes[rows]
+            ids = self._ids
+        if not len(rows):
+            return []
+        scores = codes.astype(np.float32) @ query / QUANTIZATION_SCALE
+        wanted = min(len(rows), k + len(exclude))
+        top = np.argpartition(-scores, wanted - 1)[:wanted]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for index in top:
+            if scores[index] < min_score:
+                break
+            report_id = ids[rows[index]]
+            if report_id not in exclude:
+                results.append((report_id, round(float(scores[index]), 3)))
+        return results[:k]
@@ -0,0 +1,465 @@
+import datetime
+import itertools
+import os
+import sqlite3
+import threading
+
+from qa_system.ids import format_report_id, parse_report_id
+from qa_system.machines import UNASSIGNED, Partition
+
+# Default location of the shared report database
+DEFAULT_DB_PATH = os.environ.get("QA_DB_PATH", "qa_reports.db")
+
+# Columns exposed to the UI, in display order
+REPORT_COLUMNS = ["id", "description", "timestamp", "category", "priority", "machine", "plant", "line"]
+
+# Columns that may be used for filtering and sorting
+FILTER_COLUMNS = ["category", "priority", "machine", "plant", "line"]
+SORT_COLUMNS = ["timestamp", "id", "category", "priority", "machine", "plant", "line"]
+
+# Reports the demo database starts with
+SEED_REPORTS = [
+    {
+        "id": "QA-2023-0470",
+        "description": "Multiple scratches on product surface",
+        "timestamp": "2023-11-11 08:23:15",
+        "category": "PRODUCT DEFECT - EXTERIOR COMPONENT",
+        "priority": "Low",
+        "machine": "Assembly line 3"
+    },
+    {
+        "id": "QA-2023-0471",
+        "description": "Bearing making unusual noise",
+        "timestamp": "2023-11-11 09:45:22",
+        "category": "EQUIPMENT MALFUNCTION - NOISE",
+        "priority": "Medium",
+        "machine": "Press 2211"
+    }
+]
+
+# Oil leak reports per day for the last four weeks, most recent day first;
+# seeded so the Analysis tab has a history showing an increasing trend
+DEMO_OIL_LEAK_FREQUENCIES = [
+    2, 1, 1, 0, 1, 1, 0,
+    0, 1, 0, 0, 0, 1, 0,
+    0, 0, 1, 0, 0, 0, 0,
+    0, 0, 0, 0, 1, 0, 0,
+]
+
+
+def demo_history_reports(today=None):
+    """Generate the historical oil leak reports the demo database starts with"""
+    today = today or datetime.datetime.now()
+    reports = []
+    for days_ago in reversed(range(len(DEMO_OIL_LEAK_FREQUENCIES))):
+        day = today - datetime.timedelta(days=days_ago)
+        for i in range(DEMO_OIL_LEAK_FREQUENCIES[days_ago]):
+            reports.append({
+                "id": f"QA-{day.year}-H{len(reports) + 1:03d}",
+                "description": "Oil leaking from the hydraulic unit",
+                "timestamp": day.replace(hour=7 + 4 * i, minute=30, second=0).strftime("%Y-%m-%d %H:%M:%S"),
+                "category": "EQUIPMENT MALFUNCTION - FLUID LEAK",
+                "priority": "Medium",
+                "machine": "Machine 1234"
+            })
+    return reports
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    description TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    category TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    machine TEXT NOT NULL,
+    plant TEXT NOT NULL DEFAULT 'Unassigned',
+    line TEXT NOT NULL DEFAULT 'Unassigned'
+);
+CREATE INDEX IF NOT EXISTS idx_reports_timestamp ON reports (timestamp);
+CREATE INDEX IF NOT EXISTS idx_reports_category ON reports (category, timestamp);
+CREATE INDEX IF NOT EXISTS idx_reports_priority ON reports (priority, timestamp);
+CREATE INDEX IF NOT EXISTS idx_reports_machine ON reports (machine, timestamp);
+CREATE TABLE IF NOT EXISTS report_media (
+    report_id TEXT PRIMARY KEY,
+    transcript TEXT,
+    audio BLOB
+);
+CREATE TABLE IF NOT EXISTS id_sequences (
+    year INTEGER PRIMARY KEY,
+    next_value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS report_keys (
+    key TEXT PRIMARY KEY,
+    report_id TEXT NOT NULL
+);
+"""
+
+# Created after older databases gain the partition columns. Index entries end
+# with the rowid (seq), so the second one also reads a partition in seq order.
+PARTITION_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_reports_plant ON reports (plant, timestamp);
+CREATE INDEX IF NOT EXISTS idx_reports_partition ON reports (plant, line);
+"""
+
+
+class ReportStore:
+    """Shared, on-disk report store backed by SQLite in WAL mode.
+
+    One instance can be shared by every Streamlit session in the process;
+    each thread gets its own connection, and WAL lets readers run while an
+    engineer session is appending.
+
+    Every report belongs to a plant and production line. ``partition`` maps
+    a machine name to its ``(plant, line)``; it fills them in for reports
+    stored without them and, on opening, for stored reports still marked
+    Unassigned, such as those from before the machine was registered.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, seed=True, partition=None):
+        self.path = path
+        self.partition = partition
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        self._migrate(conn)
+        if seed and self.count() == 0:
+            self.add_many(SEED_REPORTS + demo_history_reports())
+        elif partition is not None:
+            self.assign_partitions()
+
+    def _migrate(self, conn):
+        """Add the partition columns to a database created before they existed"""
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(reports)")}
+        for column in ("plant", "line"):
+            if column not in existing:
+                conn.execute(f"ALTER TABLE reports ADD COLUMN {column} TEXT NOT NULL DEFAULT '{UNASSIGNED}'")
+        conn.executescript(PARTITION_INDEXES)
+
+    def assign_partitions(self):
+        """Move Unassigned reports whose machine is now known to its plant and line; return how many moved"""
+        conn = self._connect()
+        machines = [row[0] for row in conn.execute(
+            "SELECT DISTINCT machine FROM reports WHERE plant = ?", (UNASSIGNED,)
+        )]
+        moves = [(*self.partition(machine), machine) for machine in machines]
+        moves = [move for move in moves if move[0] != UNASSIGNED]
+        if not moves:
+            return 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = conn.total_changes
+            conn.executemany(f"UPDATE reports SET plant = ?, line = ? WHERE machine = ? AND plant = '{UNASSIGNED}'",
+                             moves)
+            moved = conn.total_changes - before
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return moved
+
+    def _row(self, report):
+        if "plant" not in report:
+            plant, line = self.partition(report["machine"]) if self.partition else (UNASSIGNED, UNASSIGNED)
+            report = dict(report, plant=plant, line=line)
+        return tuple(report[column] for column in REPORT_COLUMNS)
+
+    def _connect(self):
+        """Return the calling thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Close the calling thread's connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def add(self, report):
+        """Append a single report"""
+        self.add_many([report])
+        return report
+
+    def add_many(self, reports, ignore_duplicates=False, media=()):
+        """Append several reports in one transaction and return how many were stored
+
+        With ``ignore_duplicates`` reports whose ID already exists are skipped
+        instead of failing the whole batch, which makes re-running an import safe.
+        ``media`` holds ``(report_id, transcript, audio)`` rows for spoken
+        reports, stored in the same transaction.
+        """
+        rows = [self._row(report) for report in reports]
+        if not rows:
+            return 0
+        conn = self._connect()
+        verb = "INSERT OR IGNORE" if ignore_duplicates else "INSERT"
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = conn.total_changes
+            conn.executemany(
+                f"{verb} INTO reports ({', '.join(REPORT_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in REPORT_COLUMNS)})",
+                rows
+            )
+            stored = conn.total_changes - before
+            conn.executemany(
+                f"{verb} INTO report_media (report_id, transcript, audio) VALUES (?, ?, ?)", media
+            )
+            self._advance_sequences(conn, [report["id"] for report in reports])
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return stored
+
+    def add_queued(self, reports, keys, media=None):
+        """Store reports sent from a client-side queue exactly once; return ``(stored, renumbered)``
+
+        ``keys`` holds the unique key each report was given when it was
+        queued. A report whose key is already stored was sent before, in a
+        batch whose acknowledgement was lost, and is skipped; so is one
+        queued without a key whose ID, description and timestamp match a
+        stored report. Reports queued with an ID of None are numbered here,
+        from the sequence of the year they were filed in, and so is a report
+        whose ID belongs to a different stored report; ``renumbered`` lists
+        the ``(queued ID, stored ID)`` of the latter. ``media`` holds a
+        ``(transcript, audio)`` pair, or None, per report. ``stored`` lists
+        the reports written by this call, with their IDs.
+        """
+        if not reports:
+            return [], []
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            known = set()
+            existing = {}
+            for start in range(0, len(reports), 500):
+                chunk = [report for report in reports[start:start + 500] if report["id"] is not None]
+                chunk_keys = [key for key in keys[start:start + 500] if key]
+                known.update(key for key, in conn.execute(
+                    f"SELECT key FROM report_keys WHERE key IN ({', '.join('?' for _ in chunk_keys)})", chunk_keys
+                ))
+                existing.update(
+                    (row["id"], (row["description"], row["timestamp"])) for row in conn.execute(
+                        f"SELECT id, description, timestamp FROM reports WHERE id IN ({', '.join('?' for _ in chunk)})",
+                        [report["id"] for report in chunk]
+                    )
+                )
+            stored = []
+            conflicts = []
+            unnumbered = []
+            for report, key, report_media in zip(reports, keys, media or [None] * len(reports)):
+                if key in known:
+                    continue
+                if report["id"] in existing:
+                    if existing[report["id"]] == (report["description"], report["timestamp"]):
+                        continue
+                    # Taken by a different report, such as imported history: store it under a fresh ID
+                    conflicts.append((report["id"], len(stored)))
+                    unnumbered.append(len(stored))
+                elif report["id"] is None:
+                    unnumbered.append(len(stored))
+                stored.append((report, key, report_media))
+            for year, group in itertools.groupby(unnumbered, key=lambda i: int(stored[i][0]["timestamp"][:4])):
+                group = list(group)
+                first = self._reserve(conn, year, len(group))
+                for number, i in enumerate(group, first):
+                    report, key, report_media = stored[i]
+                    stored[i] = (dict(report, id=format_report_id(year, number)), key, report_media)
+            conn.executemany(
+                f"INSERT INTO reports ({', '.join(REPORT_COLUMNS)}) VALUES ({', '.join('?' for _ in REPORT_COLUMNS)})",
+                [self._row(report) for report, _, _ in stored]
+            )
+            conn.executemany("INSERT INTO report_keys (key, report_id) VALUES (?, ?)",
+                             [(key, report["id"]) for report, key, _ in stored if key])
+            conn.executemany("INSERT OR REPLACE INTO report_media (report_id, transcript, audio) VALUES (?, ?, ?)",
+                             [(report["id"], *report_media) for report, _, report_media in stored if report_media])
+            self._advance_sequences(conn, [report["id"] for report, _, _ in stored])
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return [report for report, _, _ in stored], [(queued_id, stored[i][0]["id"]) for queued_id, i in conflicts]
+
+    def _advance_sequences(self, conn, report_ids):
+        """Move each year's ID sequence past the numbered IDs just stored, such as imported history"""
+        highest = {}
+        for report_id in report_ids:
+            parsed = parse_report_id(report_id)
+            if parsed:
+                year, number = parsed
+                highest[year] = max(highest.get(year, 0), number)
+        conn.executemany("UPDATE id_sequences SET next_value = MAX(next_value, ?) WHERE year = ?",
+                         [(number + 1, year) for year, number in highest.items()])
+
+    def reserve_ids(self, year, count):
+        """Reserve ``count`` consecutive report numbers for a year; return the first
+
+        The sequence for a year starts after the highest numeric report ID
+        already stored for it, so IDs from before the sequence existed are
+        never reissued.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            start = self._reserve(conn, year, count)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return start
+
+    def _reserve(self, conn, year, count):
+        """Take ``count`` numbers from a year's sequence inside the caller's transaction"""
+        row = conn.execute("SELECT next_value FROM id_sequences WHERE year = ?", (year,)).fetchone()
+        if row is None:
+            prefix = f"QA-{year}-"
+            highest = conn.execute(
+                "SELECT MAX(CAST(substr(id, ?) AS INTEGER)) FROM reports WHERE id >= ? AND id < ?",
+                (len(prefix) + 1, prefix, f"QA-{year}.")
+            ).fetchone()[0]
+            start = (highest or 0) + 1
+            conn.execute("INSERT INTO id_sequences (year, next_value) VALUES (?, ?)", (year, start + count))
+        else:
+            start = row[0]
+            conn.execute("UPDATE id_sequences SET next_value = ? WHERE year = ?", (start + count, year))
+        return start
+
+    def _where(self, filters):
+        """Build a WHERE clause from column filters and a time range"""
+        clauses = []
+        params = []
+        for column in FILTER_COLUMNS:
+            value = filters.get(column)
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if filters.get("category_prefix"):
+            # A range rather than LIKE, so the category index is used
+            clauses.append("category >= ? AND category < ?")
+            params += [filters["category_prefix"], filters["category_prefix"] + "\uffff"]
+        if filters.get("since"):
+            clauses.append("timestamp >= ?")
+            params.append(filters["since"])
+        if filters.get("until"):
+            clauses.append("timestamp < ?")
+            params.append(filters["until"])
+        if filters.get("search"):
+            escaped = filters["search"].replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            clauses.append("description LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+        unknown = set(filters) - set(FILTER_COLUMNS) - {"category_prefix", "since", "until", "search"}
+        if unknown:
+            raise ValueError(f"Unknown report filter(s): {', '.join(sorted(unknown))}")
+        sql = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return sql, params
+
+    def query(self, limit=50, offset=0, order_by="timestamp", descending=True, **filters):
+        """Return one page of reports matching the filters"""
+        if order_by not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort reports by {order_by!r}")
+        where, params = self._where(filters)
+        direction = "DESC" if descending else "ASC"
+        sql = (
+            f"SELECT {', '.join(REPORT_COLUMNS)} FROM reports{where} "
+            f"ORDER BY {order_by} {direction}, seq {direction} LIMIT ? OFFSET ?"
+        )
+        rows = self._connect().execute(sql, params + [limit, offset]).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_many(self, report_ids):
+        """Return the reports with the given IDs, in the order requested"""
+        if not report_ids:
+            return []
+        rows = self._connect().execute(
+            f"SELECT {', '.join(REPORT_COLUMNS)} FROM reports WHERE id IN ({', '.join('?' for _ in report_ids)})",
+            list(report_ids)
+        ).fetchall()
+        by_id = {row["id"]: dict(row) for row in rows}
+        return [by_id[report_id] for report_id in report_ids if report_id in by_id]
+
+    def get_media(self, report_id):
+        """Return ``(transcript, audio)`` for a spoken report, or None"""
+        row = self._connect().execute(
+            "SELECT transcript, audio FROM report_media WHERE report_id = ?", (report_id,)
+        ).fetchone()
+        return (row["transcript"], row["audio"]) if row else None
+
+    def count(self, **filters):
+        """Count the reports matching the filters"""
+        where, params = self._where(filters)
+        return self._connect().execute(f"SELECT COUNT(*) FROM reports{where}", params).fetchone()[0]
+
+    def distinct(self, column, **filters):
+        """Return the distinct values of a filterable column among the reports matching the filters"""
+        if column not in FILTER_COLUMNS:
+            raise ValueError(f"Cannot list values of {column!r}")
+        where, params = self._where(filters)
+        rows = self._connect().execute(f"SELECT DISTINCT {column} FROM reports{where} ORDER BY {column}", params)
+        return [row[0] for row in rows]
+
+    def iter_columns(self, columns, batch_size=100000, after_seq=0, **filters):
+        """Yield lists of row tuples holding only the given columns of matching reports
+
+        ``seq`` may be requested like any other column; with ``after_seq`` only
+        reports appended after that sequence number are read.
+        """
+        unknown = set(columns) - set(REPORT_COLUMNS) - {"seq"}
+        if unknown:
+            raise ValueError(f"Unknown report column(s): {', '.join(sorted(unknown))}")
+        where, params = self._where(filters)
+        if after_seq:
+            where = f"{where} AND seq > ?" if where else " WHERE seq > ?"
+            params.append(after_seq)
+        # Plain tuples are much cheaper to build than sqlite3.Row objects
+        cursor = self._connect().cursor()
+        cursor.row_factory = None
+        cursor.execute(f"SELECT {', '.join(columns)} FROM reports{where} ORDER BY seq", params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+
+    def iter_reports(self, batch_size=1000, after_seq=0, with_seq=False, **filters):
+        """Yield every report matching the filters in insertion order without loading them all at once
+
+        With ``with_seq`` each item is a ``(seq, report)`` pair, so callers can
+        resume from the last sequence number they saw.
+        """
+        conn = self._connect()
+        where, params = self._where(filters)
+        where = f"{where} AND seq > ?" if where else " WHERE seq > ?"
+        while True:
+            rows = conn.execute(
+                f"SELECT seq, {', '.join(REPORT_COLUMNS)} FROM reports{where} ORDER BY seq LIMIT ?",
+                params + [after_seq, batch_size]
+            ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                report = dict(row)
+                after_seq = report.pop("seq")
+                yield (after_seq, report) if with_seq else report
+
+    def partition_versions(self, after_seq=0):
+        """Return ``{Partition: last seq}`` for the partitions with reports appended after ``after_seq``"""
+        # A full count walks the partition index; an update reads only the new rows by seq
+        source = "reports NOT INDEXED" if after_seq else "reports"
+        rows = self._connect().execute(
+            f"SELECT plant, line, MAX(seq) FROM {source} WHERE seq > ? GROUP BY plant, line", (after_seq,)
+        )
+        return {Partition(plant, line): seq for plant, line, seq in rows}
+
+    def version(self):
+        """Return a value that changes whenever a report is appended"""
+        return self._connect().execute("SELECT COALESCE(MAX(seq), 0) FROM reports").fetchone()[0]
@@ -0,0 +1,245 @@
+import io
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from qa_system.audio import AudioFormatError, prepare_audio
+from qa_system.metrics import METRICS, span
+
+# Transcript returned by the offline demo backend
+DEMO_TRANSCRIPT = "Item with number 12345 has a cover defect"
+
+
+class StubBackend:
+    """Offline backend that "recognizes" a fixed transcript word by word.
+
+    Stands in for a real speech-to-text service in the demo and in tests;
+    the per-word delay mimics a recognizer streaming partial results.
+    """
+
+    name = "stub"
+    # The fixed transcript cannot be split, so recordings are never chunked
+    max_chunk_seconds = None
+
+    def __init__(self, transcript=DEMO_TRANSCRIPT, word_delay=0.25):
+        self.transcript = transcript
+        self.word_delay = word_delay
+
+    def transcribe(self, audio):
+        """Yield transcript segments as they are recognized"""
+        for word in self.transcript.split():
+            if self.word_delay:
+                time.sleep(self.word_delay)
+            yield word
+
+
+class WhisperBackend:
+    """Local backend using an offline faster-whisper model"""
+
+    name = "whisper"
+    # Whisper decodes 30 second windows
+    max_chunk_seconds = 30.0
+
+    def __init__(self, model_size="base", device="cpu"):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as exc:
+            raise RuntimeError(
+                "The whisper transcription backend needs the faster-whisper package"
+            ) from exc
+        self.model = WhisperModel(model_size, device=device, compute_type="int8")
+
+    def transcribe(self, audio):
+        """Yield transcript segments as the model decodes them
+
+        ``audio`` is 16 kHz mono float32 samples, or the raw bytes of a
+        recording that is not a WAV file.
+        """
+        if isinstance(audio, bytes):
+            audio = io.BytesIO(audio)
+        segments, _ = self.model.transcribe(audio)
+        for segment in segments:
+            yield segment.text.strip()
+
+
+BACKENDS = {
+    StubBackend.name: StubBackend,
+    WhisperBackend.name: WhisperBackend,
+}
+
+
+def get_backend(name="stub", **options):
+    """Instantiate a transcription backend by name"""
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown transcription backend {name!r}; choose one of {', '.join(sorted(BACKENDS))}"
+        ) from None
+    return backend_class(**options)
+
+
+class TranscriptionJob:
+    """Handle for one submitted recording.
+
+    Partial segments are appended by the worker thread as they arrive, so
+    the UI can show a growing transcript while the job is still running.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = self.QUEUED
+        self.error = None
+        self._audio = None
+        # Recognized segments per audio chunk, in chunk order
+        self._segments = [[]]
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+
+    @property
+    def text(self):
+        """Transcript recognized so far"""
+        with self._lock:
+            return " ".join(segment for chunk in self._segments for segment in chunk)
+
+    @property
+    def done(self):
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes; return True if it did"""
+        return self._finished.wait(timeout)
+
+    def _set_chunks(self, count):
+        with self._lock:
+            self._segments = [[] for _ in range(max(count, 1))]
+
+    def _append(self, segment, chunk=0):
+        with self._lock:
+            self._segments[chunk].append(segment)
+
+    def _finish(self, status, error=None):
+        self.status = status
+        self.error = error
+        self._finished.set()
+
+
+class _ChunkBatch:
+    """The chunks of one recording waiting for, or being run by, the chunk workers"""
+
+    def __init__(self, job, chunks):
+        self.job = job
+        self.queued = deque(enumerate(chunks))
+        self.remaining = len(self.queued)
+        self.error = None
+        self.finished = threading.Event()
+
+
+class TranscriptionPool:
+    """Bounded worker pool that transcribes recordings off the script thread.
+
+    ``max_workers`` caps how many recordings are processed at once across
+    every session. Each recording is trimmed, downsampled and split into
+    chunks, which a separate pool of ``chunk_workers`` transcribes in
+    parallel, so one long recording does not hold up the recognizer.
+    Workers take chunks from the recordings in turn rather than in the
+    order they were queued, so a long recording never queues ahead of
+    every chunk of another session's.
+    """
+
+    def __init__(self, backend=None, max_workers=4, chunk_workers=4):
+        self.backend = backend or StubBackend()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="transcription")
+        self._chunk_executor = ThreadPoolExecutor(max_workers=chunk_workers,
+                                                  thread_name_prefix="transcription-chunk")
+        self._ids = itertools.count(1)
+        # Recordings with chunks left to start, in the order they get their next turn
+        self._batches = OrderedDict()
+        self._batches_lock = threading.Lock()
+
+    def submit(self, audio_bytes):
+        """Queue a recording for transcription and return its job handle"""
+        job = TranscriptionJob(next(self._ids))
+        # Held on the job rather than passed to the executor, which would keep it until the job ends
+        job._audio = audio_bytes
+        job._submitted = time.perf_counter()
+        self._executor.submit(self._run, job)
+        return job
+
+    def _prepare(self, audio_bytes):
+        """Return the audio chunks to recognize"""
+        try:
+            with span("audio_preprocess"):
+                prepared = prepare_audio(audio_bytes, max_chunk_seconds=self.backend.max_chunk_seconds)
+        except AudioFormatError:
+            # Leave other formats for the backend to decode
+            return [audio_bytes]
+        return prepared.chunks
+
+    def _transcribe_chunk(self, job, index, chunk):
+        with span("transcription_chunk"):
+            for segment in self.backend.transcribe(chunk):
+                if segment:
+                    job._append(segment, index)
+
+    def _run_next_chunk(self):
+        """Transcribe the next chunk of the recording whose turn it is"""
+        with self._batches_lock:
+            batch = next(iter(self._batches))
+            index, chunk = batch.queued.popleft()
+            if batch.queued:
+                self._batches.move_to_end(batch)
+            else:
+                del self._batches[batch]
+        try:
+            if batch.error is None:
+                self._transcribe_chunk(batch.job, index, chunk)
+        except Exception as exc:
+            batch.error = exc
+        finally:
+            with self._batches_lock:
+                batch.remaining -= 1
+                if not batch.remaining:
+                    batch.finished.set()
+
+    def _run(self, job):
+        METRICS.observe("transcription_queue", time.perf_counter() - job._submitted)
+        with span("transcription"):
+            self._transcribe(job)
+
+    def _transcribe(self, job):
+        job.status = TranscriptionJob.RUNNING
+        audio_bytes, job._audio = job._audio, None
+        try:
+            chunks = self._prepare(audio_bytes)
+            # WAV chunks no longer reference the recording, so let it go now
+            del audio_bytes
+            if not chunks:
+                raise ValueError("The recording contains no speech")
+            job._set_chunks(len(chunks))
+            batch = _ChunkBatch(job, chunks)
+            del chunks
+            with self._batches_lock:
+                self._batches[batch] = None
+            # Each task runs whichever chunk is next in turn, not necessarily one of this recording's
+            for _ in range(batch.remaining):
+                self._chunk_executor.submit(self._run_next_chunk)
+            batch.finished.wait()
+            if batch.error is not None:
+                raise batch.error
+        except Exception as exc:
+            job._finish(TranscriptionJob.FAILED, error=str(exc))
+        else:
+            job._finish(TranscriptionJob.DONE)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+        self._chunk_executor.shutdown(wait=wait)
@@ -0,0 +1,162 @@
+import datetime
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from qa_system.machines import UNASSIGNED
+
+TrendAlert = namedtuple("TrendAlert", ["machine", "category", "recent_rate", "baseline_rate", "cusum"])
+
+# Follow-up actions suggested for alerts, by category prefix
+CATEGORY_ACTIONS = {
+    "EQUIPMENT MALFUNCTION - FLUID LEAK": "Scheduling preventive maintenance for all hydraulic systems",
+    "EQUIPMENT MALFUNCTION": "Review of the last 3 maintenance records for similar machines",
+    "PRODUCT DEFECT": "Quality hold and inspection of the affected product batches",
+    "SAFETY HAZARD": "Safety walk-through of the affected area before the next shift",
+}
+
+
+class TrendDetector:
+    """Streaming rise detector over daily report rates per (machine, category).
+
+    Each key keeps a fast and a slow exponentially weighted moving average
+    of its daily count plus a one-sided CUSUM of the count above the slow
+    baseline, all held in NumPy arrays. Appending a report touches only its
+    own key, so an update is O(1); ``alerts`` projects every key to today
+    and tests them in one vectorized pass. Reports dated before their key's
+    latest day, such as imported history, do not change its rates.
+    """
+
+    def __init__(self, fast_alpha=0.5, slow_alpha=0.05, rise_ratio=2.0, min_rate=0.5,
+                 cusum_slack=0.5, cusum_threshold=3.0, today=datetime.date.today):
+        self.fast_alpha = fast_alpha
+        self.slow_alpha = slow_alpha
+        self.rise_ratio = rise_ratio
+        self.min_rate = min_rate
+        self.cusum_slack = cusum_slack
+        self.cusum_threshold = cusum_threshold
+        self._today = today
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._keys = []
+        capacity = 64
+        self._fast = np.zeros(capacity)
+        self._slow = np.zeros(capacity)
+        self._cusum = np.zeros(capacity)
+        self._count = np.zeros(capacity)
+        self._day = np.zeros(capacity, dtype=np.int64)
+        self._seq = 0
+        self.version = 0
+
+    def add(self, report):
+        """Fold a single report into its key's statistics"""
+        with self._lock:
+            self._add(report)
+            self.version += 1
+
+    def sync(self, store, **filters):
+        """Fold in every report appended to the store since the last sync, or only those matching the filters"""
+        with self._lock:
+            added = 0
+            for seq, report in store.iter_reports(after_seq=self._seq, with_seq=True, **filters):
+                self._add(report)
+                self._seq = seq
+                added += 1
+            if added:
+                self.version += 1
+            return added
+
+    def _slot(self, key, day):
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = len(self._keys)
+            if slot == len(self._fast):
+                for name in ("_fast", "_slow", "_cusum", "_count", "_day"):
+                    array = getattr(self, name)
+                    setattr(self, name, np.concatenate([array, np.zeros_like(array)]))
+            self._slots[key] = slot
+            self._keys.append(key)
+            self._day[slot] = day
+        return slot
+
+    def _add(self, report):
+        day = datetime.date.fromisoformat(report["timestamp"][:10]).toordinal()
+        slot = self._slot((report["machine"], report["category"]), day)
+        if day < self._day[slot]:
+            # The key's averages have already moved past that day, and counting it as today would turn
+            # backfilled history into a spike; it is left out of the rates
+            return
+        if day > self._day[slot]:
+            # Close the finished day, then decay over the empty days in between
+            fast, slow, cusum = self._close_day(
+                self._fast[slot], self._slow[slot], self._cusum[slot], self._count[slot], day - self._day[slot]
+            )
+            self._fast[slot], self._slow[slot], self._cusum[slot] = fast, slow, cusum
+            self._count[slot] = 0
+            self._day[slot] = day
+        self._count[slot] += 1
+
+    def _close_day(self, fast, slow, cusum, count, elapsed):
+        """Fold a finished day's count in and advance ``elapsed`` days; works on scalars or arrays"""
+        cusum = np.maximum(0.0, cusum + count - slow - self.cusum_slack)
+        fast = fast + self.fast_alpha * (count - fast)
+        slow = slow + self.slow_alpha * (count - slow)
+        empty_days = np.maximum(elapsed - 1, 0)
+        cusum = np.maximum(0.0, cusum - empty_days * (slow + self.cusum_slack))
+        fast = fast * (1 - self.fast_alpha) ** empty_days
+        slow = slow * (1 - self.slow_alpha) ** empty_days
+        return fast, slow, cusum
+
+    def alerts(self, machine=None, category=None, category_prefix=None):
+        """Return rising (machine, category) keys, strongest rise first"""
+        with self._lock:
+            n = len(self._keys)
+            if not n:
+                return []
+            today = self._today().toordinal()
+            # Close each key's current day and decay it over the days since, up to today
+            elapsed = np.maximum(today + 1 - self._day[:n], 1)
+            fast, slow, cusum = self._close_day(self._fast[:n], self._slow[:n], self._cusum[:n],
+                                                self._count[:n], elapsed)
+            rising = (fast >= self.min_rate) & (
+                (fast >= self.rise_ratio * slow) | (cusum >= self.cusum_threshold)
+            )
+            alerts = []
+            for slot in np.flatnonzero(rising):
+                key_machine, key_category = self._keys[slot]
+                if machine is not None and key_machine != machine:
+                    continue
+                if category is not None and key_category != category:
+                    continue
+                if category_prefix is not None and not key_category.startswith(category_prefix):
+                    continue
+                alerts.append(TrendAlert(key_machine, key_category, round(float(fast[slot]), 2),
+                                         round(float(slow[slot]), 2), round(float(cusum[slot]), 2)))
+            alerts.sort(key=alert_strength, reverse=True)
+            return alerts
+
+
+def alert_strength(alert):
+    """How far an alert's recent rate is above its baseline; alerts are listed strongest first"""
+    return alert.recent_rate / max(alert.baseline_rate, 0.05)
+
+
+def recommend_actions(alerts, limit=5):
+    """Turn trend alerts into a short list of recommended actions"""
+    actions = []
+    for alert in alerts[:limit]:
+        rate = f"{alert.recent_rate:g} reports/day against a baseline of {alert.baseline_rate:g}"
+        if alert.machine == UNASSIGNED:
+            # Filed without a machine or station, so there is nothing specific to inspect
+            actions.append(f"Trace the source of the rising {alert.category.lower()} reports "
+                           f"that name no machine ({rate})")
+        else:
+            actions.append(f"Immediate inspection of {alert.machine} ({alert.category.lower()}: {rate})")
+    for alert in alerts[:limit]:
+        for prefix, action in CATEGORY_ACTIONS.items():
+            if alert.category.startswith(prefix):
+                if action not in actions:
+                    actions.append(action)
+                break
+    return actions
@@ -1,16 +1,32 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
+import streamlit.components.v1 as components
+import hashlib
+import os
 import time
-import random
-import datetime
-import io
-from PIL import Image
-import base64
 
 # Import audio recorder component
 from audio_recorder_streamlit import audio_recorder
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Shared resources live in a module, so they are defined once per process rather than on every rerun;
+# pandas and the analytics modules that need it are imported in the manager view only
+from app_services import (
+    ANALYSIS_TOPICS, EXPORTS_URL, PROCESS_ID, REPORTS_CHANNEL, css_injector, find_similar_reports, get_chat_flow,
+    get_chart_renderer, get_event_broker, get_export_service, get_issue_classifier, get_machine_registry,
+    get_outbox_sync, get_partitioned_analytics, get_report_outbox, get_report_store, get_analytics_parser,
+    logo_data_uri, report_count, report_filter_values, report_page, start_metrics_export, sync_aggregates,
+    trend_chart
+)
+from qa_system.aggregates import describe_trend
+from qa_system.charts import draw_impact_analysis
+from qa_system.conversation import AWAITING_CONFIRMATION, READY_STATES, TRANSCRIBING, Conversation, InvalidTransition
+from qa_system.exports import FORMATS as EXPORT_FORMATS
+from qa_system.machines import Partition
+from qa_system.metrics import METRICS, span
+from qa_system.store import SORT_COLUMNS
+from qa_system.trends import recommend_actions
+
+rerun_started = time.perf_counter()
 
 # Set page configuration
 st.set_page_config(
@@ -20,190 +36,177 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for styling
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 2.5rem;
-        color: #2c3e50;
-        font-weight: 700;
-        margin-bottom: 1rem;
-    }
-    .sub-header {
-        font-size: 1.8rem;
-        color: #34495e;
-        font-weight: 600;
-        margin-bottom: 0.8rem;
-    }
-    .report-box {
-        background-color: #f8f9fa;
-        border-radius: 10px;
-        padding: 15px;
-        margin-bottom: 10px;
-        border-left: 5px solid #3498db;
-    }
-    .bot-message {
-        background-color: #eef2f7;
-        padding: 12px;
-        border-radius: 15px 15px 15px 0;
-        margin: 10px 0;
-        display: inline-block;
-        max-width: 80%;
-    }
-    .user-message {
-        background-color: #1565c0;
-        color: white;
-        padding: 12px;
-        border-radius: 15px 15px 0 15px;
-        margin: 10px 0;
-        display: inline-block;
-        max-width: 80%;
-        margin-left: auto;
-    }
-    .category-tag {
-        background-color: #3498db;
-        color: white;
-        padding: 3px 8px;
-        border-radius: 12px;
-        font-size: 0.8rem;
-        margin-right: 5px;
-    }
-    .priority-high {
-        background-color: #e74c3c;
-        color: white;
-        padding: 3px 8px;
-        border-radius: 12px;
-        font-size: 0.8rem;
-    }
-    .priority-medium {
-        background-color: #f39c12;
-        color: white;
-        padding: 3px 8px;
-        border-radius: 12px;
-        font-size: 0.8rem;
-    }
-    .priority-low {
-        background-color: #27ae60;
-        color: white;
-        padding: 3px 8px;
-        border-radius: 12px;
-        font-size: 0.8rem;
-    }
-    .thinking-animation {
-        display: inline-block;
-        margin-left: 5px;
-    }
-    .stButton>button {
-        background-color: #1565c0;
-        color: white;
-        border-radius: 5px;
-    }
-    .voice-input-button>button {
-        background-color: #e74c3c !important;
-        color: white;
-        border-radius: 25px;
-    }
-    .manager-view-button>button {
-        background-color: #2c3e50 !important;
-        color: white;
-    }
-    .chart-container {
-        background-color: white;
-        border-radius: 10px;
-        padding: 15px;
-        box-shadow: 0 2px 5px rgba(0,0,0,0.1);
-    }
-    .recommendation-item {
-        padding: 8px 0;
-        border-bottom: 1px solid #eee;
-    }
-    .sidebar .sidebar-content {
-        background-color: #f8f9fa;
-    }
-    .audio-recorder {
-        margin-top: 10px;
-    }
-    .transcribing-message {
-        color: #7f8c8d;
-        font-style: italic;
-        margin: 10px 0;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Custom CSS for styling; it lives in the page head, so it only has to be sent on a session's first run
+if not st.session_state.get("css_injected"):
+    components.html(css_injector(), height=0)
 
 # Initialize session state variables
-if 'messages' not in st.session_state:
-    st.session_state.messages = []
+if 'conversation' not in st.session_state:
+    st.session_state.conversation = Conversation(history_window=int(os.environ.get("QA_CHAT_WINDOW", "20")))
 if 'view' not in st.session_state:
     st.session_state.view = "engineer"  # Default view is engineer
-if 'reports' not in st.session_state:
-    # Initialize with some mock reports
-    st.session_state.reports = [
-        {
-            "id": "QA-2023-0470",
-            "description": "Multiple scratches on product surface",
-            "timestamp": "2023-11-11 08:23:15",
-            "category": "PRODUCT DEFECT - EXTERIOR COMPONENT",
-            "priority": "Low",
-            "machine": "Assembly line 3"
-        },
-        {
-            "id": "QA-2023-0471",
-            "description": "Bearing making unusual noise",
-            "timestamp": "2023-11-11 09:45:22",
-            "category": "EQUIPMENT MALFUNCTION - NOISE",
-            "priority": "Medium",
-            "machine": "Press 2211"
-        }
-    ]
-if 'waiting_for_confirmation' not in st.session_state:
-    st.session_state.waiting_for_confirmation = False
-if 'current_report' not in st.session_state:
-    st.session_state.current_report = None
-if 'current_report_id' not in st.session_state:
-    st.session_state.current_report_id = 473  # Start with this ID since we have mock reports already
-if 'transcribing' not in st.session_state:
-    st.session_state.transcribing = False
-if 'audio_data' not in st.session_state:
-    st.session_state.audio_data = None
+if 'last_audio_digest' not in st.session_state:
+    st.session_state.last_audio_digest = None
 
-# Mock data for historical oil leak issues
-if 'oil_leak_history' not in st.session_state:
-    # Generate dates for the last 4 weeks
-    today = datetime.datetime.now()
-    dates = [(today - datetime.timedelta(days=i)).strftime("%Y-%m-%d") for i in range(28)]
-    
-    # Generate frequencies with an increasing trend for the most recent days
-    frequencies = [0] * 28
-    # Last week - increasing trend
-    frequencies[0:7] = [2, 1, 1, 0, 1, 1, 0]
-    # 2 weeks ago
-    frequencies[7:14] = [0, 1, 0, 0, 0, 1, 0]
-    # 3 weeks ago
-    frequencies[14:21] = [0, 0, 1, 0, 0, 0, 0]
-    # 4 weeks ago
-    frequencies[21:28] = [0, 0, 0, 0, 1, 0, 0]
+start_metrics_export()
+session_id = get_script_run_ctx().session_id
+METRICS.set_session(session_id, st.session_state.to_dict)
+
+machine_registry = get_machine_registry()
+report_store = get_report_store()
+issue_classifier = get_issue_classifier()
+event_broker = get_event_broker()
+chat_flow = get_chat_flow()
+report_outbox = get_report_outbox()
+outbox_sync = get_outbox_sync()
+conversation = st.session_state.conversation
+
+def render_message(message):
+    """Render one chat bubble"""
+    css_class = "user-message" if message["role"] == "user" else "bot-message"
+    st.markdown(f'<div class="{css_class}">{message["content"]}</div>', unsafe_allow_html=True)
+
+def dispatch(handler, *args):
+    """Run a chat flow handler, ignoring stale events from widgets of an earlier state"""
+    # Widget callbacks run before the script body has attributed this run to the session
+    METRICS.set_session(get_script_run_ctx().session_id)
+    try:
+        handler(conversation, *args)
+    except InvalidTransition:
+        pass
+
+def submit_text_input():
+    """Text input callback: hand the typed report to the chat flow"""
+    dispatch(chat_flow.submit_text, st.session_state.text_input)
+    st.session_state.text_input = ""
+
+@st.fragment(run_every=0.5)
+def show_transcription_progress():
+    """Stream the partial transcript of the pending voice message"""
+    if conversation.state != TRANSCRIBING:
+        return
     
-    # Reverse the lists so dates are in chronological order
-    dates.reverse()
-    frequencies.reverse()
+    if chat_flow.poll_transcription(conversation):
+        # The transcript is classified; redraw the page to ask for confirmation
+        st.rerun()
     
-    st.session_state.oil_leak_history = {
-        "dates": dates,
-        "frequencies": frequencies
-    }
+    message = conversation.pending_message
+    if message["content"] != "[Voice Message]: ":
+        render_message(message)
+    st.markdown('<div class="bot-message">Transcribing audio<span class="thinking-animation">...</span></div>', 
+               unsafe_allow_html=True)
+
+def start_export(export, *args, **kwargs):
+    """Start a background export and keep its handle, with the session's last few, for download"""
+    st.session_state.export_jobs = [export(*args, **kwargs)] + st.session_state.get("export_jobs", [])[:4]
+
+@st.fragment(run_every=1.0)
+def show_export_progress():
+    """Show the progress of this session's running exports; redraw the page once they finish"""
+    jobs = [job for job in st.session_state.get("export_jobs", []) if not job.done]
+    if not jobs:
+        st.rerun()
+    for job in jobs:
+        if job.total:
+            st.progress(min(job.rows / job.total, 1.0), text=f"Exporting {job.name}: {job.rows} of {job.total} rows")
+        else:
+            st.progress(0, text=f"Building {job.name}...")
 
-# Function to simulate speech to text conversion
-def simulate_transcription(audio_data):
-    """Simulate transcription of audio to text"""
-    # In a real implementation, you would send the audio to a speech-to-text service
-    # For the demo, we'll simulate the process with a fixed response
-    time.sleep(2)  # Simulate processing time
-    return "Item with number 12345 has a cover defect"
+def show_exports():
+    """List this session's exports, with download links for finished files"""
+    jobs = st.session_state.get("export_jobs", [])
+    if not jobs:
+        return
+    with st.expander("Exports", expanded=True):
+        # Finished files are served by Streamlit's static file handler rather than held in this session
+        for job in jobs:
+            if job.status == job.DONE:
+                extension = os.path.splitext(job.filename)[1]
+                st.markdown(f'<a href="{EXPORTS_URL}/{job.filename}" download="{job.name}{extension}">'
+                            f'Download {job.name}{extension}</a>', unsafe_allow_html=True)
+            elif job.status == job.FAILED:
+                st.error(f"Export of {job.name} failed: {job.error}")
+        if not all(job.done for job in jobs):
+            show_export_progress()
+
+@st.fragment(run_every=float(os.environ.get("QA_LIVE_REFRESH", "2")))
+def show_reports_table(analytics, export_service):
+    """The Quality Reports table, redrawn on its own as new reports arrive
+
+    Each tick drains this session's report events and redraws only this
+    table; its filter values, count and page are cached on the store
+    version, so a tick without new reports only reads that version.
+    """
+    import pandas as pd
+    
+    subscription = st.session_state.get("report_events")
+    if subscription is None:
+        subscription = event_broker.pubsub()
+        subscription.subscribe(REPORTS_CHANNEL)
+        st.session_state.report_events = subscription
+    events = []
+    while (message := subscription.get_message()) is not None:
+        events.append(message["data"])
+    if events:
+        # This process synced its own reports when it stored them; only other processes' are new here
+        if any(event["origin"] != PROCESS_ID for event in events):
+            sync_aggregates()
+        st.toast(f"New report{'s' if len(events) > 1 else ''}: {', '.join(event['report']['id'] for event in events)}")
+    
+    st.markdown('<p class="sub-header">Recent Quality Issues</p>', unsafe_allow_html=True)
+    
+    # Filters, sorting and paging are pushed down to the store so only one page is loaded
+    store_version = report_store.version()
+    filter_cols = st.columns(4)
+    filters = dict(analytics.filters)
+    # Only values found in the selected plant and line are offered
+    scope_filters = tuple(sorted(analytics.filters.items()))
+    for col, column in zip(filter_cols[:3], ["category", "priority", "machine"]):
+        with col:
+            value = st.selectbox(column.capitalize(),
+                                 ["All"] + report_filter_values(column, scope_filters, store_version),
+                                 key=f"report_filter_{column}")
+            if value != "All":
+                filters[column] = value
+    with filter_cols[3]:
+        search = st.text_input("Description contains", key="report_search")
+        if search:
+            filters["search"] = search
+    
+    sort_cols = st.columns(4)
+    with sort_cols[0]:
+        order_by = st.selectbox("Sort by", SORT_COLUMNS, key="report_sort")
+    with sort_cols[1]:
+        descending = st.selectbox("Order", ["Descending", "Ascending"], key="report_order") == "Descending"
+    with sort_cols[2]:
+        page_size = st.selectbox("Rows per page", [25, 50, 100, 250], index=1, key="report_page_size")
+    
+    total_reports = report_count(tuple(sorted(filters.items())), store_version)
+    page_count = max(1, -(-total_reports // page_size))
+    with sort_cols[3]:
+        page = st.number_input("Page", min_value=1, max_value=page_count, value=1, key="report_page")
+    
+    if total_reports:
+        with span("reports_table"):
+            page_reports = report_page(tuple(sorted(filters.items())), order_by, descending,
+                                       page_size, (page - 1) * page_size, store_version)
+            page_frame = pd.DataFrame(page_reports)
+        st.dataframe(page_frame, use_container_width=True, hide_index=True)
+        st.caption(f"Showing page {page} of {page_count} ({total_reports} reports)")
+        
+        # Exports stream every matching report, not just this page, in the background
+        export_cols = st.columns(len(EXPORT_FORMATS) + 2)
+        for col, export_format in zip(export_cols, EXPORT_FORMATS):
+            with col:
+                st.button(f"Export {export_format.upper()}", key=f"export_reports_{export_format}",
+                          on_click=start_export, args=(export_service.export_reports, report_store, export_format),
+                          kwargs=filters)
+    else:
+        st.info("No quality reports found in the system.")
 
 # Sidebar for application controls and information
 with st.sidebar:
-    st.image("https://via.placeholder.com/150x80?text=CompanyLogo", width=150)
+    st.markdown(f'<img src="{logo_data_uri()}" width="150" alt="Company logo">', unsafe_allow_html=True)
     st.markdown("### Industrial QA System")
     st.markdown("AI-powered quality assurance reporting and analysis")
     
@@ -213,6 +216,11 @@ with st.sidebar:
     if st.session_state.view == "engineer":
         st.markdown("### Engineer View")
         st.markdown("Current mode: Quality Reporting")
+        # Reports that name no registered machine are filed under the engineer's own line, or Unassigned
+        station_plant = st.selectbox("Plant", ["No station"] + machine_registry.plants(), key="station_plant")
+        station_line = st.selectbox("Line", machine_registry.lines(station_plant) or ["No station"],
+                                    key="station_line", disabled=station_plant == "No station")
+        conversation.station = None if station_plant == "No station" else Partition(station_plant, station_line)
         st.markdown("---")
         st.button("Switch to Manager View", key="switch_to_manager", 
                  on_click=lambda: setattr(st.session_state, 'view', 'manager'),
@@ -220,6 +228,10 @@ with st.sidebar:
     else:
         st.markdown("### Manager View")
         st.markdown("Current mode: Quality Analysis")
+        # A plant manager's dashboard only reads the partitions of their plant
+        manager_plant = st.selectbox("Plant", ["All plants"] + machine_registry.plants(), key="manager_plant")
+        manager_line = st.selectbox("Line", ["All lines"] + machine_registry.lines(manager_plant), key="manager_line",
+                                    disabled=manager_plant == "All plants")
         st.markdown("---")
         st.button("Switch to Engineer View", key="switch_to_engineer", 
                  on_click=lambda: setattr(st.session_state, 'view', 'engineer'),
@@ -227,12 +239,30 @@ with st.sidebar:
     
     st.divider()
     st.markdown("### Demo Controls")
-    if st.button("Reset Demo"):
-        st.session_state.messages = []
-        st.session_state.waiting_for_confirmation = False
-        st.session_state.current_report = None
-        st.session_state.transcribing = False
-        st.session_state.audio_data = None
+    st.button("Reset Demo", on_click=dispatch, args=(chat_flow.reset,))
+    
+    # Confirmed reports still on their way from the local queue to the store
+    pending_sync = report_outbox.pending_count()
+    if pending_sync:
+        st.caption(f"{pending_sync} confirmed report{'s' if pending_sync > 1 else ''} waiting to sync"
+                   + (f": {outbox_sync.last_error}" if outbox_sync.last_error else ""))
+    
+    with st.expander("Categorization cache"):
+        cache_stats = issue_classifier.cache.stats()
+        st.markdown(f"Hits: {cache_stats['hits']} · Misses: {cache_stats['misses']} · "
+                    f"Hit rate: {cache_stats['hit_rate']:.0%}")
+        st.markdown(f"Entries: {cache_stats['entries']} ({cache_stats['bytes'] / 1024:.1f} KiB)")
+    
+    with st.expander("Performance"):
+        metrics = METRICS.snapshot()
+        st.markdown(f"Active sessions: {metrics['active_sessions']} · "
+                    f"Session state: {metrics['session_state_bytes'] / 1024:.1f} KiB")
+        st.markdown("\n".join(
+            ["| Stage | Count | p50 ms | p90 ms |", "|---|---:|---:|---:|"] + [
+                f"| {stage} | {summary['count']} | {(summary['p50'] or 0) * 1000:.1f} | {(summary['p90'] or 0) * 1000:.1f} |"
+                for stage, summary in metrics["stages"].items()
+            ]
+        ))
     
     st.markdown("---")
     st.markdown("##### Demo Version 1.0")
@@ -241,83 +271,46 @@ with st.sidebar:
 # Main content area
 if st.session_state.view == "engineer":
     st.markdown('<h1 class="main-header">Quality Reporting System</h1>', unsafe_allow_html=True)
+    chat_flow.check_renumbered(conversation)
     
-    # Display message history
-    for message in st.session_state.messages:
-        if message["role"] == "user":
-            st.markdown(f'<div class="user-message">{message["content"]}</div>', unsafe_allow_html=True)
-        else:
-            st.markdown(f'<div class="bot-message">{message["content"]}</div>', unsafe_allow_html=True)
-    
-    # Typing animation when processing
-    if 'thinking' in st.session_state and st.session_state.thinking:
-        with st.container():
-            st.markdown('<div class="bot-message">Processing your report<span class="thinking-animation">...</span></div>', 
-                       unsafe_allow_html=True)
+    # Display the newest window of the message history
+    hidden_count, visible_messages = conversation.visible_messages()
+    if hidden_count:
+        st.button(f"Show older messages ({hidden_count} hidden)", key="show_older_messages",
+                  on_click=conversation.show_older)
+    for message in visible_messages:
+        if not message.get("pending"):
+            render_message(message)
     
-    # Show transcribing message when processing audio
-    if st.session_state.transcribing:
-        with st.container():
-            st.markdown('<div class="bot-message">Transcribing audio<span class="thinking-animation">...</span></div>', 
-                       unsafe_allow_html=True)
+    # Show the transcript as it streams in while processing audio
+    progress_area = st.container()
+    if conversation.state == TRANSCRIBING:
+        with progress_area:
+            show_transcription_progress()
     
     # Input area at the bottom
     st.markdown("---")
     
     # If we're waiting for confirmation
-    if st.session_state.waiting_for_confirmation:
+    if conversation.state == AWAITING_CONFIRMATION:
+        if conversation.current_similar:
+            similar_items = "".join(
+                f'<li>{report["id"]} ({report["machine"]}): {report["description"]}</li>'
+                for report in conversation.current_similar
+            )
+            st.markdown(f'<div class="bot-message">Similar past reports:<ul>{similar_items}</ul></div>',
+                        unsafe_allow_html=True)
         col1, col2 = st.columns(2)
         with col1:
-            if st.button("Yes, that's correct", key="confirm_yes"):
-                # Process confirmation and categorize the issue
-                if "oil leak" in st.session_state.current_report.lower():
-                    category = "EQUIPMENT MALFUNCTION - FLUID LEAK"
-                    priority = "Medium"
-                elif "cover defect" in st.session_state.current_report.lower():
-                    category = "PRODUCT DEFECT - EXTERIOR COMPONENT"
-                    priority = "High"
-                else:
-                    category = "GENERAL ISSUE"
-                    priority = "Medium"
-                
-                report_id = f"QA-2023-0{st.session_state.current_report_id}"
-                
-                # Add the bot response
-                confirmation_response = f"Report confirmed. I've categorized this as: {category}. Priority: {priority}. Report ID: {report_id} has been created."
-                st.session_state.messages.append({"role": "assistant", "content": confirmation_response})
-                
-                # Add to reports database
-                new_report = {
-                    "id": report_id,
-                    "description": st.session_state.current_report,
-                    "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "category": category,
-                    "priority": priority,
-                    "machine": f"Machine {random.randint(1000, 9999)}" if "machine" in st.session_state.current_report.lower() else "Item #12345"
-                }
-                st.session_state.reports.append(new_report)
-                
-                # Reset states
-                st.session_state.waiting_for_confirmation = False
-                st.session_state.current_report = None
-                st.session_state.current_report_id += 1
-                
-                # Force refresh
-                st.experimental_rerun()
-                
+            st.button("Yes, that's correct", key="confirm_yes", on_click=dispatch, args=(chat_flow.confirm,))
         with col2:
-            if st.button("No, let me correct it", key="confirm_no"):
-                # Reset the confirmation state
-                st.session_state.waiting_for_confirmation = False
-                st.session_state.current_report = None
-                st.session_state.messages.append({"role": "assistant", "content": "Please provide a corrected report."})
-                st.experimental_rerun()
-    else:
+            st.button("No, let me correct it", key="confirm_no", on_click=dispatch, args=(chat_flow.reject,))
+    elif conversation.state in READY_STATES:
         # Text input and voice recording
         col1, col2 = st.columns([5, 1])
         
         with col1:
-            user_input = st.text_input("Enter quality issue details:", key="text_input")
+            st.text_input("Enter quality issue details:", key="text_input", on_change=submit_text_input)
         
         with col2:
             st.markdown("#### Record Audio")
@@ -329,151 +322,105 @@ if st.session_state.view == "engineer":
                 icon_size="2x"
             )
             
-            if audio_bytes:
-                # Store the audio data in session state
-                st.session_state.audio_data = audio_bytes
-                st.session_state.transcribing = True
-                st.experimental_rerun()
-        
-        # Process text input
-        if user_input:
-            # Add user message to history
-            st.session_state.messages.append({"role": "user", "content": user_input})
-            
-            # Simulate AI thinking
-            st.session_state.thinking = True
-            st.experimental_rerun()
-
-# Process audio if there's data and we're transcribing
-if st.session_state.view == "engineer" and st.session_state.transcribing and st.session_state.audio_data:
-    # Simulate transcription process
-    with st.spinner("Transcribing audio..."):
-        transcribed_text = simulate_transcription(st.session_state.audio_data)
-    
-    # Add the transcribed text as a user message
-    st.session_state.messages.append({
-        "role": "user", 
-        "content": f"[Voice Message]: {transcribed_text}"
-    })
-    
-    # Clear audio data and transcribing flag
-    st.session_state.audio_data = None
-    st.session_state.transcribing = False
-    
-    # Set up for AI processing
-    st.session_state.current_report = transcribed_text
-    st.session_state.thinking = True
-    
-    # Refresh to show the transcribed message
-    st.experimental_rerun()
-
-# If thinking, simulate processing and then respond
-if 'thinking' in st.session_state and st.session_state.thinking and st.session_state.view == "engineer":
-    # Simulate processing delay
-    time.sleep(1.5)
-    st.session_state.thinking = False
-    
-    # Get the last user message
-    if st.session_state.messages and st.session_state.messages[-1]["role"] == "user":
-        last_message = st.session_state.messages[-1]["content"]
-        
-        # If it was a voice message, extract the actual message
-        if "[Voice Message]:" in last_message:
-            last_message = last_message.split("[Voice Message]:")[1].strip()
-        
-        # Store the current report being processed
-        st.session_state.current_report = last_message
-        
-        # Generate confirmation request
-        if "oil" in last_message.lower() and "leak" in last_message.lower():
-            confirmation_text = f"Did I understand correctly that there is an oil leak on industrial machine 1234? Please confirm."
-        elif "cover defect" in last_message.lower():
-            confirmation_text = f"Did I understand correctly that item #12345 has a defect in its cover/casing? Please confirm."
-        else:
-            confirmation_text = f"Did I understand correctly that: {last_message}? Please confirm."
-        
-        # Add the response to messages
-        st.session_state.messages.append({"role": "assistant", "content": confirmation_text})
-        
-        # Set waiting for confirmation
-        st.session_state.waiting_for_confirmation = True
-    
-    # Refresh the page to show the response
-    st.experimental_rerun()
+            # The recorder keeps returning its last recording, so only submit new ones
+            audio_digest = hashlib.sha1(audio_bytes).hexdigest() if audio_bytes else None
+            if audio_bytes and audio_digest != st.session_state.last_audio_digest:
+                st.session_state.last_audio_digest = audio_digest
+                chat_flow.submit_audio(conversation, audio_bytes)
+                with progress_area:
+                    show_transcription_progress()
 
 # Manager view
 if st.session_state.view == "manager":
+    import pandas as pd
+    from qa_system.nlquery import describe_plan
+    
+    # Cross-plant rollups merge the per-partition results
+    analytics = get_partitioned_analytics().scope(
+        None if manager_plant == "All plants" else manager_plant,
+        None if manager_plant == "All plants" or manager_line == "All lines" else manager_line
+    )
+    analytics_parser = get_analytics_parser()
+    chart_renderer = get_chart_renderer()
+    export_service = get_export_service()
+    
     st.markdown('<h1 class="main-header">Quality Analysis Dashboard</h1>', unsafe_allow_html=True)
+    show_exports()
     
     # Tabs for different manager views
     tab1, tab2, tab3 = st.tabs(["Quality Reports", "Analysis", "Recommendations"])
     
     with tab1:
-        st.markdown('<p class="sub-header">Recent Quality Issues</p>', unsafe_allow_html=True)
-        
-        # Convert reports to dataframe for display
-        if st.session_state.reports:
-            df = pd.DataFrame(st.session_state.reports)
-            st.dataframe(df, use_container_width=True)
-        else:
-            st.info("No quality reports found in the system.")
+        show_reports_table(analytics, export_service)
     
     with tab2:
         st.markdown('<p class="sub-header">Quality Trends Analysis</p>', unsafe_allow_html=True)
         
+        # Free-form analytics questions
+        question = st.text_input("Ask a question about the reports:", key="analytics_question",
+                                 placeholder="e.g. oil leaks on Press 2211 by week last quarter")
+        if question:
+            with span("analytics_query"):
+                plan = analytics_parser.parse(question)
+                answer = analytics.run(plan)
+            st.markdown(f"**Showing {describe_plan(plan)}**")
+            if list(answer.columns) == ["reports"]:
+                st.metric("Matching reports", int(answer["reports"].iloc[0]))
+            elif answer.empty:
+                st.info("No reports match this question.")
+            else:
+                index, *groups = [column for column in answer.columns if column != "reports"]
+                chart_data = answer.pivot_table(index=index, columns=groups[0], values="reports", fill_value=0) \
+                    if groups else answer.set_index(index)
+                st.bar_chart(chart_data)
+                st.dataframe(answer, use_container_width=True, hide_index=True)
+            export_cols = st.columns(len(EXPORT_FORMATS) + 2)
+            for col, export_format in zip(export_cols, EXPORT_FORMATS):
+                with col:
+                    st.button(f"Export {export_format.upper()}", key=f"export_answer_{export_format}",
+                              on_click=start_export, args=(export_service.export_frame, "answer", answer, export_format))
+        
         # Analysis query options
         analysis_query = st.selectbox(
             "What would you like to analyze?",
-            ["Select an option", "Oil leakage problems", "Product defects", "Equipment malfunctions"]
+            ["Select an option", "Oil leakage problems", "Product defects", "Equipment malfunctions"],
+            key="analysis_topic"
         )
         
-        if analysis_query == "Oil leakage problems":
-            st.markdown("### Oil Leakage Analysis")
+        if analysis_query in ANALYSIS_TOPICS:
+            topic = ANALYSIS_TOPICS[analysis_query]
+            st.markdown(f"### {topic['title']}")
+            
+            # Pick up reports appended by other sessions or imports
+            analytics.sync()
+            dates, frequencies = analytics.daily_counts(**topic["filter"])
+            alerts = analytics.alerts(**topic["filter"])
             
             # Text analysis
-            st.markdown("""
+            st.markdown(f"""
             <div class="bot-message">
-            Yes, there were 7 oil leakage reports in the last two weeks. This appears to be an increasing trend, 
-            with 4 reports occurring in just the last 3 days.
+            {describe_trend(frequencies, topic["label"], alerts)}
             </div>
             """, unsafe_allow_html=True)
             
-            # Chart of oil leakage over time
-            if st.button("Show me a chart of oil leakage reports over time"):
-                with st.spinner("Generating visualization..."):
-                    time.sleep(1)  # Simulate processing
-                    
-                    # Create the chart
-                    fig, ax = plt.subplots(figsize=(10, 5))
-                    
-                    # Get data from session state
-                    dates = st.session_state.oil_leak_history["dates"]
-                    frequencies = st.session_state.oil_leak_history["frequencies"]
-                    
-                    # Plot the data
-                    ax.bar(dates, frequencies, color='#3498db')
-                    ax.set_xlabel('Date')
-                    ax.set_ylabel('Number of Oil Leak Reports')
-                    ax.set_title('Oil Leak Reports Over Time (Last 4 Weeks)')
-                    
-                    # Format x-axis to show fewer dates (weekly)
-                    ax.set_xticks([dates[i] for i in range(0, len(dates), 7)])
-                    ax.tick_params(axis='x', rotation=45)
-                    
-                    # Add grid lines
-                    ax.grid(axis='y', linestyle='--', alpha=0.7)
-                    
-                    # Tight layout
-                    plt.tight_layout()
-                    
-                    # Display the chart
-                    st.pyplot(fig)
-        
-        elif analysis_query == "Product defects":
-            st.info("This analysis option is part of the extended demo. Please select 'Oil leakage problems' for the main demo flow.")
+            # Chart of reports over time
+            if st.button(f"Show me a chart of {topic['label']} reports over time"):
+                st.image(trend_chart(topic, analytics), use_container_width=True)
         
-        elif analysis_query == "Equipment malfunctions":
-            st.info("This analysis option is part of the extended demo. Please select 'Oil leakage problems' for the main demo flow.")
+        # Summary of the last shift with every topic's chart, for handover
+        st.button("Export shift report (PDF)", key="export_shift_report", on_click=start_export,
+                  args=(export_service.shift_report, report_store, analytics, analytics, ANALYSIS_TOPICS,
+                        recommend_actions, float(os.environ.get("QA_SHIFT_HOURS", "8"))), kwargs=analytics.filters)
+    
+        # Search past reports by meaning rather than exact wording
+        st.markdown("### Similar Past Reports")
+        similar_query = st.text_input("Describe an issue to find similar reports:", key="similar_query")
+        if similar_query:
+            similar_reports = find_similar_reports(similar_query, k=10, **analytics.filters)
+            if similar_reports:
+                st.dataframe(pd.DataFrame(similar_reports), use_container_width=True, hide_index=True)
+            else:
+                st.info("No similar reports found.")
     
     with tab3:
         st.markdown('<p class="sub-header">Recommended Actions</p>', unsafe_allow_html=True)
@@ -481,20 +428,25 @@ if st.session_state.view == "manager":
         # Recommendation query options
         rec_query = st.text_input("Ask for recommendations:", value="What actions should we take?")
         
+        # Recommendations follow the rising trends in the live report stream
+        actions = None
         if rec_query and "action" in rec_query.lower():
-            # Simulate thinking
-            with st.spinner("Analyzing quality data and generating recommendations..."):
-                time.sleep(1.5)  # Simulate processing time
-            
-            # Display recommendations
+            analytics.sync()
+            actions = recommend_actions(analytics.alerts())
+        
+        if actions == []:
             st.markdown("""
             <div class="bot-message">
+            No rising trends are showing in the current reports. I recommend keeping the regular maintenance schedule.
+            </div>
+            """, unsafe_allow_html=True)
+        elif actions:
+            # Display recommendations
+            action_items = "".join(f'<li class="recommendation-item">{action}</li>' for action in actions)
+            st.markdown(f"""
+            <div class="bot-message">
             Based on the pattern of reports, I recommend:
-            <ol>
-                <li class="recommendation-item">Immediate inspection of machine 1234</li>
-                <li class="recommendation-item">Review of the last 3 maintenance records for similar machines</li>
-                <li class="recommendation-item">Scheduling preventive maintenance for all hydraulic systems</li>
-            </ol>
+            <ol>{action_items}</ol>
             <br>
             This could prevent potential production stoppage estimated at 4-8 hours.
             </div>
@@ -506,27 +458,8 @@ if st.session_state.view == "manager":
             
             with col1:
                 # Simple impact visualization
-                fig, ax = plt.subplots(figsize=(5, 4))
-                
-                # Sample data
-                categories = ['Production Loss', 'Repair Costs', 'Quality Impact']
-                no_action = [8, 12, 7]
-                with_action = [2, 5, 1]
-                
-                x = np.arange(len(categories))
-                width = 0.35
-                
-                ax.bar(x - width/2, no_action, width, label='Without Action', color='#e74c3c')
-                ax.bar(x + width/2, with_action, width, label='With Recommended Action', color='#2ecc71')
-                
-                ax.set_ylabel('Severity (1-10)')
-                ax.set_title('Estimated Impact Analysis')
-                ax.set_xticks(x)
-                ax.set_xticklabels(categories)
-                ax.legend()
-                
-                plt.tight_layout()
-                st.pyplot(fig)
+                st.image(chart_renderer.render("impact-analysis", "static", draw_impact_analysis, figsize=(5, 4)),
+                         use_container_width=True)
             
             with col2:
                 st.markdown("### Estimated Savings")
@@ -539,4 +472,7 @@ if st.session_state.view == "manager":
 
 # Footer
 st.markdown("---")
-st.markdown("This is a demonstration system showcasing LLM-based quality assurance capabilities.")
\ No newline at end of file
+st.markdown("This is a demonstration system showcasing LLM-based quality assurance capabilities.")
+
+st.session_state.css_injected = True
+METRICS.observe("rerun", time.perf_counter() - rerun_started, session_id)
\ No newline at end of file
@@ -0,0 +1,20 @@
+import pytest
+
+from qa_system.store import ReportStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    """An empty report store in a temporary directory"""
+    return ReportStore(str(tmp_path / "qa.db"), seed=False)
+
+
+@pytest.fixture
+def make_report():
+    """Build a report dict, with fields a test does not care about filled in"""
+    def make_report(report_id, description="Oil leaking from the hydraulic unit", timestamp="2026-03-02 10:00:00",
+                    **fields):
+        return dict({"id": report_id, "description": description, "timestamp": timestamp,
+                     "category": "EQUIPMENT MALFUNCTION - FLUID LEAK", "priority": "Medium",
+                     "machine": "Press 2211"}, **fields)
+    return make_report
@@ -0,0 +1,98 @@
+import io
+import time
+import wave
+
+import numpy as np
+import pytest
+
+from qa_system.audio import AudioFormatError, decode_wav, prepare_audio, resample, to_mono_float
+from qa_system.transcription import StubBackend, TranscriptionJob, TranscriptionPool
+
+
+def wav_bytes(samples, rate, channels=1):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes((np.asarray(samples) * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def speech(rate, seconds=2.0):
+    """A tone with a second of silence on either side"""
+    t = np.arange(int(seconds * rate)) / rate
+    tone = 0.3 * np.sin(2 * np.pi * 180 * t)
+    silence = np.zeros(rate)
+    return np.concatenate([silence, tone, silence])
+
+
+def test_decode_wav_reads_channels_and_rate():
+    stereo = np.repeat(np.linspace(-0.5, 0.5, 100), 2)
+    samples, rate = decode_wav(wav_bytes(stereo, 22050, channels=2))
+    assert rate == 22050
+    assert samples.shape == (100, 2)
+    mono = to_mono_float(samples)
+    assert mono.dtype == np.float32
+    assert mono[0] == pytest.approx(-0.5, abs=1e-3)
+
+
+@pytest.mark.parametrize("data", [b"", b"not a wav file", b"RIFF\0\0\0\0WAVEdata\0\0\0\0"])
+def test_decode_wav_rejects_other_formats(data):
+    with pytest.raises(AudioFormatError):
+        decode_wav(data)
+
+
+@pytest.mark.parametrize("rate", [8000, 11025, 44100, 48000])
+def test_resample_to_recognizer_rate(rate):
+    samples = np.sin(np.arange(rate) / rate * 2 * np.pi * 5).astype(np.float32)
+    resampled = resample(samples, rate, 16000)
+    assert resampled.dtype == np.float32
+    assert abs(len(resampled) - 16000) <= 1
+
+
+def test_resample_keeps_empty_audio_empty():
+    assert len(resample(np.zeros(0, dtype=np.float32), 8000)) == 0
+
+
+@pytest.mark.parametrize("rate", [8000, 44100])
+def test_prepare_audio_trims_silence(rate):
+    prepared = prepare_audio(wav_bytes(speech(rate), rate))
+    assert prepared.rate == 16000
+    assert prepared.duration == pytest.approx(4.0, abs=0.01)
+    assert prepared.trimmed == pytest.approx(2.0 - 0.3, abs=0.05)
+    assert len(prepared.chunks) == 1
+
+
+def test_low_rate_recording_is_transcribed():
+    pool = TranscriptionPool(StubBackend("leak at press", word_delay=0))
+    try:
+        job = pool.submit(wav_bytes(speech(8000), 8000))
+        assert job.wait(10)
+        assert job.status == TranscriptionJob.DONE, job.error
+        assert job.text == "leak at press"
+    finally:
+        pool.shutdown()
+
+
+class ChunkingBackend:
+    max_chunk_seconds = 1.0
+
+    def transcribe(self, audio):
+        time.sleep(0.05)
+        yield "chunk"
+
+
+def test_long_recording_does_not_hold_up_another_sessions_chunks():
+    pool = TranscriptionPool(ChunkingBackend(), max_workers=2, chunk_workers=1)
+    try:
+        long_job = pool.submit(wav_bytes(speech(16000, seconds=6.0), 16000))
+        time.sleep(0.02)
+        short_job = pool.submit(wav_bytes(speech(16000, seconds=0.5), 16000))
+        assert short_job.wait(10)
+        assert short_job.status == TranscriptionJob.DONE, short_job.error
+        assert not long_job.done
+        assert long_job.wait(10)
+        assert set(long_job.text.split()) == {"chunk"}
+    finally:
+        pool.shutdown()
@@ -0,0 +1,60 @@
+import re
+
+import pytest
+
+from qa_system.classifier import FALLBACK_CATEGORY, KeywordClassifier, LLMClassifier, _trie_regex
+
+PHRASES = ["leak", "leaking", "oil leak", "overheat", "over temperature", "noise", "c++ build"]
+
+
+@pytest.mark.parametrize("phrase", PHRASES)
+def test_trie_regex_matches_every_phrase_exactly(phrase):
+    regex = re.compile(_trie_regex(PHRASES))
+    assert regex.fullmatch(phrase)
+
+
+@pytest.mark.parametrize("text", ["lea", "leakage", "oil", "over", "c+ build", ""])
+def test_trie_regex_matches_nothing_else(text):
+    assert not re.fullmatch(_trie_regex(PHRASES), text)
+
+
+def test_trie_regex_allows_any_whitespace_between_words():
+    assert re.fullmatch(_trie_regex(PHRASES), "oil \t leak")
+
+
+def test_trie_regex_prefers_the_longest_phrase():
+    regex = re.compile(r"\b" + _trie_regex(PHRASES) + r"\b")
+    assert [m.group() for m in regex.finditer("the pump is leaking oil leak")] == ["leaking", "oil leak"]
+
+
+TAXONOMY = [
+    {"category": "EQUIPMENT MALFUNCTION - FLUID LEAK", "priority": "Medium", "keywords": ["leak", "oil leak"]},
+    {"category": "SAFETY HAZARD", "priority": "High", "keywords": ["exposed wire"], "patterns": [r"\bsparks?\b"]},
+]
+
+
+def test_keyword_classifier_scores_by_match_length():
+    classifier = KeywordClassifier(TAXONOMY)
+    category, priority, confidence = classifier.classify("Oil  leak next to an exposed wire")
+    assert category == "SAFETY HAZARD"
+    assert priority == "High"
+    assert confidence == pytest.approx(12 / 20)
+
+
+def test_keyword_classifier_falls_back_to_patterns_then_general():
+    classifier = KeywordClassifier(TAXONOMY)
+    assert classifier.classify("Sparks from the panel").category == "SAFETY HAZARD"
+    assert classifier.classify("Label is crooked") == (FALLBACK_CATEGORY, "Medium", 0.0)
+
+
+@pytest.mark.parametrize("confidence, expected", [(0.8, 0.8), (3, 1.0), (None, 0.5), ("high", 0.5),
+                                                  ("nan", 0.5), ([0.9], 0.5)])
+def test_llm_answers_with_a_bad_confidence_still_classify(monkeypatch, confidence, expected):
+    classifier = LLMClassifier()
+    classifier._client = object()
+    category = classifier.taxonomy[0]["category"]
+    answers = [{"category": category, "priority": "High", "confidence": confidence}, {"category": ["x"]}]
+    monkeypatch.setattr(classifier, "_ask", lambda texts: answers)
+    first, second = classifier.classify_batch(["Oil leaking from the press", "Loud noise from the robot"])
+    assert first == (category, "High", expected)
+    assert second == classifier.fallback.classify("Loud noise from the robot")
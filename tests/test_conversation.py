@@ -0,0 +1,142 @@
+import pytest
+
+from qa_system.conversation import (AWAITING_CONFIRMATION, AWAITING_INPUT, CLASSIFICATION_FAILED, ChatFlow,
+                                    Conversation)
+from qa_system.machines import UNASSIGNED, MachineRegistry, Partition
+
+
+class FakeOutbox:
+    def __init__(self):
+        self.entries = []
+        self.discarded = []
+
+    def stage_audio(self, data):
+        return "staged.wav"
+
+    def discard_audio(self, name):
+        self.discarded.append(name)
+
+    def append(self, report, transcript=None, audio=None):
+        self.entries.append((report, transcript, audio))
+
+    def pending_count(self):
+        return len(self.entries)
+
+
+class FakeClassifier:
+    def classify(self, text):
+        return "EQUIPMENT MALFUNCTION", "High", 0.9
+
+
+class FakeIds:
+    def __init__(self):
+        self.count = 0
+
+    def try_next_id(self):
+        self.count += 1
+        return f"QA-2026-{self.count:04d}"
+
+
+def failing(text):
+    raise RuntimeError("store unavailable")
+
+
+def make_flow(**kwargs):
+    kwargs.setdefault("prompt", lambda text: f"You reported: {text}")
+    return ChatFlow(FakeOutbox(), FakeIds(), FakeClassifier(), transcription_pool=None, **kwargs)
+
+
+def test_submit_text_asks_for_confirmation():
+    flow = make_flow(similar=lambda text: [{"id": "QA-2023-0001"}])
+    conversation = Conversation()
+    flow.submit_text(conversation, "Leak at the press")
+    assert conversation.state == AWAITING_CONFIRMATION
+    assert conversation.current_similar == [{"id": "QA-2023-0001"}]
+    assert conversation.messages[-1]["content"] == "You reported: Leak at the press"
+
+
+def test_failed_similar_search_still_asks_for_confirmation():
+    flow = make_flow(similar=failing)
+    conversation = Conversation()
+    flow.submit_text(conversation, "Leak at the press")
+    assert conversation.state == AWAITING_CONFIRMATION
+    assert conversation.current_similar == []
+
+
+@pytest.mark.parametrize("broken", ["classifier", "prompt"])
+def test_failed_classification_returns_to_input(broken):
+    flow = make_flow()
+    if broken == "classifier":
+        flow.classifier.classify = failing
+    else:
+        flow.prompt = failing
+    conversation = Conversation()
+    flow.submit_text(conversation, "Leak at the press")
+    assert conversation.state == AWAITING_INPUT
+    assert conversation.current_report is None
+    assert conversation.messages[-1]["content"] == CLASSIFICATION_FAILED
+
+    # The engineer can simply try again
+    flow.classifier = FakeClassifier()
+    flow.prompt = lambda text: "Confirm?"
+    flow.submit_text(conversation, "Leak at the press")
+    assert conversation.state == AWAITING_CONFIRMATION
+
+
+def test_confirm_queues_the_report_with_a_reserved_id():
+    flow = make_flow()
+    conversation = Conversation()
+    flow.submit_text(conversation, "Leak at the press")
+    report = flow.confirm(conversation)
+    assert report["id"] == "QA-2026-0001"
+    assert flow.outbox.entries == [(report, None, None)]
+    assert "QA-2026-0001 has been created" in conversation.messages[-1]["content"]
+
+
+def test_confirm_without_reserved_ids_still_queues_the_report():
+    flow = make_flow()
+    flow.id_allocator.try_next_id = lambda: None
+    conversation = Conversation()
+    flow.submit_text(conversation, "Leak at the press")
+    report = flow.confirm(conversation)
+    assert report["id"] is None
+    assert len(flow.outbox.entries) == 1
+    assert "as soon as it is saved" in conversation.messages[-1]["content"]
+
+
+REGISTRY = MachineRegistry([
+    {"plant": "North Plant", "lines": [{"line": "Assembly line 3", "machines": ["Press 2211"]}]},
+    {"plant": "South Plant", "lines": [{"line": "Assembly line 7", "machines": ["Press 7001"]}]},
+])
+
+
+@pytest.mark.parametrize("text, station, filed_as", [
+    ("Oil leak at Press 2211", None, ("Press 2211", "North Plant", "Assembly line 3")),
+    ("Oil leak at press 7001", Partition("North Plant", "Assembly line 3"),
+     ("Press 7001", "South Plant", "Assembly line 7")),
+    ("The machine is grinding", Partition("South Plant", "Assembly line 7"),
+     ("Assembly line 7", "South Plant", "Assembly line 7")),
+    ("The machine is grinding", None, (UNASSIGNED, UNASSIGNED, UNASSIGNED)),
+])
+def test_confirm_files_the_report_by_machine_or_station(text, station, filed_as):
+    flow = make_flow(machines=REGISTRY)
+    conversation = Conversation()
+    conversation.station = station
+    flow.submit_text(conversation, text)
+    report = flow.confirm(conversation)
+    assert (report["machine"], report["plant"], report["line"]) == filed_as
+
+
+def test_engineer_is_told_when_a_report_was_stored_under_a_fresh_id():
+    renumbered = {}
+    flow = make_flow(renumbered=lambda report_id: renumbered.pop(report_id, None))
+    conversation = Conversation()
+    flow.submit_text(conversation, "Oil leak at the press")
+    flow.confirm(conversation)
+    flow.check_renumbered(conversation)
+    assert conversation.queued_ids == ["QA-2026-0001"]
+    renumbered["QA-2026-0001"] = "QA-2026-0042"
+    flow.outbox.entries.clear()
+    flow.check_renumbered(conversation)
+    assert "Report QA-2026-0001 was saved as QA-2026-0042" in conversation.messages[-1]["content"]
+    assert conversation.queued_ids == []
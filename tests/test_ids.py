@@ -0,0 +1,77 @@
+import datetime
+import threading
+
+from qa_system.ids import ReportIdAllocator, format_report_id, parse_report_id
+
+
+def test_format_and_parse_report_ids():
+    assert format_report_id(2026, 7) == "QA-2026-0007"
+    assert parse_report_id("QA-2026-12345") == (2026, 12345)
+    assert parse_report_id("QA-2026-H001") is None
+
+
+def test_reserve_ids_starts_after_stored_ids(store, make_report):
+    store.add_many([make_report("QA-2026-0041"), make_report("QA-2026-H001")])
+    assert store.reserve_ids(2026, 10) == 42
+    assert store.reserve_ids(2026, 10) == 52
+    assert store.reserve_ids(2027, 10) == 1
+
+
+def test_storing_numbered_ids_moves_the_sequence_past_them(store, make_report):
+    assert store.reserve_ids(2026, 10) == 1
+    store.add_many([make_report("QA-2026-0500")], ignore_duplicates=True)
+    assert store.reserve_ids(2026, 10) == 501
+
+
+def test_allocators_sharing_a_store_never_repeat_an_id(store):
+    allocators = [ReportIdAllocator(store, block_size=5) for _ in range(4)]
+    issued = [[] for _ in allocators]
+
+    def allocate(allocator, ids):
+        for _ in range(50):
+            ids.append(allocator.next_id())
+
+    threads = [threading.Thread(target=allocate, args=pair) for pair in zip(allocators, issued)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    every_id = [report_id for ids in issued for report_id in ids]
+    assert len(set(every_id)) == 200
+    for ids in issued:
+        numbers = [parse_report_id(report_id)[1] for report_id in ids]
+        assert numbers == sorted(numbers)
+
+
+class CountingStore:
+    def __init__(self):
+        self.next = 1
+        self.calls = 0
+
+    def reserve_ids(self, year, count):
+        self.calls += 1
+        start = self.next
+        self.next += count
+        return start
+
+
+def test_try_next_id_never_touches_the_store():
+    store = CountingStore()
+    allocator = ReportIdAllocator(store, block_size=2, today=lambda: datetime.date(2026, 5, 1))
+    assert allocator.try_next_id() is None
+    assert store.calls == 0
+    assert allocator.refill() and allocator.refill()
+    assert not allocator.refill()
+    assert [allocator.try_next_id() for _ in range(5)] == ["QA-2026-0001", "QA-2026-0002", "QA-2026-0003",
+                                                             "QA-2026-0004", None]
+    assert store.calls == 2
+
+
+def test_reserved_numbers_are_not_used_in_a_new_year():
+    today = [datetime.date(2026, 12, 31)]
+    allocator = ReportIdAllocator(CountingStore(), block_size=10, today=lambda: today[0])
+    allocator.refill()
+    assert allocator.try_next_id() == "QA-2026-0001"
+    today[0] = datetime.date(2027, 1, 1)
+    assert allocator.try_next_id() is None
+    assert allocator.next_id() == "QA-2027-0011"
@@ -0,0 +1,30 @@
+import csv
+
+from qa_system.cache import CachedClassifier
+from qa_system.classifier import KeywordClassifier
+from qa_system.ingest import ingest_file
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, ["id", "description", "timestamp", "category", "machine"])
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+
+def test_import_counts_conflicting_ids_apart_from_reimports(tmp_path, store, make_report):
+    store.add(make_report("QA-2026-0001", description="Filed in the chat"))
+    path = write_csv(tmp_path / "export.csv", [
+        {"id": "QA-2026-0001", "description": "Old report", "timestamp": "2021-05-01 08:00:00",
+         "category": "SAFETY HAZARD", "machine": "Press 2211"},
+        {"id": "QA-2021-0002", "description": "Guard missing, operator injured", "timestamp": "2021-05-02 08:00:00",
+         "category": "MATERIAL ISSUE - SUPPLIER", "machine": "Press 2211"},
+    ])
+    classifier = CachedClassifier(KeywordClassifier())
+    first = ingest_file(path, store, classifier)
+    assert (first.stored, first.duplicates, first.conflicts) == (1, 0, 1)
+    # The row's own category sets its priority, not the category its text would be classified as
+    assert store.get_many(["QA-2021-0002"])[0]["priority"] == "Low"
+    again = ingest_file(path, store, classifier)
+    assert (again.stored, again.duplicates, again.conflicts) == (0, 1, 1)
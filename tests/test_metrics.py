@@ -0,0 +1,28 @@
+from qa_system.metrics import MetricsRegistry
+
+
+def test_histogram_quantiles():
+    registry = MetricsRegistry(buckets=(0.01, 0.1, 1.0))
+    for seconds in (0.005, 0.05, 0.05, 0.5):
+        registry.observe("rerun", seconds)
+    summary = registry.snapshot()["stages"]["rerun"]
+    assert summary["count"] == 4
+    assert 0.01 <= summary["p50"] <= 0.1
+    assert 'qa_stage_seconds_bucket{stage="rerun",le="+Inf"} 4' in registry.render_prometheus()
+
+
+def test_session_state_is_sized_only_now_and_then():
+    registry = MetricsRegistry(state_sample_every=10)
+    calls = []
+
+    def state():
+        calls.append(1)
+        return {"messages": ["x" * 100] * len(calls)}
+
+    for _ in range(25):
+        registry.set_session("s1", state)
+    assert len(calls) == 3
+    assert registry.snapshot()["sessions"]["s1"]["state_bytes"] > 0
+    # Callbacks only attribute their spans and never size the state
+    registry.set_session("s1")
+    assert len(calls) == 3
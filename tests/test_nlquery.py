@@ -0,0 +1,123 @@
+import datetime
+import json
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from qa_system.nlquery import LLMQueryParser, QueryEngine, QueryPlan, RuleQueryParser
+
+TODAY = datetime.date(2026, 3, 31)
+
+ROWS = [
+    # day, category, priority, machine, plant, line
+    ("2026-03-02", "EQUIPMENT MALFUNCTION - FLUID LEAK", "Medium", "Press 2211", "North Plant", "Assembly line 3"),
+    ("2026-03-03", "EQUIPMENT MALFUNCTION - FLUID LEAK", "Medium", "Press 2211", "North Plant", "Assembly line 3"),
+    ("2026-03-10", "EQUIPMENT MALFUNCTION - NOISE", "Low", "Robot 17", "North Plant", "Assembly line 3"),
+    ("2026-03-11", "PRODUCT DEFECT - EXTERIOR COMPONENT", "High", "Conveyor 9", "South Plant", "Packaging line 2"),
+    ("2026-03-24", "EQUIPMENT MALFUNCTION - FLUID LEAK", "Medium", "Conveyor 9", "South Plant", "Packaging line 2"),
+]
+
+
+def plan(**fields):
+    return QueryPlan(**{field: fields.get(field) for field in QueryPlan._fields})
+
+
+@pytest.fixture
+def store(store, make_report):
+    store.add_many([
+        make_report(f"QA-2026-{i:04d}", description="report", timestamp=f"{day} 10:00:00", category=category,
+                    priority=priority, machine=machine, plant=plant, line=line)
+        for i, (day, category, priority, machine, plant, line) in enumerate(ROWS, 1)
+    ])
+    return store
+
+
+def expected(keys, **filters):
+    frame = pd.DataFrame(ROWS, columns=["day", "category", "priority", "machine", "plant", "line"])
+    for column, value in filters.items():
+        frame = frame[frame[column] == value]
+    return frame.groupby(keys).size().to_dict()
+
+
+@pytest.mark.parametrize("group_by", ["machine", "category", "priority", "plant", "line"])
+def test_counts_per_group(store, group_by):
+    result = QueryEngine(store).run(plan(group_by=group_by))
+    assert dict(zip(result[group_by], result["reports"])) == expected(group_by)
+
+
+def test_counts_per_week_and_machine(store):
+    result = QueryEngine(store).run(plan(period="week", group_by="machine"))
+    weeks = result["period"].dt.strftime("%Y-%m-%d")
+    assert dict(zip(zip(weeks, result["machine"]), result["reports"])) == {
+        ("2026-03-02", "Press 2211"): 2,
+        ("2026-03-09", "Conveyor 9"): 1,
+        ("2026-03-09", "Robot 17"): 1,
+        ("2026-03-23", "Conveyor 9"): 1,
+    }
+
+
+def test_filters_and_total(store):
+    engine = QueryEngine(store)
+    assert engine.run(plan(category_prefix="EQUIPMENT MALFUNCTION"))["reports"].tolist() == [4]
+    assert engine.run(plan(category="EQUIPMENT MALFUNCTION - FLUID LEAK", since="2026-03-03",
+                           until="2026-03-24"))["reports"].tolist() == [1]
+    assert engine.run(plan(machine="Nowhere", group_by="machine")).empty
+
+
+def test_partition_engine_only_sees_its_partition(store):
+    engine = QueryEngine(store, filters={"plant": "South Plant"})
+    result = engine.run(plan(group_by="machine"))
+    assert dict(zip(result["machine"], result["reports"])) == expected("machine", plant="South Plant")
+
+
+def test_results_follow_new_reports(store):
+    engine = QueryEngine(store)
+    assert engine.run(plan())["reports"].tolist() == [5]
+    store.add({"id": "QA-2026-0099", "description": "report", "timestamp": "2026-03-30 10:00:00",
+               "category": "SAFETY HAZARD", "priority": "High", "machine": "Robot 17"})
+    assert engine.run(plan())["reports"].tolist() == [6]
+
+
+@pytest.mark.parametrize("question, period, group_by", [
+    ("oil leaks by week", "week", None),
+    ("defects per machine last quarter", None, "machine"),
+    ("reports by month per plant", "month", "plant"),
+    ("how many safety reports per line", None, "line"),
+])
+def test_parser_groupings(question, period, group_by):
+    parsed = RuleQueryParser(today=lambda: TODAY).parse(question)
+    assert (parsed.period, parsed.group_by) == (period, group_by)
+
+
+def model_answering(answer):
+    message = SimpleNamespace(content=json.dumps(answer))
+    response = SimpleNamespace(choices=[SimpleNamespace(message=message)])
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: response)))
+
+
+@pytest.mark.parametrize("answer", [
+    {"since": "last tuesday"},
+    {"until": "2026-02-30"},
+    {"group_by": "shift"},
+    {"period": "fortnight"},
+    {"category": "OIL STUFF"},
+    {"category_prefix": "NOT A FAMILY"},
+    {"priority": "Urgent"},
+    {"machine": ["Press 2211", "Robot 17"]},
+])
+def test_llm_plans_with_invalid_fields_fall_back_to_the_rules(answer):
+    rules = RuleQueryParser(today=lambda: TODAY)
+    parser = LLMQueryParser(fallback=rules)
+    parser._client = model_answering(dict({"period": "week"}, **answer))
+    question = "oil leaks per machine last month"
+    assert parser.parse(question) == rules.parse(question)
+
+
+def test_valid_llm_plan_is_used():
+    parser = LLMQueryParser(fallback=RuleQueryParser())
+    parser._client = model_answering({"category_prefix": "PRODUCT DEFECT", "since": "2026-01-01",
+                                      "period": "month", "group_by": "machine"})
+    assert parser.parse("defects per machine and month this year") == plan(
+        category_prefix="PRODUCT DEFECT", since="2026-01-01", period="month", group_by="machine"
+    )
@@ -0,0 +1,136 @@
+import json
+import os
+import time
+
+import pytest
+
+from qa_system.ids import ReportIdAllocator
+from qa_system.outbox import OutboxSync, ReportOutbox
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    outbox = ReportOutbox(str(tmp_path / "outbox"), fsync=False)
+    yield outbox
+    outbox.close()
+
+
+def test_sync_stores_reports_with_their_recordings(outbox, store, make_report):
+    audio = outbox.stage_audio(b"RIFF....WAVE")
+    outbox.append(make_report("QA-2026-0001"), transcript="Oil leaking", audio=audio)
+    outbox.append(make_report("QA-2026-0002"))
+    synced = []
+    assert OutboxSync(outbox, store, on_synced=[synced.append]).sync_once() == 2
+    assert outbox.pending_count() == 0
+    # One callback per batch, however many reports it held
+    [batch] = synced
+    assert [r["id"] for r in batch] == ["QA-2026-0001", "QA-2026-0002"]
+    assert store.get_media("QA-2026-0001") == ("Oil leaking", b"RIFF....WAVE")
+    assert outbox.read_audio(audio) is None
+
+
+def test_queue_survives_a_restart_and_drops_a_torn_write(tmp_path, store, make_report):
+    directory = str(tmp_path / "outbox")
+    outbox = ReportOutbox(directory, fsync=False)
+    outbox.append(make_report("QA-2026-0001"))
+    outbox.close()
+    # A crash in the middle of the next append
+    with open(os.path.join(directory, "queue.log"), "ab") as f:
+        f.write(b'{"key": "abc", "report": {"id": "QA-20')
+    reopened = ReportOutbox(directory, fsync=False)
+    assert reopened.pending_count() == 1
+    assert OutboxSync(reopened, store).sync_once() == 1
+    assert store.count() == 1
+    reopened.append(make_report("QA-2026-0002"))
+    assert OutboxSync(reopened, store).sync_once() == 1
+    reopened.close()
+
+
+def test_replayed_batch_is_stored_once(outbox, store, monkeypatch, make_report):
+    outbox.append(make_report("QA-2026-0001"))
+    sync = OutboxSync(outbox, store)
+    acknowledge = outbox.acknowledge
+
+    def lost_ack(entries, offset):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(outbox, "acknowledge", lost_ack)
+    with pytest.raises(OSError):
+        sync.sync_once()
+    monkeypatch.setattr(outbox, "acknowledge", acknowledge)
+    synced = []
+    sync.on_synced.append(synced.append)
+    assert sync.sync_once() == 1
+    assert store.count() == 1
+    assert synced == []
+    assert outbox.pending_count() == 0
+
+
+def test_id_taken_by_another_report_is_stored_under_a_fresh_one(outbox, store, make_report):
+    for number in range(store.reserve_ids(2026, 10), 11):
+        outbox.append(make_report(f"QA-2026-{number:04d}"))
+    # Imported history that happens to reuse an ID already handed out
+    store.add_many([make_report("QA-2026-0001", description="Imported", timestamp="2025-12-01 08:00:00")],
+                   ignore_duplicates=True)
+    sync = OutboxSync(outbox, store, batch_size=3)
+    while outbox.pending_count():
+        sync.sync_once()
+    assert store.count() == 11
+    assert store.get_many(["QA-2026-0001"])[0]["description"] == "Imported"
+    stored_id = sync.renumbered_id("QA-2026-0001")
+    assert stored_id == "QA-2026-0011"
+    assert store.get_many([stored_id])[0]["description"] == "Oil leaking from the hydraulic unit"
+    # Collected once
+    assert sync.renumbered_id("QA-2026-0001") is None
+
+
+def test_entries_queued_without_keys_are_matched_on_contents(outbox, store, make_report):
+    store.add_many([make_report("QA-2026-0001")])
+    entry = {"report": make_report("QA-2026-0001"), "transcript": None, "audio": None}
+    with open(os.path.join(outbox.directory, "queue.log"), "ab") as f:
+        f.write(json.dumps(entry).encode() + b"\n")
+    reopened = ReportOutbox(outbox.directory, fsync=False)
+    assert OutboxSync(reopened, store).sync_once() == 1
+    assert store.count() == 1
+    reopened.close()
+
+
+def test_reports_queued_without_an_id_are_numbered_when_stored(outbox, store, make_report):
+    store.add_many([make_report("QA-2026-0007")])
+    audio = outbox.stage_audio(b"RIFF....WAVE")
+    outbox.append(make_report(None), transcript="Oil leaking", audio=audio)
+    outbox.append(make_report(None, description="Belt slipping"))
+    synced = []
+    sync = OutboxSync(outbox, store, on_synced=[synced.append])
+    assert sync.sync_once() == 2
+    assert [r["id"] for r in synced[0]] == ["QA-2026-0008", "QA-2026-0009"]
+    assert store.get_media("QA-2026-0008") == ("Oil leaking", b"RIFF....WAVE")
+    assert store.count() == 3
+
+
+def test_background_sync_keeps_ids_reserved(outbox, store):
+    allocator = ReportIdAllocator(store, block_size=5)
+    sync = OutboxSync(outbox, store, id_allocator=allocator).start()
+    try:
+        for _ in range(100):
+            if allocator.try_next_id():
+                break
+            time.sleep(0.05)
+        else:
+            pytest.fail("No IDs were reserved in the background")
+    finally:
+        sync.stop()
+
+
+def test_processes_sharing_a_queue_lose_and_repeat_nothing(outbox, store, make_report):
+    other = ReportOutbox(outbox.directory, fsync=False)
+    outbox.append(make_report("QA-2026-0001"))
+    entries, offsets = outbox.peek()
+    # Queued by another server process while this one is storing its batch
+    other.append(make_report("QA-2026-0002"))
+    outbox.acknowledge(entries, offsets[-1])
+    assert outbox.pending_count() == other.pending_count() == 1
+    assert OutboxSync(other, store).sync_once() == 1
+    assert OutboxSync(outbox, store).sync_once() == 0
+    assert [r["id"] for r in store.query(order_by="id", descending=False)] == ["QA-2026-0002"]
+    other.close()
@@ -0,0 +1,18 @@
+from qa_system.cache import TTLCache, normalize_text
+from qa_system.prompts import confirmation_prompt, confirmation_template
+
+
+def cached_prompt(cache, text):
+    return cache.get_or_compute(normalize_text(text), lambda: confirmation_template(text)).format(text=text)
+
+
+def test_shared_template_repeats_each_engineers_own_wording():
+    cache = TTLCache(max_entries=10)
+    assert cached_prompt(cache, "Motor hums!") == "Did I understand correctly that: Motor hums!? Please confirm."
+    assert cached_prompt(cache, "motor hums") == "Did I understand correctly that: motor hums? Please confirm."
+    assert len(cache) == 1
+
+
+def test_known_reports_get_their_fixed_question():
+    assert "oil leak" in confirmation_prompt("OIL   leaking from press")
+    assert confirmation_template("Cover defect on item") == confirmation_template("cover defect on item!")
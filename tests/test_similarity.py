@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+
+from qa_system.similarity import VectorIndex
+
+WORDS = "hydraulic leak press robot arm conveyor belt motor noise paint drip label misprint weld crack".split()
+
+
+class FakeStore:
+    def __init__(self, count=0):
+        self.reports = []
+        self.add(count)
+
+    def add(self, count):
+        rng = np.random.default_rng(len(self.reports))
+        for _ in range(count):
+            number = len(self.reports) + 1
+            self.reports.append({"id": f"QA-2026-{number:04d}", "description": " ".join(rng.choice(WORDS, 6))})
+
+    def iter_reports(self, after_seq=0, with_seq=False):
+        for seq, report in enumerate(self.reports[after_seq:], after_seq + 1):
+            yield (seq, report) if with_seq else report
+
+
+def stored_ids(base):
+    with open(f"{base}.vectors.ids", encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def test_search_finds_the_matching_report(tmp_path):
+    store = FakeStore(50)
+    index = VectorIndex(str(tmp_path / "qa"))
+    assert index.sync(store) == 50
+    report = store.reports[7]
+    assert index.search(report["description"], k=1, min_score=0)[0][0] == report["id"]
+    assert report["id"] not in dict(index.search(report["description"], exclude={report["id"]}))
+
+
+def test_search_after_training_lists(tmp_path):
+    store = FakeStore(300)
+    index = VectorIndex(str(tmp_path / "qa"), lists=8, probes=8, train_size=100)
+    index.sync(store)
+    store.add(100)
+    index.sync(store)
+    for report in store.reports[::37]:
+        [(report_id, score)] = index.search(report["description"], k=1, min_score=0)
+        assert score > 0.95
+
+
+def test_reload_resumes_without_reembedding(tmp_path):
+    store = FakeStore(40)
+    base = str(tmp_path / "qa")
+    VectorIndex(base, lists=4, train_size=16).sync(store)
+    reloaded = VectorIndex(base, lists=4, train_size=16)
+    assert len(reloaded) == 40
+    assert reloaded.sync(store) == 0
+    store.add(5)
+    assert reloaded.sync(store) == 5
+    assert stored_ids(base) == [report["id"] for report in store.reports]
+
+
+def test_processes_sharing_an_index_embed_each_report_once(tmp_path):
+    store = FakeStore(30)
+    base = str(tmp_path / "qa")
+    first = VectorIndex(base)
+    second = VectorIndex(base)
+    assert first.sync(store) == 30
+    # The second process picks up what the first one stored instead of appending it again
+    assert second.sync(store) == 0
+    assert len(second) == 30
+    store.add(10)
+    assert second.sync(store) == 10
+    assert first.sync(store) == 0
+    assert len(first) == 40
+    assert stored_ids(base) == [report["id"] for report in store.reports]
+    assert len(VectorIndex(base)) == 40
+
+
+def test_incomplete_writes_are_dropped_on_load(tmp_path):
+    store = FakeStore(20)
+    base = str(tmp_path / "qa")
+    VectorIndex(base).sync(store)
+    # A process that died mid-sync leaves rows past the recorded count
+    with open(f"{base}.vectors.ids", "a", encoding="utf-8") as f:
+        f.write("QA-2026-9999\n")
+    with open(f"{base}.vectors.i8", "ab") as f:
+        f.write(os.urandom(256))
+    index = VectorIndex(base)
+    assert len(index) == 20
+    store.add(1)
+    index.sync(store)
+    assert stored_ids(base) == [report["id"] for report in store.reports]
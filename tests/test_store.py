@@ -0,0 +1,12 @@
+def test_distinct_values_within_a_partition(store, make_report):
+    store.add_many([
+        make_report(f"QA-2026-000{i}", machine=machine, plant=plant, line=line)
+        for i, (machine, plant, line) in enumerate([
+            ("Press 2211", "North Plant", "Assembly line 3"),
+            ("Robot 17", "North Plant", "Assembly line 3"),
+            ("Press 3101", "South Plant", "Assembly line 7"),
+        ], 1)
+    ])
+    assert store.distinct("machine") == ["Press 2211", "Press 3101", "Robot 17"]
+    assert store.distinct("machine", plant="North Plant") == ["Press 2211", "Robot 17"]
+    assert store.distinct("machine", plant="South Plant", line="Assembly line 7") == ["Press 3101"]
@@ -0,0 +1,48 @@
+import datetime
+
+from qa_system.trends import TrendDetector, recommend_actions
+
+TODAY = datetime.date(2026, 3, 31)
+
+
+def report(day, machine="Press 2211", category="EQUIPMENT MALFUNCTION - FLUID LEAK"):
+    return {"timestamp": f"{day.isoformat()} 10:00:00", "machine": machine, "category": category}
+
+
+def steady_detector():
+    detector = TrendDetector(today=lambda: TODAY)
+    for offset in range(29, -1, -1):
+        detector.add(report(TODAY - datetime.timedelta(days=offset)))
+    return detector
+
+
+def test_steady_rate_raises_no_alert():
+    assert steady_detector().alerts() == []
+
+
+def test_rising_rate_raises_an_alert():
+    detector = steady_detector()
+    for _ in range(5):
+        detector.add(report(TODAY))
+    [alert] = detector.alerts()
+    assert alert.machine == "Press 2211"
+    assert alert.recent_rate > alert.baseline_rate
+
+
+def test_backfilled_history_is_not_counted_as_today():
+    detector = steady_detector()
+    start = datetime.date(2025, 1, 1)
+    for offset in range(365):
+        detector.add(report(start + datetime.timedelta(days=offset)))
+    assert detector.alerts() == []
+
+
+def test_recommendations_do_not_send_anyone_to_inspect_unassigned():
+    detector = steady_detector()
+    for offset in range(29, -1, -1):
+        detector.add(report(TODAY - datetime.timedelta(days=offset), machine="Unassigned"))
+    for _ in range(5):
+        detector.add(report(TODAY, machine="Unassigned"))
+    actions = recommend_actions(detector.alerts())
+    assert actions[0].startswith("Trace the source of the rising")
+    assert not any("inspection of Unassigned" in action for action in actions)